@@ -1 +1,71 @@
-# This file is intentionally left blank.
\ No newline at end of file
+"""
+Analysis and visualization of dunkelflaute periods (periods of low wind and
+solar production).
+
+The submodules and the functions and classes below are imported on first
+use, so importing the package is fast and only the parts that are used are
+loaded, e.g. dunkelflaute.get_dunkelflaute_results does not import
+matplotlib, while dunkelflaute.visualize does.
+"""
+
+import importlib
+
+# Public names of the package and the submodules that define them
+_API = {
+    "get_total_production_df": "core",
+    "get_total_production_matrix": "core",
+    "find_fuzzy_periods": "core",
+    "get_dunkelflaute_results": "core",
+    "get_event_statistics": "core",
+    "load_df": "utils",
+    "create_ts_from_raw": "utils",
+    "get_number_of_years": "utils",
+    "DunkelflauteResults": "results",
+    "ResultCache": "cache",
+    "MemmapTimeSeries": "storage",
+    "RunIndex": "run_index",
+    "StreamingDetector": "streaming",
+    "IncrementalDunkelflaute": "streaming",
+    "iter_dunkelflaute_periods": "streaming",
+    "Instrumentation": "instrumentation",
+    "concat_regions": "regions",
+    "get_regional_production_df": "regions",
+    "find_simultaneous_periods": "regions",
+    "get_simultaneous_results": "regions",
+    "get_portfolio_metrics": "portfolio",
+    "optimize_portfolio": "portfolio",
+    "find_min_cap_dem_ratio": "portfolio",
+}
+_SUBMODULES = [
+    "benchmark",
+    "cache",
+    "cli",
+    "core",
+    "instrumentation",
+    "parallel",
+    "portfolio",
+    "regions",
+    "results",
+    "run_index",
+    "storage",
+    "streaming",
+    "utils",
+    "visualize",
+]
+
+__all__ = list(_API) + _SUBMODULES
+
+
+def __getattr__(name):
+    if name in _API:
+        value = getattr(importlib.import_module(f"dunkelflaute.{_API[name]}"), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f"dunkelflaute.{name}")
+    else:
+        raise AttributeError(f"module 'dunkelflaute' has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,287 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from dunkelflaute.core import (
+    find_fuzzy_periods,
+    get_dunkelflaute_results,
+    get_total_production_df,
+)
+from dunkelflaute.utils import load_df
+
+# Sweep grid of main.py
+THRESHOLDS = [0.05, 0.075, 0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.45, 0.5]
+PERIOD_LENGTHS = [12 * t for t in range(1, 16 * 2 + 1)]
+
+
+def make_wind_solar_df(n_years=1, start_year=2000, seed=0):
+    """
+    Create a synthetic hourly wind and solar capacity factor dataframe with
+    the same layout as load_df. Wind is a smoothed random process with more
+    wind in winter, solar follows the daily and yearly course of the sun
+    with random daily cloudiness.
+    """
+    index = pd.date_range(
+        f"{start_year}-01-01 00:00:00",
+        f"{start_year + n_years - 1}-12-31 23:00:00",
+        freq="h",
+        name="datetime",
+    )
+    rng = np.random.default_rng(seed)
+    n = len(index)
+    winter = np.cos(2 * np.pi * (index.dayofyear.to_numpy() - 15) / 365.25)
+
+    # Weather systems last a few days, so the noise is smoothed over ~2 days
+    kernel = 0.98 ** np.arange(200)
+    weather = np.convolve(rng.standard_normal(n + len(kernel)), kernel, "valid")[:n]
+    weather /= weather.std()
+    wind = 1 / (1 + np.exp(-(weather + 0.6 * winter - 0.7)))
+
+    daylight = np.sin(np.pi * (index.hour.to_numpy() - 6) / 12).clip(0)
+    clouds = rng.uniform(0.2, 1.0, n // 24 + 1).repeat(24)[:n]
+    solar = daylight * (0.6 - 0.3 * winter) * clouds
+
+    return pd.DataFrame({"wind": wind, "solar": solar}, index=index)
+
+
+def get_mix_grid(n_columns):
+    """
+    Get capacity mixes and capacity demand ratios for get_total_production_df
+    that give at least n_columns columns: up to 101 mixes, combined with
+    capacity demand ratios for more columns.
+    """
+    cap_mix = [float(cap) for cap in np.linspace(0, 1, min(n_columns, 101))]
+    if n_columns <= len(cap_mix):
+        return cap_mix, 1.0
+    n_ratios = -(-n_columns // len(cap_mix))
+    return cap_mix, [float(r) for r in np.round(1 + 0.05 * np.arange(n_ratios), 2)]
+
+
+def make_production_df(n_years=1, n_columns=3, seed=0):
+    """
+    Create a synthetic total production dataframe with n_columns columns,
+    see get_mix_grid.
+    """
+    df = make_wind_solar_df(n_years, seed=seed)
+    return get_total_production_df(df, *get_mix_grid(n_columns)).iloc[:, :n_columns]
+
+
+def time_function(func, repeat=3):
+    """
+    Call func repeat times and return the wall-clock times in seconds.
+    Anything the function prints is discarded.
+    """
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def run_benchmarks(
+    years=(1, 10), columns=(1, 10), repeat=3, plots=True, output=None, seed=0
+):
+    """
+    Time the core detection path for every combination of years and mix
+    columns, and load_df and the visualize.py plot functions for every
+    number of years. The results are returned as a dictionary and, if output
+    is given, written to that JSON file.
+    """
+    records = []
+
+    def add(name, func, n_years, n_columns):
+        times = time_function(func, repeat)
+        records.append(
+            {
+                "name": name,
+                "n_years": n_years,
+                "n_columns": n_columns,
+                "times": times,
+                "min": min(times),
+                "mean": sum(times) / len(times),
+            }
+        )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_years in years:
+            df = make_wind_solar_df(n_years, seed=seed)
+            file_path = os.path.join(tmp_dir, f"wind_solar_{n_years}.csv")
+            df.to_csv(file_path)
+            add("load_df", lambda: load_df(file_path, use_cache=False), n_years, 2)
+            load_df(file_path)
+            add("load_df_cached", lambda: load_df(file_path), n_years, 2)
+
+            for n_columns in columns:
+                cap_mix, cap_dem_ratio = get_mix_grid(n_columns)
+                add(
+                    "get_total_production_df",
+                    lambda: get_total_production_df(df, cap_mix, cap_dem_ratio),
+                    n_years,
+                    n_columns,
+                )
+                df_total = get_total_production_df(df, cap_mix, cap_dem_ratio)
+                df_total = df_total.iloc[:, :n_columns]
+                add(
+                    "find_fuzzy_periods",
+                    lambda: find_fuzzy_periods(df_total, 0.2, 48, 0, False),
+                    n_years,
+                    n_columns,
+                )
+                add(
+                    "get_dunkelflaute_results",
+                    lambda: get_dunkelflaute_results(
+                        df_total, THRESHOLDS, PERIOD_LENGTHS, return_store=True
+                    ),
+                    n_years,
+                    n_columns,
+                )
+
+            if plots:
+                cwd = os.getcwd()
+                os.chdir(tmp_dir)
+                try:
+                    for name, func in _get_plot_benchmarks(df, n_years):
+                        add(name, func, n_years, 3)
+                finally:
+                    os.chdir(cwd)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "benchmarks": records,
+    }
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def _get_plot_benchmarks(df, n_years):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from dunkelflaute import visualize
+
+    cap_mix = [0.25, 0.5, 0.75]
+    cap_dem_ratio = 1.0
+    df_total = get_total_production_df(df, cap_mix, cap_dem_ratio)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = get_dunkelflaute_results(
+            df_total, THRESHOLDS, PERIOD_LENGTHS, return_store=True
+        )
+    return [
+        (
+            "plot_dunkelflaute_events",
+            lambda: visualize.plot_dunkelflaute_events(
+                results, df_total, cap_mix, THRESHOLDS, PERIOD_LENGTHS
+            ),
+        ),
+        (
+            "plot_period_ts_data",
+            lambda: visualize.plot_period_ts_data(results, df_total, 0.5, 0.35, 48),
+        ),
+        (
+            "plot_period_solar_wind_performance",
+            lambda: visualize.plot_period_solar_wind_performance(
+                results, df, 0.5, 0.35, [48, 96, 168], cap_dem_ratio=cap_dem_ratio
+            ),
+        ),
+        (
+            "plot_dunkelflaute_contour",
+            lambda: visualize.plot_dunkelflaute_contour(
+                results, 0.5, PERIOD_LENGTHS, THRESHOLDS, n_years
+            ),
+        ),
+        (
+            "plot_dunkelflaute_seasonality",
+            lambda: visualize.plot_dunkelflaute_seasonality(
+                results, THRESHOLDS, 48, 0.5, n_years
+            ),
+        ),
+        (
+            "plot_dunkelflaute_seasonality_horizontal",
+            lambda: visualize.plot_dunkelflaute_seasonality_horizontal(
+                results, THRESHOLDS, 48, 0.5, n_years
+            ),
+        ),
+    ]
+
+
+def compare_benchmarks(baseline, current, tolerance=0.2):
+    """
+    Compare two benchmark reports (dictionaries or JSON file paths) and
+    return the benchmarks whose minimum time grew by more than tolerance
+    (relative) as a list of (name, n_years, n_columns, baseline, current).
+    """
+    reports = []
+    for report in [baseline, current]:
+        if isinstance(report, str):
+            with open(report) as f:
+                report = json.load(f)
+        reports.append(
+            {
+                (record["name"], record["n_years"], record["n_columns"]): record["min"]
+                for record in report["benchmarks"]
+            }
+        )
+    baseline, current = reports
+
+    return [
+        key + (baseline[key], current[key])
+        for key in current
+        if key in baseline and current[key] > baseline[key] * (1 + tolerance)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the dunkelflaute detection and plotting paths."
+    )
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--columns", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-plots", action="store_true")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument(
+        "--compare", help="baseline JSON file, exit with 1 on regressions"
+    )
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        args.years, args.columns, args.repeat, not args.no_plots, args.output
+    )
+    for record in report["benchmarks"]:
+        print(
+            f"{record['name']:<42} years={record['n_years']:<3} "
+            f"columns={record['n_columns']:<4} min={record['min']:.4f}s"
+        )
+
+    if args.compare:
+        regressions = compare_benchmarks(args.compare, report, args.tolerance)
+        for name, n_years, n_columns, before, after in regressions:
+            print(
+                f"Regression: {name} years={n_years} columns={n_columns} "
+                f"{before:.4f}s -> {after:.4f}s"
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
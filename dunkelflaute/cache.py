@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+DEFAULT_MAX_SIZE = 1 << 30  # 1 GiB
+
+
+class ResultCache:
+    """
+    Persistent, content-addressed cache of dunkelflaute sweep cells.
+    Every cell holds the periods of one column for one threshold and period
+    length. The key is a hash of the column data (timestamps and values, so
+    it covers the capacity mix and capacity demand ratio), the threshold,
+    the period length and the detection options such as split_long_periods.
+
+    The cells are stored in a single SQLite database. When the total size of
+    the cached periods exceeds max_size bytes, the least recently used cells
+    are evicted.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_size = max_size
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cells ("
+                "key TEXT PRIMARY KEY, data BLOB, size INTEGER, last_access REAL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS cells_last_access ON cells (last_access)"
+            )
+
+    @staticmethod
+    def get_key(data_hash, threshold, period_len, **options):
+        """
+        Get the cache key of a cell.
+        """
+        key = [
+            data_hash,
+            repr(float(threshold)),
+            int(period_len),
+            sorted(options.items()),
+        ]
+        return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+    def get_many(self, keys):
+        """
+        Get the cached cells for the given keys. The function returns a
+        dictionary with (start, end) int64 arrays for the keys that were
+        found, and marks them as recently used.
+        """
+        found = {}
+        for batch in _batches(list(keys)):
+            placeholders = ",".join("?" * len(batch))
+            rows = self._connection.execute(
+                f"SELECT key, data FROM cells WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, data in rows:
+                periods = np.frombuffer(data, dtype=np.int64)
+                found[key] = (
+                    periods[: len(periods) // 2],
+                    periods[len(periods) // 2 :],
+                )
+
+        now = time.time()
+        with self._connection:
+            self._connection.executemany(
+                "UPDATE cells SET last_access = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+        return found
+
+    def put_many(self, cells):
+        """
+        Store cells given as a dictionary {key: (start, end)} of int64 arrays
+        and evict the least recently used cells if the cache is too large.
+        """
+        now = time.time()
+        rows = []
+        for key, (start, end) in cells.items():
+            data = np.concatenate(
+                (np.asarray(start, dtype=np.int64), np.asarray(end, dtype=np.int64))
+            ).tobytes()
+            rows.append((key, data, len(data), now))
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?)", rows
+            )
+        self.evict()
+
+    @property
+    def size(self):
+        """
+        Total size of the cached periods in bytes.
+        """
+        return self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cells"
+        ).fetchone()[0]
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM cells").fetchone()[0]
+
+    def evict(self):
+        """
+        Remove the least recently used cells until the cache fits into max_size.
+        """
+        excess = self.size - self.max_size
+        if excess <= 0:
+            return
+
+        keys = []
+        for key, size in self._connection.execute(
+            "SELECT key, size FROM cells ORDER BY last_access"
+        ):
+            keys.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM cells WHERE key = ?", [(key,) for key in keys]
+            )
+
+    def clear(self):
+        """
+        Remove all cells from the cache.
+        """
+        with self._connection:
+            self._connection.execute("DELETE FROM cells")
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_data_hashes(times, values):
+    """
+    Get a content hash for each column of a (number of columns, number of
+    rows) matrix, including the int64 timestamps.
+    """
+    times_hash = hashlib.sha256(np.ascontiguousarray(times, dtype=np.int64).tobytes())
+    hashes = []
+    for column in values:
+        column_hash = times_hash.copy()
+        column_hash.update(np.ascontiguousarray(column, dtype=np.float64).tobytes())
+        hashes.append(column_hash.hexdigest())
+    return hashes
+
+
+def _batches(items, size=500):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
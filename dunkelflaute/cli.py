@@ -0,0 +1,315 @@
+import argparse
+import os
+import sys
+
+from dunkelflaute.core import get_dunkelflaute_results, get_total_production_df
+from dunkelflaute.instrumentation import print_progress
+from dunkelflaute.utils import FILE_FORMATS, get_number_of_years, load_df
+
+PLOTS = [
+    "events",
+    "ts",
+    "performance",
+    "contour",
+    "seasonality",
+    "seasonality_horizontal",
+]
+CACHE_FILE_NAME = "results.sqlite"
+
+# Options of a sweep config: the required ones and the defaults of the others
+REQUIRED_OPTIONS = ["data", "cap_mix", "thresholds", "period_lengths"]
+CONFIG_DEFAULTS = {
+    "cap_dem_ratio": 1.0,
+    "split_long_periods": False,
+    "tol": 0,
+    "tol_mode": "gap",
+    "mode": "max",
+    "output": None,
+    "plots": {},
+}
+PLOT_DEFAULTS = {
+    "render": PLOTS,
+    "cap_mix": None,
+    "threshold": None,
+    "period_len": None,
+    "performance_period_lengths": None,
+}
+
+
+def load_config(file_path):
+    """
+    Load a sweep config from a TOML (.toml) or YAML (.yaml, .yml) file.
+    The config holds the options of REQUIRED_OPTIONS and CONFIG_DEFAULTS, e.g.
+
+        data = "data/wind_solar_data.csv"
+        cap_mix = [0.25, 0.5, 0.75]
+        cap_dem_ratio = 1.2
+        thresholds = [0.1, 0.2, 0.35]
+        period_lengths = [24, 48, 168]
+
+        [plots]
+        cap_mix = 0.5
+        threshold = 0.35
+        period_len = 168
+
+    Relative paths of data and output are relative to the config file.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".toml":
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(file_path, "rb") as f:
+            config = tomllib.load(f)
+    elif extension in [".yaml", ".yml"]:
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("PyYAML is required to read YAML config files") from None
+        with open(file_path) as f:
+            config = yaml.safe_load(f) or {}
+    else:
+        raise ValueError("config file should be a .toml, .yaml or .yml file")
+
+    config = validate_config(config, file_path)
+    base_dir = os.path.dirname(os.path.abspath(file_path))
+    config["data"] = os.path.normpath(os.path.join(base_dir, config["data"]))
+    if config["output"] is not None:
+        config["output"] = os.path.normpath(os.path.join(base_dir, config["output"]))
+    return config
+
+
+def validate_config(config, file_path):
+    """
+    Check the keys of a sweep config and fill in the defaults.
+    """
+    if not isinstance(config, dict):
+        raise ValueError(f"Config {file_path} should be a mapping")
+    unknown = set(config) - set(REQUIRED_OPTIONS) - set(CONFIG_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Config {file_path} has unknown options: {sorted(unknown)}")
+    missing = [key for key in REQUIRED_OPTIONS if key not in config]
+    if missing:
+        raise ValueError(f"Config {file_path} is missing options: {missing}")
+
+    config = {**CONFIG_DEFAULTS, **config}
+    unknown = set(config["plots"]) - set(PLOT_DEFAULTS)
+    if unknown:
+        raise ValueError(
+            f"Config {file_path} has unknown plot options: {sorted(unknown)}"
+        )
+    config["plots"] = {**PLOT_DEFAULTS, **config["plots"]}
+    if any(plot not in PLOTS for plot in config["plots"]["render"]):
+        raise ValueError(f"Config {file_path}: plots should be a subset of {PLOTS}")
+    return config
+
+
+def run_sweep(
+    config,
+    output=None,
+    n_jobs=None,
+    executor="process",
+    cache_dir=None,
+    plots=None,
+    file_format="svg",
+    progress=None,
+):
+    """
+    Run the sweep of a config (see load_config): compute the total
+    production, find the dunkelflaute periods of all thresholds and period
+    lengths, save them to a binary .npz results file (see
+    DunkelflauteResults.save) and render the given plots. matplotlib is
+    only imported if plots are rendered. The function returns the results
+    store.
+    """
+    if plots is None:
+        plots = config["plots"]["render"]
+    if any(plot not in PLOTS for plot in plots):
+        raise ValueError(f"plots should be a subset of {PLOTS}")
+    output = output if output is not None else config["output"]
+
+    df_wind_solar = load_df(config["data"])
+    df_total = get_total_production_df(
+        df_wind_solar, config["cap_mix"], config["cap_dem_ratio"]
+    )
+    cache = None
+    if cache_dir is not None:
+        from dunkelflaute.cache import ResultCache
+
+        cache = ResultCache(os.path.join(cache_dir, CACHE_FILE_NAME))
+    try:
+        results = get_dunkelflaute_results(
+            df_total,
+            config["thresholds"],
+            config["period_lengths"],
+            config["split_long_periods"],
+            return_store=True,
+            n_jobs=n_jobs,
+            executor=executor,
+            cache=cache,
+            tol=config["tol"],
+            tol_mode=config["tol_mode"],
+            mode=config["mode"],
+            progress=progress,
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+    if output is not None:
+        if os.path.dirname(output):
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        results.save(output)
+
+    if plots:
+        render_plots(
+            results, df_wind_solar, df_total, config, plots, file_format, n_jobs
+        )
+    return results
+
+
+def render_plots(
+    results, df_wind_solar, df_total, config, plots, file_format="svg", n_jobs=None
+):
+    """
+    Render the given plots (see PLOTS) of a sweep into the 'plots' directory.
+    The capacity mix, threshold and period length of the single-cell plots
+    default to the first value of the sweep.
+    """
+    if isinstance(config["cap_dem_ratio"], list):
+        raise ValueError("plots can only be rendered for a single cap_dem_ratio")
+    from dunkelflaute import visualize
+
+    plot_config = config["plots"]
+    cap_mix = _get_plot_option(plot_config, "cap_mix", config["cap_mix"])
+    threshold = _get_plot_option(plot_config, "threshold", config["thresholds"])
+    period_len = _get_plot_option(plot_config, "period_len", config["period_lengths"])
+    performance_period_lengths = plot_config["performance_period_lengths"] or [
+        period_len
+    ]
+    no_years = get_number_of_years(df_total)
+
+    if "events" in plots:
+        visualize.plot_dunkelflaute_events(
+            results,
+            df_total,
+            config["cap_mix"],
+            config["thresholds"],
+            config["period_lengths"],
+            file_format=file_format,
+        )
+    if "ts" in plots:
+        visualize.plot_period_ts_data(
+            results,
+            df_total,
+            cap_mix,
+            threshold,
+            period_len,
+            file_format=file_format,
+            n_jobs=n_jobs,
+        )
+    if "performance" in plots:
+        visualize.plot_period_solar_wind_performance(
+            results,
+            df_wind_solar,
+            cap_mix,
+            threshold,
+            performance_period_lengths,
+            file_format=file_format,
+            cap_dem_ratio=config["cap_dem_ratio"],
+        )
+    if "contour" in plots:
+        visualize.plot_dunkelflaute_contour(
+            results,
+            cap_mix,
+            config["period_lengths"],
+            config["thresholds"],
+            no_years,
+            file_format=file_format,
+        )
+    if "seasonality" in plots:
+        for time_unit in ["month", "season"]:
+            visualize.plot_dunkelflaute_seasonality(
+                results,
+                config["thresholds"],
+                period_len,
+                cap_mix,
+                no_years,
+                time_unit=time_unit,
+                file_format=file_format,
+            )
+    if "seasonality_horizontal" in plots:
+        for abs_rel in ["absolute", "relative"]:
+            visualize.plot_dunkelflaute_seasonality_horizontal(
+                results,
+                config["thresholds"],
+                period_len,
+                cap_mix,
+                no_years,
+                abs_rel=abs_rel,
+                file_format=file_format,
+            )
+
+
+def _get_plot_option(plot_config, name, values):
+    value = plot_config[name]
+    if value is None:
+        return values[0]
+    if value not in values:
+        raise ValueError(f"plot {name} {value} is not part of the sweep")
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="dunkelflaute",
+        description="Run dunkelflaute sweeps from TOML or YAML config files.",
+    )
+    parser.add_argument("configs", nargs="+", help="sweep config files")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="results file (.npz), only for a single config; "
+        "defaults to the output option of the config or <config name>.npz",
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, help="number of workers, -1 for all CPU cores"
+    )
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    parser.add_argument("--cache-dir", help="directory of the persistent result cache")
+    parser.add_argument("--format", choices=FILE_FORMATS, default="svg")
+    plot_group = parser.add_mutually_exclusive_group()
+    plot_group.add_argument(
+        "--plots", nargs="+", choices=PLOTS, help="plots to render (default: config)"
+    )
+    plot_group.add_argument("--no-plots", action="store_true")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no progress")
+    args = parser.parse_args(argv)
+
+    if args.output is not None and len(args.configs) > 1:
+        parser.error("--output can only be used with a single config")
+
+    for config_path in args.configs:
+        config = load_config(config_path)
+        output = args.output or config["output"]
+        if output is None:
+            output = os.path.splitext(config_path)[0] + ".npz"
+        if not args.quiet:
+            print(f"Running {config_path}")
+        results = run_sweep(
+            config,
+            output=output,
+            n_jobs=args.workers,
+            executor=args.executor,
+            cache_dir=args.cache_dir,
+            plots=[] if args.no_plots else args.plots,
+            file_format=args.format,
+            progress=None if args.quiet else print_progress,
+        )
+        if not args.quiet:
+            print(f"Saved {results.n_events} periods to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,21 @@
+import numpy as np
 import pandas as pd
-import time
+
+from dunkelflaute.instrumentation import Instrumentation
+from dunkelflaute.parallel import get_n_jobs, map_shared
+from dunkelflaute.results import DunkelflauteResults, _timestamps_to_ns
+from dunkelflaute.storage import MemmapTimeSeries
+
+from dunkelflaute.utils import (
+    HOUR_NS,
+    validate_cap_dem_ratio,
+    validate_mode,
+    validate_period_length,
+    validate_threshold,
+    validate_tolerance,
+)
+
+MEAN_ATOL = 1e-9  # absolute tolerance of the window means in find_mean_runs
 
 
 def get_total_production_df(df, cap_mix: list = [0.5], cap_dem_ratio: float = 1.0):
@@ -13,6 +29,31 @@ def get_total_production_df(df, cap_mix: list = [0.5], cap_dem_ratio: float = 1.
         'w0.75_s0.25': [production, ...],
         ...
     }
+    If cap_dem_ratio is a list, all combinations of capacity mix and capacity
+    demand ratio are returned, e.g. 'w0.50_s0.50_r1.20'.
+    The dataframe is a view on the matrix of get_total_production_matrix.
+    For a MemmapTimeSeries, the production is written chunk by chunk to a
+    new memory-mapped store, which is returned instead of a dataframe.
+    """
+
+    if isinstance(df, MemmapTimeSeries):
+        return df.get_total_production(cap_mix, cap_dem_ratio)
+
+    values, columns = get_total_production_matrix(df, cap_mix, cap_dem_ratio)
+    return pd.DataFrame(values.T, index=df.index, columns=columns, copy=False)
+
+
+def get_total_production_matrix(
+    df, cap_mix: list = [0.5], cap_dem_ratio: float = 1.0, dtype=np.float64
+):
+    """
+    Get the total production for all capacity mixes (and optionally a list of
+    capacity demand ratios) as a single 2-D matrix of shape
+    (number of columns, number of rows), computed in one broadcast operation.
+    Each row of the matrix is the production time series of one column, so
+    it can be passed to the period detection without creating a dataframe
+    per mix. The function returns the matrix and the list of column names,
+    which are the same as in get_total_production_df.
     """
 
     if not isinstance(cap_mix, list):
@@ -21,17 +62,42 @@ def get_total_production_df(df, cap_mix: list = [0.5], cap_dem_ratio: float = 1.
         raise ValueError("cap_mix should not be empty")
     if any([cap < 0 or cap > 1 for cap in cap_mix]):
         raise ValueError("cap_mix should be between 0 and 1")
+    if isinstance(cap_dem_ratio, list):
+        if len(cap_dem_ratio) == 0:
+            raise ValueError("cap_dem_ratio should not be empty")
+        ratios = cap_dem_ratio
+    else:
+        ratios = [cap_dem_ratio]
+    if not all(isinstance(ratio, (int, float)) for ratio in ratios):
+        raise ValueError("cap_dem_ratio should be a number or a list of numbers")
 
-    df_total = pd.DataFrame(index=df.index)
-    for cap in cap_mix:
-        df_total[f"w{cap:2.2f}_s{1-cap:2.2f}"] = cap_dem_ratio * df[
-            "wind"
-        ] * cap + cap_dem_ratio * df["solar"] * (1 - cap)
-    return df_total
+    caps = np.asarray(cap_mix, dtype=float)[np.newaxis, :, np.newaxis]
+    ratio_col = np.asarray(ratios, dtype=float)[:, np.newaxis]
+    # Scale by the ratio first to keep the same order of operations as the
+    # per-column formula, which makes the results bit-identical
+    wind = (ratio_col * np.asarray(df["wind"], dtype=float))[:, np.newaxis, :]
+    solar = (ratio_col * np.asarray(df["solar"], dtype=float))[:, np.newaxis, :]
+    values = wind * caps + solar * (1 - caps)
+    values = values.reshape(len(ratios) * len(cap_mix), -1).astype(dtype, copy=False)
+
+    columns = [
+        f"w{cap:2.2f}_s{1-cap:2.2f}"
+        + (f"_r{ratio:2.2f}" if isinstance(cap_dem_ratio, list) else "")
+        for ratio in ratios
+        for cap in cap_mix
+    ]
+    return values, columns
 
 
 def find_fuzzy_periods(
-    df, threshold=0.1, period_len=7 * 24, tol=0, split_long_periods=True
+    df,
+    threshold=0.1,
+    period_len=7 * 24,
+    tol=0,
+    split_long_periods=True,
+    tol_mode="gap",
+    mode="max",
+    instrumentation=None,
 ):
     """
     Find periods in a dataframe where the values are below a given threshold
@@ -44,82 +110,97 @@ def find_fuzzy_periods(
             ...
         ]
     }
+    With tol, the periods may contain short stretches of values above the
+    threshold (hours for hourly data): up to tol values per gap (tol_mode
+    "gap") or up to tol values in total (tol_mode "total"), see merge_runs.
+
+    With mode "mean", a period is not required to have every value below
+    the threshold, but every value must belong to a window of period_len
+    hours whose mean is at or below the threshold (an energy deficit
+    definition), see find_mean_runs.
+
+    The time per phase and the number of rows, runs and events are recorded
+    in instrumentation, if an Instrumentation is given.
     """
 
-    if not isinstance(df, pd.DataFrame):
+    if not isinstance(df, (pd.DataFrame, MemmapTimeSeries)):
         raise ValueError("df should be a pandas dataframe")
     if not isinstance(threshold, (int, float)):
         raise ValueError("threshold should be a number")
     if not isinstance(period_len, int):
         raise ValueError("period_len should be an integer")
-    if not isinstance(tol, int):
-        raise ValueError("tol should be an integer")
+    validate_tolerance(tol, tol_mode)
+    validate_mode(mode, tol)
+
+    if instrumentation is None:
+        instrumentation = Instrumentation()
 
     results = {}
-    time_grouper = 0
-    time_condition = 0
-    time_filter = 0
-
-    for col in df.columns:
-        # Create a grouper for consecutive periods below the threshold
-        start_time = time.time()
-        group_ids = df[col].le(threshold).diff().ne(0).cumsum()
-        # Reset index to make it accessible in groupby
-        df["group_id"] = group_ids
-        df_reset = df.reset_index()
-
-        time_grouper += time.time() - start_time
-
-        # Compute group statistics in a vectorized way
-        start_time = time.time()
-        group_stats = df_reset.groupby("group_id").agg(
-            start=("datetime", "first"),
-            end=("datetime", "last"),
-            max_value=(col, "max"),
-        )
-        group_stats["duration"] = (
-            group_stats["end"] - group_stats["start"]
-        ).dt.total_seconds() / 3600
-        time_condition += time.time() - start_time
-
-        # Filter groups based on conditions
-        start_time = time.time()
-        valid_groups = group_stats[
-            (group_stats["max_value"] <= threshold)
-            & (group_stats["duration"] >= period_len)
-        ]
-        periods = list(zip(valid_groups["start"], valid_groups["end"]))
-
-        # Optionally split long periods (if split_long_periods is True)
-        # The idea is to split long periods into smaller ones if they exceed the period length
-        # Only split if each period is longer than the specified period length
-
-        if split_long_periods:
-            split_periods = []
-            for start, end in periods:
-                duration = (end - start).total_seconds() / 3600
-                if duration > period_len:
-                    # Split into smaller periods
-                    num_splits = int(duration // period_len)
-                    for i in range(num_splits):
-                        split_start = start + pd.Timedelta(hours=i * period_len)
-                        split_end = start + pd.Timedelta(hours=(i + 1) * period_len)
-                        split_periods.append((split_start, split_end))
+    times, tz = _get_times(df)
+    with instrumentation.run():
+        for col in df.columns:
+            # Find the runs of consecutive values below the threshold
+            with instrumentation.phase("grouping"):
+                if mode == "mean":
+                    starts, ends, _, _ = find_mean_runs(
+                        df[col], [threshold], [period_len]
+                    )
                 else:
-                    split_periods.append((start, end))
-            periods = split_periods
+                    starts, ends = find_runs(
+                        np.asarray(df[col], dtype=float), threshold
+                    )
+                if tol > 0:
+                    starts, ends = merge_runs(starts, ends, tol, tol_mode)
+
+            # Compute the run durations from the int64 datetime index
+            with instrumentation.phase("aggregation"):
+                durations = times[ends] - times[starts]
+
+            # Filter runs based on the period length
+            with instrumentation.phase("filtering"):
+                valid = durations >= period_len * HOUR_NS
+                period_starts = times[starts[valid]]
+                period_ends = times[ends[valid]]
+
+            # Optionally split long periods (if split_long_periods is True)
+            # The idea is to split long periods into smaller ones if they exceed the period length
+            # Only split if each period is longer than the specified period length
+            if split_long_periods:
+                with instrumentation.phase("splitting"):
+                    period_starts, period_ends = split_period_arrays(
+                        period_starts, period_ends, period_len
+                    )
 
-        time_filter += time.time() - start_time
+            with instrumentation.phase("conversion"):
+                results[col] = list(
+                    zip(
+                        _ns_to_timestamps(period_starts, tz),
+                        _ns_to_timestamps(period_ends, tz),
+                    )
+                )
 
-        results[col] = periods
+            instrumentation.count("rows", len(times))
+            instrumentation.count("runs", len(starts))
+            instrumentation.count("events", len(period_starts))
 
-    # print(f"Time taken for grouper: {time_grouper:.2f} seconds")
-    # print(f"Time taken for condition: {time_condition:.2f} seconds")
-    # print(f"Time taken for filter: {time_filter:.2f} seconds")
     return results
 
 
-def get_dunkelflaute_results(df, thresholds, period_lenghts, split_long_periods=False):
+def get_dunkelflaute_results(
+    df,
+    thresholds,
+    period_lenghts,
+    split_long_periods=False,
+    return_store=False,
+    n_jobs=None,
+    executor="process",
+    cache=None,
+    tol=0,
+    tol_mode="gap",
+    mode="max",
+    progress=None,
+    instrumentation=None,
+):
     """
     Get the dunkelflaute results for a given dataframe, thresholds and period lengths.
     The results are stored in a dictionary with the following structure:
@@ -133,25 +214,724 @@ def get_dunkelflaute_results(df, thresholds, period_lenghts, split_long_periods=
         },
         ...
     }
+    If return_store is True, a columnar DunkelflauteResults store is returned
+    instead. It supports the same results[threshold][period_length][col]
+    access, but keeps all periods in compact int64 arrays.
+
+    The sweep can be split across workers with n_jobs (-1 for all CPU cores).
+    The executor is either "process" (the production series are placed in
+    shared memory once) or "thread". The results are identical to the serial run.
+
+    With cache (a ResultCache or the path of its database file), every
+    (column, threshold, period length) cell is looked up in a persistent
+    cache first, and only the thresholds with missing cells are computed.
+
+    tol and tol_mode allow gaps above the threshold, and mode "mean" uses
+    the sliding mean definition, see find_fuzzy_periods.
+
+    progress is called as progress(done, total) with the number of finished
+    (column, threshold, period length) cells, once the cache has been read
+    and after every task. With an Instrumentation, the time per phase (added
+    up over all workers) and the numbers of rows, runs, events and cells are
+    recorded, see Instrumentation.
     """
 
     if not isinstance(thresholds, list):
         raise ValueError("thresholds should be a list")
     if len(thresholds) == 0:
         raise ValueError("thresholds should not be empty")
-
-    result = {}
     for threshold in thresholds:
-        result[threshold] = {}
-        for period_len in period_lenghts:
-            print(
-                f"Found periods for threshold={threshold}, min. period length={period_len}"
+        validate_threshold(threshold)
+    for period_len in period_lenghts:
+        validate_period_length(period_len)
+    validate_tolerance(tol, tol_mode)
+    validate_mode(mode, tol)
+
+    if cache is not None:
+        from dunkelflaute.cache import ResultCache
+
+        if not isinstance(cache, ResultCache):
+            # A cache opened from a path belongs to this call and is closed
+            # afterwards, a ResultCache of the caller stays open
+            with ResultCache(cache) as cache:
+                return get_dunkelflaute_results(
+                    df,
+                    thresholds,
+                    period_lenghts,
+                    split_long_periods,
+                    return_store,
+                    n_jobs,
+                    executor,
+                    cache,
+                    tol,
+                    tol_mode,
+                    mode,
+                    progress,
+                    instrumentation,
+                )
+
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+
+    values = _get_values(df)
+    times, tz = _get_times(df)
+    columns = list(df.columns)
+    total_cells = len(columns) * len(thresholds) * len(period_lenghts)
+
+    with instrumentation.run():
+        # Look up the cells that are already cached, and find the thresholds
+        # that have to be computed for each column
+        cached = {}
+        missing = [list(range(len(thresholds))) for _ in columns]
+        if cache is not None:
+            from dunkelflaute.cache import ResultCache, get_data_hashes
+
+            with instrumentation.phase("cache"):
+                data_hashes = get_data_hashes(times, values)
+                keys = {
+                    (k, i, j): ResultCache.get_key(
+                        data_hashes[k],
+                        threshold,
+                        period_len,
+                        split_long_periods=bool(split_long_periods),
+                        tol=tol,
+                        tol_mode=tol_mode,
+                        mode=mode,
+                    )
+                    for k in range(len(columns))
+                    for i, threshold in enumerate(thresholds)
+                    for j, period_len in enumerate(period_lenghts)
+                }
+                found = cache.get_many(keys.values())
+                cached = {
+                    cell: found[key] for cell, key in keys.items() if key in found
+                }
+                missing = [
+                    [
+                        i
+                        for i in range(len(thresholds))
+                        if any(
+                            (k, i, j) not in cached for j in range(len(period_lenghts))
+                        )
+                    ]
+                    for k in range(len(columns))
+                ]
+
+        # Split the thresholds into blocks so that there are enough tasks for
+        # all workers, while each task still shares the work across thresholds
+        max_blocks = -(-get_n_jobs(n_jobs) // max(len(columns), 1))
+        tasks = [
+            (
+                k,
+                [thresholds[i] for i in block],
+                block,
+                period_lenghts,
+                split_long_periods,
+                tol,
+                tol_mode,
+                mode,
             )
-            result[threshold][period_len] = find_fuzzy_periods(
-                df,
-                threshold=threshold,
-                period_len=period_len,
-                split_long_periods=split_long_periods,
+            for k in range(len(columns))
+            if missing[k]
+            for block in np.array_split(
+                np.array(missing[k]), min(len(missing[k]), max_blocks)
             )
+        ]
+
+        done_cells = total_cells - sum(
+            len(task[2]) * len(period_lenghts) for task in tasks
+        )
+        instrumentation.count("cells", total_cells)
+        instrumentation.count("cached_cells", done_cells)
+        if progress is not None and done_cells > 0:
+            progress(done_cells, total_cells)
+
+        def on_result(task, result):
+            nonlocal done_cells
+            instrumentation.merge(result[-1])
+            done_cells += len(task[2]) * len(period_lenghts)
+            if progress is not None:
+                progress(done_cells, total_cells)
+
+        task_results = map_shared(
+            _find_column_periods,
+            tasks,
+            {"values": values, "times": times},
+            n_jobs=n_jobs,
+            executor=executor,
+            callback=on_result,
+        )
+        task_results = [result[:-1] for result in task_results]
+
+        parts = [(task[0],) + result for task, result in zip(tasks, task_results)]
+        if cache is not None:
+            with instrumentation.phase("cache"):
+                new_cells = {}
+                for task, (starts, ends, threshold_ids, period_ids) in zip(
+                    tasks, task_results
+                ):
+                    k, _, block = task[:3]
+                    for (i, j), (cell_starts, cell_ends) in _split_cells(
+                        starts,
+                        ends,
+                        threshold_ids,
+                        period_ids,
+                        block,
+                        len(period_lenghts),
+                    ).items():
+                        new_cells[keys[k, i, j]] = (cell_starts, cell_ends)
+                cache.put_many(new_cells)
+
+            for (k, i, j), (starts, ends) in cached.items():
+                if i not in missing[k]:
+                    parts.append(
+                        (
+                            k,
+                            starts,
+                            ends,
+                            np.full(len(starts), i),
+                            np.full(len(starts), j),
+                        )
+                    )
+
+        with instrumentation.phase("store"):
+            store = DunkelflauteResults(
+                _concatenate([starts for _, starts, _, _, _ in parts]),
+                _concatenate([ends for _, _, ends, _, _ in parts]),
+                _concatenate([np.full(len(part[1]), part[0]) for part in parts]),
+                _concatenate([ids for _, _, _, ids, _ in parts]),
+                _concatenate([ids for _, _, _, _, ids in parts]),
+                columns,
+                thresholds,
+                period_lenghts,
+                tz=tz,
+            )
+        if return_store:
+            return store
+        with instrumentation.phase("conversion"):
+            return store.to_dict()
+
+
+def _split_cells(starts, ends, threshold_ids, period_ids, block, n_periods):
+    """
+    Split the periods of a task into cells {(threshold id, period id): (start, end)}
+    for all thresholds of the block and all period lengths, including empty cells.
+    """
+    # The periods are ordered by threshold id and period id
+    cell_ids = np.searchsorted(block, threshold_ids) * n_periods + period_ids
+    offsets = np.concatenate(
+        ([0], np.cumsum(np.bincount(cell_ids, minlength=len(block) * n_periods)))
+    )
+    return {
+        (i, j): (
+            starts[offsets[b * n_periods + j] : offsets[b * n_periods + j + 1]],
+            ends[offsets[b * n_periods + j] : offsets[b * n_periods + j + 1]],
+        )
+        for b, i in enumerate(block)
+        for j in range(n_periods)
+    }
+
+
+def _find_column_periods(
+    arrays,
+    col_id,
+    thresholds,
+    threshold_ids,
+    period_lengths,
+    split_long_periods,
+    tol=0,
+    tol_mode="gap",
+    mode="max",
+):
+    """
+    Find the periods of a single column for a block of thresholds and all
+    period lengths. The function returns four arrays of equal length:
+    (start, end, threshold id, period id), with start and end as int64
+    nanoseconds since epoch, and the Instrumentation of the task.
+    """
+    instrumentation = Instrumentation()
+    times = arrays["times"]
+    values = arrays["values"][col_id]
+    instrumentation.count("rows", len(values))
+    if mode == "mean":
+        return _find_column_mean_periods(
+            times,
+            values,
+            thresholds,
+            threshold_ids,
+            period_lengths,
+            split_long_periods,
+            instrumentation,
+        ) + (instrumentation,)
+
+    # All thresholds are evaluated in one pass over the column, and the
+    # runs of each threshold are reused for every period length
+    with instrumentation.phase("grouping"):
+        run_starts, run_ends, run_threshold_ids = find_runs_multi(values, thresholds)
+        if tol > 0:
+            run_starts, run_ends, run_threshold_ids = merge_runs(
+                run_starts, run_ends, tol, tol_mode, run_threshold_ids
+            )
+    instrumentation.count("runs", len(run_starts))
+    return _get_periods_from_runs(
+        times[run_starts],
+        times[run_ends],
+        np.asarray(threshold_ids)[run_threshold_ids],
+        period_lengths,
+        split_long_periods,
+        instrumentation,
+    ) + (instrumentation,)
+
+
+def _find_column_mean_periods(
+    times,
+    values,
+    thresholds,
+    threshold_ids,
+    period_lengths,
+    split_long_periods,
+    instrumentation,
+):
+    """
+    Find the periods of a single column with the sliding mean definition,
+    see _find_column_periods.
+    """
+    with instrumentation.phase("grouping"):
+        run_starts, run_ends, run_threshold_ids, run_period_ids = find_mean_runs(
+            values, thresholds, period_lengths
+        )
+    instrumentation.count("runs", len(run_starts))
+    parts = []
+    for j, period_len in enumerate(period_lengths):
+        # The runs are ordered by period id, so each period length is a slice
+        lo, hi = np.searchsorted(run_period_ids, [j, j + 1])
+        starts, ends, ids, _ = _get_periods_from_runs(
+            times[run_starts[lo:hi]],
+            times[run_ends[lo:hi]],
+            np.asarray(threshold_ids)[run_threshold_ids[lo:hi]],
+            [period_len],
+            split_long_periods,
+            instrumentation,
+        )
+        parts.append((starts, ends, ids, np.full(len(starts), j)))
+
+    starts, ends, ids, period_ids = (
+        _concatenate([part[i] for part in parts]) for i in range(4)
+    )
+    # Order by threshold id and period id, like _get_periods_from_runs
+    order = np.lexsort((starts, period_ids, ids))
+    return starts[order], ends[order], ids[order], period_ids[order]
+
+
+def _get_periods_from_runs(
+    run_starts,
+    run_ends,
+    run_threshold_ids,
+    period_lengths,
+    split_long_periods,
+    instrumentation=None,
+):
+    """
+    Get the periods of every period length from runs given as int64
+    nanosecond start and end arrays, ordered by threshold id and then time.
+    The function returns four arrays of equal length:
+    (start, end, threshold id, period id).
+    """
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+
+    with instrumentation.phase("aggregation"):
+        durations = run_ends - run_starts
+
+    starts, ends, threshold_ids, period_ids = [], [], [], []
+    # Runs are ordered by threshold id, so each threshold is a slice
+    bounds = np.flatnonzero(np.diff(run_threshold_ids, prepend=-1, append=-1))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        runs = slice(lo, hi)
+        for j, period_len in enumerate(period_lengths):
+            with instrumentation.phase("filtering"):
+                valid = durations[runs] >= period_len * HOUR_NS
+                period_starts = run_starts[runs][valid]
+                period_ends = run_ends[runs][valid]
+            if split_long_periods:
+                with instrumentation.phase("splitting"):
+                    period_starts, period_ends = split_period_arrays(
+                        period_starts, period_ends, period_len
+                    )
+            instrumentation.count("events", len(period_starts))
+            starts.append(period_starts)
+            ends.append(period_ends)
+            threshold_ids.append(np.full(len(period_starts), run_threshold_ids[lo]))
+            period_ids.append(np.full(len(period_starts), j))
+
+    return (
+        _concatenate(starts),
+        _concatenate(ends),
+        _concatenate(threshold_ids),
+        _concatenate(period_ids),
+    )
+
+
+def get_event_statistics(
+    results, df_wind_solar, cap_mix, threshold, period_len, *, cap_dem_ratio
+):
+    """
+    Get a table of statistics of every dunkelflaute event for a given
+    capacity mix, cap. factor threshold and period length (or list of period
+    lengths). cap_dem_ratio must be the capacity demand ratio of the
+    production the events were detected on, so that the statistics are
+    computed on the same series; the columns of a sweep over a list of
+    ratios (e.g. 'w0.50_s0.50_r1.20') are selected by it. The function
+    returns a dataframe with one row per event and the columns:
+    - period_len, event: the period length and the number of the event
+    - start, end, duration: the event times and the duration in hours
+    - mean_wind, mean_solar: the mean wind and solar production
+    - mean, min: the mean and minimum total production
+    - energy_deficit: the sum of the production missing to the threshold,
+      in capacity factor hours for hourly data
+    All events are evaluated at once with cumulative sums indexed by the
+    event start and end positions. NaN values are skipped like in pandas.
+    """
+    if not isinstance(period_len, list):
+        period_len = [period_len]
+    validate_cap_dem_ratio(cap_dem_ratio)
+    col = f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"
+    if isinstance(results, DunkelflauteResults):
+        columns = results.columns
+    else:
+        columns = results[threshold][period_len[0]] if period_len else {}
+    if f"{col}_r{cap_dem_ratio:2.2f}" in columns:
+        col = f"{col}_r{cap_dem_ratio:2.2f}"
+
+    starts, ends, period_lens, numbers = [], [], [], []
+    for plen in period_len:
+        if isinstance(results, DunkelflauteResults):
+            cell_starts, cell_ends = results.get_periods(threshold, plen, col)
+        else:
+            periods = results[threshold][plen][col]
+            cell_starts = _timestamps_to_ns([start for start, _ in periods])
+            cell_ends = _timestamps_to_ns([end for _, end in periods])
+        starts.append(cell_starts)
+        ends.append(cell_ends)
+        period_lens.append(np.full(len(cell_starts), plen))
+        numbers.append(np.arange(len(cell_starts)))
+    starts, ends = _concatenate(starts), _concatenate(ends)
+
+    times, tz = _get_times(df_wind_solar)
+    production, _ = get_total_production_matrix(df_wind_solar, [cap_mix], cap_dem_ratio)
+    series = {
+        "wind": np.asarray(df_wind_solar["wind"], dtype=float),
+        "solar": np.asarray(df_wind_solar["solar"], dtype=float),
+        "total": production[0],
+        "deficit": np.maximum(threshold - production[0], 0),
+    }
+    # Positions of the first and after the last value of each event
+    lo = np.searchsorted(times, starts, "left")
+    hi = np.searchsorted(times, ends, "right")
+
+    sums = {}
+    for name, values in series.items():
+        valid = ~np.isnan(values)
+        cum_sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0))))
+        cum_counts = np.concatenate(([0], np.cumsum(valid)))
+        sums[name] = (cum_sums[hi] - cum_sums[lo], cum_counts[hi] - cum_counts[lo])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = {name: total / count for name, (total, count) in sums.items()}
+    if len(starts) > 0:
+        # Minimum of each [lo, hi) range, NaN only if all values are NaN
+        padded = np.append(series["total"], np.nan)
+        bounds = np.column_stack((lo, hi)).ravel()
+        minimums = np.fmin.reduceat(padded, bounds)[::2]
+    else:
+        minimums = np.empty(0)
+
+    return pd.DataFrame(
+        {
+            "period_len": _concatenate(period_lens),
+            "event": _concatenate(numbers),
+            "start": _ns_to_datetime_index(starts, tz),
+            "end": _ns_to_datetime_index(ends, tz),
+            "duration": (ends - starts) / HOUR_NS,
+            "mean_wind": means["wind"],
+            "mean_solar": means["solar"],
+            "mean": means["total"],
+            "min": minimums,
+            "energy_deficit": sums["deficit"][0],
+        }
+    )
+
+
+def find_runs(values, threshold):
+    """
+    Find runs of consecutive values at or below the threshold in a 1-D array.
+    NaN values never belong to a run. The function returns two arrays of
+    equal length: (start positions, end positions), where the end position
+    is inclusive.
+    """
+    below = np.asarray(values, dtype=float) <= threshold
+    starts = np.flatnonzero(below & ~np.concatenate(([False], below[:-1])))
+    ends = np.flatnonzero(below & ~np.concatenate((below[1:], [False])))
+    return starts, ends
+
+
+def find_runs_multi(values, thresholds):
+    """
+    Find runs of consecutive values at or below each of the given thresholds.
+    The comparison is done for all thresholds at once on a 2-D boolean mask,
+    so the data is only scanned once per column. NaN values never belong to
+    a run. The function returns three arrays of equal length:
+    (start positions, end positions, threshold ids), where the end position
+    is inclusive and the runs are ordered by threshold id and then by time.
+    """
+    values = np.asarray(values, dtype=float)
+    below = values[np.newaxis, :] <= np.asarray(thresholds, dtype=float)[:, np.newaxis]
+    return _find_mask_runs(below)
+
+
+def _find_mask_runs(mask):
+    """
+    Find runs of consecutive True values in every row of a 2-D boolean mask.
+    The function returns three arrays of equal length:
+    (start positions, end positions, row ids), where the end position is
+    inclusive and the runs are ordered by row id and then by time.
+    """
+    # Pad each row with False so that every run has a rising and falling edge
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
 
-    return result
+    row_ids, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return starts, ends - 1, row_ids
+
+
+def find_mean_runs(values, thresholds, period_lengths):
+    """
+    Find the periods in which every value belongs to a window of
+    period_len + 1 consecutive values (period_len hours for hourly data)
+    whose mean is at or below the threshold, for all thresholds and period
+    lengths. Windows that overlap or touch are merged, so the periods are
+    maximal and neither overlap nor touch. If all values are below the threshold, these are the
+    runs of find_runs. Windows with NaN values never qualify.
+
+    The window sums of all period lengths are taken from a single
+    cumulative sum, and the window means are compared with all thresholds
+    at once by a search in the sorted thresholds. Means within MEAN_ATOL of
+    a threshold count as equal to it, to absorb the rounding of the sums.
+    The function returns four
+    arrays of equal length: (start positions, end positions, threshold ids,
+    period ids), where the end position is inclusive and the periods are
+    ordered by period id, threshold id and time.
+    """
+    values = np.asarray(values, dtype=float)
+    is_nan = np.isnan(values)
+    # Centering the values keeps the rounding error of the window sums small
+    center = values[~is_nan].mean() if not is_nan.all() else 0.0
+    cum_values = np.concatenate(
+        ([0.0], np.cumsum(np.where(is_nan, 0.0, values - center)))
+    )
+    cum_nans = np.concatenate(([0], np.cumsum(is_nan)))
+
+    thresholds = np.asarray(thresholds, dtype=float)
+    order = np.argsort(thresholds, kind="stable")
+    sorted_thresholds = thresholds[order] - center + MEAN_ATOL
+    n_thresholds = len(thresholds)
+
+    starts, ends, threshold_ids, period_ids = [], [], [], []
+    for j, period_len in enumerate(period_lengths):
+        size = period_len + 1
+        if size > len(values):
+            continue
+        means = (cum_values[size:] - cum_values[:-size]) / size
+        means[cum_nans[size:] != cum_nans[:-size]] = np.inf
+
+        # The window at position i qualifies for the sorted thresholds from
+        # first[i] on, so a run of windows starts at i for the thresholds in
+        # [first[i], first[i - 1]) and ends at i for [first[i], first[i + 1])
+        first = np.searchsorted(sorted_thresholds, means, "left")
+        padded = np.concatenate(([n_thresholds], first, [n_thresholds]))
+        window_starts, start_ids = _expand_ranges(first, padded[:-2])
+        window_ends, end_ids = _expand_ranges(first, padded[2:])
+        start_ids = order[start_ids]
+        end_ids = order[end_ids]
+        start_order = np.lexsort((window_starts, start_ids))
+        end_order = np.lexsort((window_ends, end_ids))
+
+        # Windows of a threshold that overlap or touch form one period
+        run_starts, last_starts, run_ids = merge_runs(
+            window_starts[start_order],
+            window_ends[end_order],
+            period_len,
+            "gap",
+            start_ids[start_order],
+        )
+        starts.append(run_starts)
+        ends.append(last_starts + period_len)
+        threshold_ids.append(run_ids)
+        period_ids.append(np.full(len(run_starts), j))
+
+    return (
+        _concatenate(starts),
+        _concatenate(ends),
+        _concatenate(threshold_ids),
+        _concatenate(period_ids),
+    )
+
+
+def _expand_ranges(lo, hi):
+    """
+    Expand the integer ranges [lo, hi) into (position of the range, value)
+    arrays, where empty and negative ranges are skipped.
+    """
+    counts = np.maximum(hi - lo, 0)
+    first = np.cumsum(counts) - counts
+    positions = np.repeat(np.arange(len(lo)), counts)
+    values = np.arange(counts.sum()) - np.repeat(first - lo, counts)
+    return positions, values
+
+
+def merge_runs(starts, ends, tol, tol_mode="gap", run_ids=None):
+    """
+    Merge runs (start and inclusive end positions, ordered by time) that are
+    separated by short gaps of values above the threshold. With tol_mode
+    "gap", every gap of at most tol values is bridged. With tol_mode "total",
+    a merged run may contain at most tol values above the threshold in total,
+    and the runs are merged greedily from left to right.
+    Runs with different run_ids (e.g. threshold ids) are never merged.
+    The function returns the merged (starts, ends) and, if run_ids are
+    given, the run id of every merged run.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    if run_ids is not None:
+        run_ids = np.asarray(run_ids)
+    if len(starts) == 0:
+        return (starts, ends) if run_ids is None else (starts, ends, run_ids)
+
+    # Number of values above the threshold between consecutive runs
+    gaps = starts[1:] - ends[:-1] - 1
+    if run_ids is not None:
+        gaps[run_ids[1:] != run_ids[:-1]] = tol + 1
+
+    if tol_mode == "gap":
+        first = np.flatnonzero(np.concatenate(([True], gaps > tol)))
+    else:
+        # Jump from the first run of a merged run to the last run whose
+        # cumulative gap still fits into the tolerance
+        cum_gaps = np.concatenate(([0], np.cumsum(gaps)))
+        next_first = np.searchsorted(cum_gaps, cum_gaps + tol, "right").tolist()
+        first = []
+        i = 0
+        while i < len(starts):
+            first.append(i)
+            i = next_first[i]
+        first = np.array(first, dtype=np.int64)
+    last = np.concatenate((first[1:], [len(starts)])) - 1
+
+    if run_ids is None:
+        return starts[first], ends[last]
+    return starts[first], ends[last], run_ids[first]
+
+
+def split_periods(periods, period_len):
+    """
+    Split periods that are longer than the period length into consecutive
+    sub-periods of exactly the period length. Periods with a duration equal
+    to the period length are kept as they are, and the remainder of a long
+    period that is shorter than the period length is dropped.
+    """
+    if len(periods) == 0:
+        return []
+    starts = pd.DatetimeIndex([start for start, _ in periods])
+    ends = pd.DatetimeIndex([end for _, end in periods])
+    split_starts, split_ends = split_period_arrays(
+        _index_to_ns(starts), _index_to_ns(ends), period_len
+    )
+    return list(
+        zip(
+            _ns_to_timestamps(split_starts, starts.tz),
+            _ns_to_timestamps(split_ends, ends.tz),
+        )
+    )
+
+
+def split_period_arrays(starts, ends, period_len):
+    """
+    Split periods given as int64 nanosecond start and end arrays, see
+    split_periods. The sub-periods are built with array arithmetic and
+    returned as two int64 arrays.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    period_ns = period_len * HOUR_NS
+
+    # Number of sub-periods per period, periods that are not long are kept
+    is_long = ends - starts > period_ns
+    counts = np.where(is_long, (ends - starts) // period_ns, 1)
+
+    # Position of each sub-period within its period
+    first = np.cumsum(counts) - counts
+    offsets = np.arange(counts.sum()) - np.repeat(first, counts)
+
+    split_starts = np.repeat(starts, counts) + offsets * period_ns
+    split_ends = np.where(
+        np.repeat(is_long, counts), split_starts + period_ns, np.repeat(ends, counts)
+    )
+    return split_starts, split_ends
+
+
+def _concatenate(arrays):
+    if len(arrays) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(arrays).astype(np.int64, copy=False)
+
+
+def _get_values(df):
+    """
+    Get the values of a dataframe or memory-mapped store as a float matrix of
+    shape (number of columns, number of rows) without copying, if possible.
+    """
+    if isinstance(df, MemmapTimeSeries):
+        return df.values
+    # For frames from get_total_production_df this is a view on the matrix
+    values = df.to_numpy()
+    if values.dtype.kind != "f":
+        values = values.astype(float)
+    return values.T
+
+
+def _get_times(df):
+    """
+    Get the timestamps of a dataframe or memory-mapped store as int64
+    nanoseconds since epoch (UTC), together with the time zone.
+    """
+    if isinstance(df, MemmapTimeSeries):
+        return df.times, df.tz
+    return _index_to_ns(df.index), df.index.tz
+
+
+def _index_to_ns(index):
+    """
+    Convert a datetime index to an int64 array of nanoseconds since epoch (UTC).
+    """
+    if not isinstance(index, pd.DatetimeIndex):
+        raise ValueError("df should have a datetime index")
+    return np.asarray(index.values, dtype="datetime64[ns]").view(np.int64)
+
+
+def _ns_to_timestamps(values, tz=None):
+    """
+    Convert an int64 array of nanoseconds since epoch (UTC) to a list of timestamps.
+    """
+    return _ns_to_datetime_index(values, tz).tolist()
+
+
+def _ns_to_datetime_index(values, tz=None):
+    """
+    Convert an int64 array of nanoseconds since epoch (UTC) to a datetime index.
+    """
+    index = pd.DatetimeIndex(np.asarray(values, dtype=np.int64).view("datetime64[ns]"))
+    if tz is not None:
+        index = index.tz_localize("UTC").tz_convert(tz)
+    return index
@@ -0,0 +1,153 @@
+import io
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Phases of the period detection, in the order of the pipeline
+PHASES = [
+    "cache",
+    "grouping",
+    "aggregation",
+    "filtering",
+    "splitting",
+    "store",
+    "conversion",
+]
+
+
+class Instrumentation:
+    """
+    Timers and counters for the phases of the period detection, with opt-in
+    profiling. Pass an instance as instrumentation to find_fuzzy_periods or
+    get_dunkelflaute_results; the numbers of repeated calls add up.
+
+    - timers: seconds per phase (see PHASES) and in total. With worker
+      processes or threads, the phase timers add up the time of all workers.
+    - counters: rows (values scanned), runs, events and cells
+    - profile: record a cProfile profile of the instrumented calls
+    - trace_memory: record the peak memory allocated by the calling process
+      during the calls with tracemalloc
+    """
+
+    def __init__(self, profile=False, trace_memory=False):
+        self.timers = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.profiler = None
+        if profile:
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+        self.trace_memory = trace_memory
+        self.peak_memory = None
+        self._depth = 0
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a phase, e.g. with instrumentation.phase("grouping"): ...
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+
+    def count(self, name, value=1):
+        self.counters[name] += int(value)
+
+    def merge(self, other):
+        """
+        Add the timers and counters of another instrumentation, e.g. of a worker.
+        """
+        for name, seconds in other.timers.items():
+            self.timers[name] += seconds
+        for name, value in other.counters.items():
+            self.counters[name] += value
+
+    @contextmanager
+    def run(self):
+        """
+        Instrument a whole call: the total time, and the profile and peak
+        memory if enabled. Nested runs are counted once.
+        """
+        self._depth += 1
+        if self._depth > 1:
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+            return
+
+        if self.trace_memory:
+            import tracemalloc
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.profiler is not None:
+            self.profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.timers["total"] += time.perf_counter() - start
+            if self.profiler is not None:
+                self.profiler.disable()
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.peak_memory = max(self.peak_memory or 0, peak)
+                if started_tracing:
+                    tracemalloc.stop()
+            self._depth -= 1
+
+    def summary(self):
+        """
+        Get the timers, counters, throughput (rows and events per second of
+        the total time) and peak memory in bytes as a dictionary.
+        """
+        total = self.timers.get("total", 0.0)
+        return {
+            "timers": dict(self.timers),
+            "counters": dict(self.counters),
+            "rows_per_second": self.counters["rows"] / total if total else None,
+            "events_per_second": self.counters["events"] / total if total else None,
+            "peak_memory": self.peak_memory,
+        }
+
+    def get_profile_stats(self, sort="cumulative", limit=20):
+        """
+        Get the recorded profile as text, sorted by the given pstats key.
+        """
+        if self.profiler is None:
+            raise ValueError("profiling is not enabled, use profile=True")
+        import pstats
+
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def print_stats(self, file=None):
+        """
+        Print the timers per phase, the counters and the throughput.
+        """
+        file = sys.stdout if file is None else file
+        summary = self.summary()
+        names = [name for name in PHASES if name in self.timers]
+        names += [name for name in self.timers if name not in PHASES]
+        for name in names:
+            print(f"{name:<12} {self.timers[name]:10.4f} s", file=file)
+        for name, value in self.counters.items():
+            print(f"{name:<12} {value:10d}", file=file)
+        if summary["rows_per_second"] is not None:
+            print(f"rows/s       {summary['rows_per_second']:10.0f}", file=file)
+            print(f"events/s     {summary['events_per_second']:10.0f}", file=file)
+        if self.peak_memory is not None:
+            print(f"peak memory  {self.peak_memory / 2**20:10.1f} MiB", file=file)
+
+
+def print_progress(done, total):
+    """
+    Progress callback that shows the number of finished cells on a single line.
+    """
+    end = "\n" if done >= total else ""
+    print(f"\rFound periods for {done}/{total} cells", end=end, flush=True)
@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+import mmap
+import os
+
+import numpy as np
+
+# Arrays attached from shared memory in a worker process, by name
+_shared_arrays = {}
+_shared_blocks = []
+
+
+def get_n_jobs(n_jobs):
+    """
+    Get the number of workers for a given n_jobs value. None and 1 mean no
+    parallelism, -1 means one worker per CPU core.
+    """
+    if n_jobs is None:
+        return 1
+    if not isinstance(n_jobs, int) or n_jobs == 0 or n_jobs < -1:
+        raise ValueError("n_jobs should be None, -1 or a positive integer")
+    if n_jobs == -1:
+        return os.cpu_count() or 1
+    return n_jobs
+
+
+def map_shared(func, tasks, arrays, n_jobs=None, executor="process", callback=None):
+    """
+    Call func(arrays, *task) for each task and return the results in task order.
+    The arrays (a dictionary of numpy arrays) are shared with the workers
+    instead of being pickled per task: threads use them directly, and worker
+    processes attach to a copy in shared memory that is created once per call.
+    Memory-mapped files are not copied, the workers map the same file.
+
+    - n_jobs: None or 1 to run serially, -1 to use all CPU cores
+    - executor: "process" or "thread"
+    - callback: called as callback(task, result) for every result, in task
+      order, as soon as it is available
+    """
+    if executor not in ["process", "thread"]:
+        raise ValueError("executor should be 'process' or 'thread'")
+
+    n_jobs = min(get_n_jobs(n_jobs), max(len(tasks), 1))
+    if n_jobs == 1:
+        return _collect(tasks, (func(arrays, *task) for task in tasks), callback)
+
+    if executor == "thread":
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            results = pool.map(lambda task: func(arrays, *task), tasks)
+            return _collect(tasks, results, callback)
+
+    # Process pools are only imported when they are used, to keep the
+    # import of the package light for serial runs
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+
+    blocks = []
+    try:
+        specs = {}
+        for name, array in arrays.items():
+            if _is_file_memmap(array):
+                # Memory-mapped files are opened by the workers themselves
+                specs[name] = (
+                    "memmap",
+                    array.filename,
+                    array.offset,
+                    array.shape,
+                    array.dtype.str,
+                )
+                continue
+
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            specs[name] = ("shm", block.name, 0, array.shape, array.dtype.str)
+
+        with ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_attach_shared_arrays, initargs=(specs,)
+        ) as pool:
+            results = pool.map(_call_with_shared_arrays, [func] * len(tasks), tasks)
+            return _collect(tasks, results, callback)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _collect(tasks, results, callback):
+    collected = []
+    for task, result in zip(tasks, results):
+        collected.append(result)
+        if callback is not None:
+            callback(task, result)
+    return collected
+
+
+def _attach_shared_arrays(specs):
+    for name, (kind, location, offset, shape, dtype) in specs.items():
+        if kind == "memmap":
+            _shared_arrays[name] = np.memmap(
+                location, dtype=np.dtype(dtype), mode="r", offset=offset, shape=shape
+            )
+            continue
+
+        from multiprocessing import shared_memory
+
+        # Workers share the resource tracker of the parent process, which
+        # unlinks the block when the sweep is done
+        block = shared_memory.SharedMemory(name=location)
+        _shared_blocks.append(block)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        _shared_arrays[name] = array
+
+
+def _is_file_memmap(array):
+    # Only top-level memmaps map the file directly, views have a wrong offset
+    return (
+        isinstance(array, np.memmap)
+        and array.filename is not None
+        and isinstance(array.base, mmap.mmap)
+        and array.flags.c_contiguous
+    )
+
+
+def _call_with_shared_arrays(func, task):
+    return func(_shared_arrays, *task)
@@ -0,0 +1,416 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from dunkelflaute.core import (
+    _find_mask_runs,
+    _get_times,
+    get_total_production_matrix,
+    merge_runs,
+)
+from dunkelflaute.parallel import map_shared
+from dunkelflaute.utils import (
+    HOUR_NS,
+    get_number_of_years,
+    validate_dataframe,
+    validate_period_length,
+    validate_threshold,
+    validate_tolerance,
+)
+
+METRICS = ["events_per_year", "hours_per_year", "max_duration"]
+# Metrics that never increase with the capacity demand ratio
+MONOTONE_METRICS = ["hours_per_year", "max_duration"]
+BATCH_SIZE = 16  # number of mixes per production matrix
+DECIMALS = 9  # rounding of the candidate coordinates to detect duplicates
+
+
+def get_portfolio_metrics(
+    df,
+    weights,
+    cap_dem_ratios,
+    threshold,
+    period_len,
+    technologies=["wind", "solar"],
+    tol=0,
+    tol_mode="gap",
+    n_jobs=None,
+    executor="process",
+):
+    """
+    Get the dunkelflaute metrics of capacity mixes, given as a weight matrix
+    of shape (number of mixes, number of technologies) with rows that sum
+    to 1, and a capacity demand ratio per mix. The metrics are
+    - events_per_year: periods of at least period_len hours per year
+    - hours_per_year: total duration of these periods per year
+    - max_duration: duration of the longest run below the threshold in hours
+    Periods are not split, tol and tol_mode work as in find_fuzzy_periods.
+    The production of a batch of mixes is computed as one matrix (with
+    get_total_production_matrix for wind and solar) and the runs of all
+    mixes of the batch are found in one pass. The function returns a
+    dataframe with one row per mix and the columns technologies,
+    cap_dem_ratio and METRICS.
+    """
+    _validate_search(df, threshold, period_len, technologies)
+    validate_tolerance(tol, tol_mode)
+    weights = _get_weights(weights, technologies)
+    ratios = np.broadcast_to(np.asarray(cap_dem_ratios, dtype=float), len(weights))
+
+    metrics = _evaluate(
+        _get_arrays(df, technologies),
+        technologies,
+        weights,
+        ratios,
+        threshold,
+        period_len,
+        get_number_of_years(df),
+        tol,
+        tol_mode,
+        n_jobs,
+        executor,
+    )
+    return _to_frame(technologies, weights, ratios, metrics)
+
+
+def optimize_portfolio(
+    df,
+    threshold,
+    period_len,
+    metric="events_per_year",
+    technologies=["wind", "solar"],
+    cap_dem_ratio=1.0,
+    steps=5,
+    levels=4,
+    tol=0,
+    tol_mode="gap",
+    n_jobs=None,
+    executor="process",
+):
+    """
+    Search the capacity mixes that minimize a dunkelflaute metric (see
+    get_portfolio_metrics) or a list of metrics. If cap_dem_ratio is a
+    (min, max) range, the ratio is searched as well and counts as a cost,
+    so the result is the trade-off between the metrics and the ratio.
+
+    The search starts on a coarse grid with steps values per dimension.
+    Each of the levels halves the step size and only evaluates the
+    neighbours of the current Pareto front, so the front is approximated
+    with a fraction of the evaluations of the fine grid. Parts of the front
+    between coarse grid points can be missed, more steps make this less
+    likely. The function returns all
+    evaluated candidates (see get_portfolio_metrics) sorted by the metrics,
+    with the level at which they were evaluated and a 'pareto' column that
+    marks the Pareto front.
+    """
+    _validate_search(df, threshold, period_len, technologies)
+    validate_tolerance(tol, tol_mode)
+    metrics = [metric] if isinstance(metric, str) else list(metric)
+    if len(metrics) == 0 or any(name not in METRICS for name in metrics):
+        raise ValueError(f"metric should be one or a list of {METRICS}")
+    if not isinstance(steps, int) or steps < 2:
+        raise ValueError("steps should be an integer of at least 2")
+    if not isinstance(levels, int) or levels < 0:
+        raise ValueError("levels should be a non-negative integer")
+    if isinstance(cap_dem_ratio, (list, tuple)):
+        if len(cap_dem_ratio) != 2 or not 0 <= cap_dem_ratio[0] < cap_dem_ratio[1]:
+            raise ValueError("cap_dem_ratio should be a number or a (min, max) range")
+        ratio_range = tuple(float(ratio) for ratio in cap_dem_ratio)
+        objectives = metrics + ["cap_dem_ratio"]
+    else:
+        validate_threshold(cap_dem_ratio)
+        ratio_range = (float(cap_dem_ratio), float(cap_dem_ratio))
+        objectives = metrics
+
+    arrays = _get_arrays(df, technologies)
+    no_years = get_number_of_years(df)
+
+    # Coarse grid: all weights in multiples of 1 / (steps - 1)
+    n_tech = len(technologies)
+    units = [
+        counts + (steps - 1 - sum(counts),)
+        for counts in itertools.product(range(steps), repeat=n_tech - 1)
+        if sum(counts) <= steps - 1
+    ]
+    weight_grid = np.array(units, dtype=float) / (steps - 1)
+    ratio_grid = np.unique(np.linspace(*ratio_range, steps))
+    points = np.column_stack(
+        (
+            np.repeat(weight_grid, len(ratio_grid), axis=0),
+            np.tile(ratio_grid, len(weight_grid)),
+        )
+    )
+    weight_step = 1 / (steps - 1)
+    ratio_step = (ratio_range[1] - ratio_range[0]) / (steps - 1)
+
+    # Moves to the neighbours of a point: the weights change in opposite
+    # directions to keep their sum, the ratio changes independently
+    weight_moves = [
+        move for move in itertools.product([-1, 0, 1], repeat=n_tech) if sum(move) == 0
+    ]
+    ratio_moves = [-1, 0, 1] if ratio_step > 0 else [0]
+    moves = np.array(
+        [move + (ratio_move,) for move in weight_moves for ratio_move in ratio_moves],
+        dtype=float,
+    )
+
+    candidates = []
+    seen = set()
+    for level in range(levels + 1):
+        new = []
+        for point in map(tuple, np.round(points, DECIMALS)):
+            if point not in seen:
+                seen.add(point)
+                new.append(point)
+        points = np.array(new, dtype=float).reshape(-1, n_tech + 1)
+        if len(points) > 0:
+            weights, ratios = points[:, :-1], points[:, -1]
+            values = _evaluate(
+                arrays,
+                technologies,
+                weights,
+                ratios,
+                threshold,
+                period_len,
+                no_years,
+                tol,
+                tol_mode,
+                n_jobs,
+                executor,
+            )
+            candidates.append(
+                _to_frame(technologies, weights, ratios, values).assign(level=level)
+            )
+        if level == levels:
+            break
+
+        # Refine around the current front with half the step size
+        weight_step /= 2
+        ratio_step /= 2
+        front = get_pareto_front(pd.concat(candidates, ignore_index=True), objectives)
+        front = front[technologies + ["cap_dem_ratio"]].to_numpy()
+        scale = np.array([weight_step] * n_tech + [ratio_step])
+        points = (front[:, np.newaxis, :] + moves * scale).reshape(-1, n_tech + 1)
+        points = points[
+            np.all(points[:, :-1] >= -(10**-DECIMALS), axis=1)
+            & (points[:, -1] >= ratio_range[0] - 10**-DECIMALS)
+            & (points[:, -1] <= ratio_range[1] + 10**-DECIMALS)
+        ]
+        points[:, :-1] = np.clip(points[:, :-1], 0, 1)
+
+    result = pd.concat(candidates, ignore_index=True)
+    result["pareto"] = False
+    result.loc[get_pareto_front(result, objectives).index, "pareto"] = True
+    return result.sort_values(objectives + technologies, ignore_index=True)
+
+
+def get_pareto_front(candidates, objectives):
+    """
+    Get the rows of a dataframe that are not dominated in the given
+    objective columns, which are all minimized. A row is dominated if
+    another row is at least as good in every objective and better in one.
+    """
+    values = candidates[objectives].to_numpy(dtype=float)
+    dominated = np.zeros(len(values), dtype=bool)
+    for i in range(len(values)):
+        dominated[i] = np.any(
+            np.all(values <= values[i], axis=1) & np.any(values < values[i], axis=1)
+        )
+    return candidates[~dominated]
+
+
+def find_min_cap_dem_ratio(
+    df,
+    weights,
+    threshold,
+    period_len,
+    target,
+    metric="max_duration",
+    ratio_range=(0.5, 5.0),
+    rtol=1e-3,
+    technologies=["wind", "solar"],
+    n_jobs=None,
+    executor="process",
+):
+    """
+    Find the lowest capacity demand ratio at which each capacity mix (see
+    get_portfolio_metrics) meets a target, i.e. metric <= target, by
+    bisection within ratio_range up to a relative tolerance of rtol.
+    Scaling the production up only shortens the runs below the threshold,
+    so the metrics of MONOTONE_METRICS never increase with the ratio. The
+    bisections of all mixes run in lockstep with one batch evaluation per
+    step. Mixes that miss the target at the upper end of the range get a
+    NaN ratio. The function returns a dataframe with the weights, the ratio
+    and the metrics at this ratio.
+    """
+    _validate_search(df, threshold, period_len, technologies)
+    if metric not in MONOTONE_METRICS:
+        raise ValueError(f"metric should be one of {MONOTONE_METRICS}")
+    if len(ratio_range) != 2 or not 0 < ratio_range[0] < ratio_range[1]:
+        raise ValueError("ratio_range should be a (min, max) range of positive ratios")
+    if rtol <= 0:
+        raise ValueError("rtol should be positive")
+
+    weights = _get_weights(weights, technologies)
+    arrays = _get_arrays(df, technologies)
+    no_years = get_number_of_years(df)
+
+    def evaluate(rows, ratios):
+        return _evaluate(
+            arrays,
+            technologies,
+            weights[rows],
+            ratios,
+            threshold,
+            period_len,
+            no_years,
+            0,
+            "gap",
+            n_jobs,
+            executor,
+        )
+
+    rows = np.arange(len(weights))
+    lo = np.full(len(weights), float(ratio_range[0]))
+    hi = np.full(len(weights), float(ratio_range[1]))
+    metric_id = METRICS.index(metric)
+
+    values = evaluate(rows, hi)
+    feasible = values[:, metric_id] <= target
+    lo_values = evaluate(rows, lo)
+    met_lo = lo_values[:, metric_id] <= target
+    hi[met_lo] = lo[met_lo]
+    values[met_lo] = lo_values[met_lo]
+
+    # Invariant: lo misses the target and hi meets it
+    active = np.flatnonzero(feasible & ~met_lo)
+    while len(active) > 0:
+        mid = (lo[active] + hi[active]) / 2
+        mid_values = evaluate(active, mid)
+        met = mid_values[:, metric_id] <= target
+        hi[active[met]] = mid[met]
+        values[active[met]] = mid_values[met]
+        lo[active[~met]] = mid[~met]
+        active = active[hi[active] - lo[active] > rtol * hi[active]]
+
+    hi[~feasible] = np.nan
+    values[~feasible] = np.nan
+    return _to_frame(technologies, weights, hi, values)
+
+
+def _validate_search(df, threshold, period_len, technologies):
+    validate_dataframe(df)
+    validate_threshold(threshold)
+    validate_period_length(period_len)
+    if len(technologies) < 2:
+        raise ValueError("technologies should have at least two entries")
+    missing = [tech for tech in technologies if tech not in df.columns]
+    if missing:
+        raise ValueError(f"df has no columns {missing}")
+
+
+def _get_weights(weights, technologies):
+    weights = np.asarray(weights, dtype=float)
+    if weights.ndim != 2 or weights.shape[1] != len(technologies):
+        raise ValueError("weights should have one column per technology")
+    if np.any(weights < 0) or not np.allclose(weights.sum(axis=1), 1):
+        raise ValueError("weights should be non-negative and sum to 1 per mix")
+    return weights
+
+
+def _get_arrays(df, technologies):
+    times, _ = _get_times(df)
+    data = np.stack([np.asarray(df[tech], dtype=float) for tech in technologies])
+    return {"times": times, "data": data}
+
+
+def _evaluate(
+    arrays,
+    technologies,
+    weights,
+    ratios,
+    threshold,
+    period_len,
+    no_years,
+    tol,
+    tol_mode,
+    n_jobs,
+    executor,
+):
+    """
+    Evaluate the metrics of all mixes in batches of BATCH_SIZE, see
+    get_portfolio_metrics. The function returns a float array of shape
+    (number of mixes, number of metrics).
+    """
+    tasks = [
+        (
+            technologies,
+            weights[lo : lo + BATCH_SIZE],
+            ratios[lo : lo + BATCH_SIZE],
+            threshold,
+            period_len,
+            tol,
+            tol_mode,
+        )
+        for lo in range(0, len(weights), BATCH_SIZE)
+    ]
+    results = map_shared(_get_batch_metrics, tasks, arrays, n_jobs, executor)
+    metrics = np.concatenate(results) if results else np.empty((0, len(METRICS)))
+    metrics[:, :2] /= no_years
+    return metrics
+
+
+def _get_batch_metrics(
+    arrays, technologies, weights, ratios, threshold, period_len, tol, tol_mode
+):
+    """
+    Get the event count, the total event duration in hours and the longest
+    run in hours of a batch of mixes.
+    """
+    times = arrays["times"]
+    values = _get_production_matrix(arrays["data"], technologies, weights, ratios)
+    starts, ends, mix_ids = _find_mask_runs(values <= threshold)
+    if tol > 0:
+        starts, ends, mix_ids = merge_runs(starts, ends, tol, tol_mode, mix_ids)
+
+    durations = times[ends] - times[starts]
+    valid = durations >= period_len * HOUR_NS
+    metrics = np.zeros((len(weights), len(METRICS)))
+    metrics[:, 0] = np.bincount(mix_ids[valid], minlength=len(weights))
+    metrics[:, 1] = np.bincount(
+        mix_ids[valid], weights=durations[valid] / HOUR_NS, minlength=len(weights)
+    )
+    longest = np.zeros(len(weights))
+    np.maximum.at(longest, mix_ids, durations / HOUR_NS)
+    metrics[:, 2] = longest
+    return metrics
+
+
+def _get_production_matrix(data, technologies, weights, ratios):
+    """
+    Get the production of a batch of mixes as a matrix of shape
+    (number of mixes, number of rows). Wind and solar mixes come from
+    get_total_production_matrix, one call per ratio, so they are identical
+    to the columns of get_total_production_df.
+    """
+    if technologies == ["wind", "solar"]:
+        series = {"wind": data[0], "solar": data[1]}
+        values = np.empty((len(weights), data.shape[1]))
+        for ratio in np.unique(ratios):
+            rows = np.flatnonzero(ratios == ratio)
+            values[rows], _ = get_total_production_matrix(
+                series, weights[rows, 0].tolist(), float(ratio)
+            )
+        return values
+
+    values = np.zeros((len(weights), data.shape[1]))
+    for k in range(len(technologies)):
+        values += (ratios[:, np.newaxis] * data[k]) * weights[:, k, np.newaxis]
+    return values
+
+
+def _to_frame(technologies, weights, ratios, metrics):
+    frame = pd.DataFrame(weights, columns=technologies)
+    frame["cap_dem_ratio"] = ratios
+    frame[METRICS] = metrics
+    return frame
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+from dunkelflaute.core import (
+    _concatenate,
+    _get_periods_from_runs,
+    _get_times,
+    _get_values,
+    find_runs_multi,
+    merge_runs,
+)
+from dunkelflaute.results import DunkelflauteResults
+from dunkelflaute.utils import (
+    validate_dataframe,
+    validate_period_length,
+    validate_threshold,
+    validate_thresholds,
+    validate_tolerance,
+)
+
+COLUMN_NAMES = ["region", "technology"]
+
+
+def concat_regions(frames):
+    """
+    Combine the capacity factor dataframes of several regions, given as a
+    dictionary {region: dataframe with one column per technology}, into one
+    multi-region dataframe with (region, technology) columns, e.g.
+    ("DE", "onshore"), ("DE", "solar"), ("DK", "offshore").
+    """
+    if not isinstance(frames, dict) or len(frames) == 0:
+        raise ValueError("frames should be a non-empty dictionary of dataframes")
+    return pd.concat(frames, axis=1, names=COLUMN_NAMES)
+
+
+def get_regional_production_df(df, cap_mix, cap_dem_ratio=1.0):
+    """
+    Get the total production of every region of a multi-region dataframe
+    (see concat_regions) for a capacity mix given as a dictionary
+    {technology: share}, e.g. {"onshore": 0.4, "offshore": 0.2, "solar": 0.4}.
+    If a region lacks some of the technologies, the shares of the others are
+    scaled up so that they sum to the same total. The production is
+    multiplied by the capacity demand ratio. The mixes of all regions are
+    computed in one operation on a (region, technology, time) array, and
+    the function returns a dataframe with one column per region.
+    """
+    validate_dataframe(df)
+    if not isinstance(df.columns, pd.MultiIndex) or df.columns.nlevels != 2:
+        raise ValueError("df should have (region, technology) columns")
+    if not isinstance(cap_mix, dict) or len(cap_mix) == 0:
+        raise ValueError("cap_mix should be a non-empty dictionary")
+    if any(share < 0 for share in cap_mix.values()):
+        raise ValueError("cap_mix shares should not be negative")
+    unknown = set(cap_mix) - set(df.columns.unique(1))
+    if unknown:
+        raise ValueError(f"df has no columns for the technologies {sorted(unknown)}")
+
+    regions = list(df.columns.unique(0))
+    technologies = list(cap_mix)
+    columns = pd.MultiIndex.from_product([regions, technologies])
+    available = columns.isin(df.columns).reshape(len(regions), len(technologies))
+    shares = np.where(available, np.array(list(cap_mix.values()), dtype=float), 0)
+    totals = shares.sum(axis=1, keepdims=True)
+    if np.any(totals == 0):
+        raise ValueError("every region should have a technology of the capacity mix")
+    shares = shares / totals * sum(cap_mix.values())
+
+    # Missing technologies are zero, NaN values of the data are kept
+    values = df.reindex(columns=columns, fill_value=0).to_numpy(dtype=float)
+    values = values.T.reshape(len(regions), len(technologies), len(df))
+    production = cap_dem_ratio * np.einsum("rk,rkt->rt", shares, values)
+    return pd.DataFrame(
+        production.T, index=df.index, columns=pd.Index(regions, name="region")
+    )
+
+
+def get_region_counts(df, thresholds):
+    """
+    Count the regions at or below each threshold at every time step. The
+    comparison is done on a (threshold, region, time) boolean array, so
+    there is no loop over regions. NaN values never count as below. The
+    function returns an int array of shape (number of thresholds, number
+    of rows).
+    """
+    values = _get_values(df)
+    below = values[np.newaxis] <= np.asarray(thresholds, dtype=float)[:, None, None]
+    return below.sum(axis=1)
+
+
+def find_simultaneous_periods(
+    df,
+    threshold=0.1,
+    k=1,
+    period_len=7 * 24,
+    split_long_periods=True,
+    tol=0,
+    tol_mode="gap",
+):
+    """
+    Find periods in which at least k of the regions (the columns of df, e.g.
+    from get_regional_production_df) are at or below the threshold at the
+    same time, for at least period_len hours. Which regions are below may
+    change during a period. The function returns a list of (start, end)
+    tuples like find_fuzzy_periods; tol, tol_mode and split_long_periods
+    work the same way.
+    """
+    results = get_simultaneous_results(
+        df, [threshold], [k], [period_len], split_long_periods, True, tol, tol_mode
+    )
+    return results[threshold][period_len][get_k_label(k, df.shape[1])]
+
+
+def get_simultaneous_results(
+    df,
+    thresholds,
+    ks,
+    period_lengths,
+    split_long_periods=False,
+    return_store=False,
+    tol=0,
+    tol_mode="gap",
+):
+    """
+    Find the periods of at least k simultaneous regions below the threshold
+    (see find_simultaneous_periods) for all combinations of thresholds, k
+    and period lengths. The region counts are computed once per threshold,
+    and the runs of all k are found in one pass over the counts, as
+    "at least k regions" is "-count <= -k". The results have the structure
+    of get_dunkelflaute_results, with one column per k, labelled
+    "{k}_of_{number of regions}":
+    {
+        threshold: {
+            period_length: {
+                '2_of_5': [(start, end), ...],
+                ...
+            },
+            ...
+        },
+        ...
+    }
+    If return_store is True, a DunkelflauteResults store is returned instead.
+    """
+    validate_dataframe(df)
+    validate_thresholds(thresholds)
+    for threshold in thresholds:
+        validate_threshold(threshold)
+    for period_len in period_lengths:
+        validate_period_length(period_len)
+    validate_tolerance(tol, tol_mode)
+    n_regions = df.shape[1]
+    if len(ks) == 0:
+        raise ValueError("ks should not be empty")
+    for k in ks:
+        if not isinstance(k, int) or k < 1 or k > n_regions:
+            raise ValueError(f"k should be an integer between 1 and {n_regions}")
+
+    times, tz = _get_times(df)
+    counts = get_region_counts(df, thresholds)
+    parts = []
+    for i in range(len(thresholds)):
+        run_starts, run_ends, run_ks = find_runs_multi(-counts[i], [-k for k in ks])
+        if tol > 0:
+            run_starts, run_ends, run_ks = merge_runs(
+                run_starts, run_ends, tol, tol_mode, run_ks
+            )
+        # The k ids take the place of the threshold ids of _get_periods_from_runs
+        starts, ends, k_ids, period_ids = _get_periods_from_runs(
+            times[run_starts],
+            times[run_ends],
+            run_ks,
+            period_lengths,
+            split_long_periods,
+        )
+        parts.append((starts, ends, k_ids, np.full(len(starts), i), period_ids))
+
+    store = DunkelflauteResults(
+        *(_concatenate([part[m] for part in parts]) for m in range(5)),
+        columns=[get_k_label(k, n_regions) for k in ks],
+        thresholds=thresholds,
+        period_lengths=period_lengths,
+        tz=tz,
+    )
+    if return_store:
+        return store
+    return store.to_dict()
+
+
+def get_k_label(k, n_regions):
+    return f"{k}_of_{n_regions}"
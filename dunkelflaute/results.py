@@ -0,0 +1,541 @@
+from collections.abc import Mapping
+import json
+
+import numpy as np
+import pandas as pd
+
+from dunkelflaute.utils import HOUR_NS
+
+SEASONS = ["Winter", "Spring", "Summer", "Autumn"]
+
+
+class DunkelflauteResults(Mapping):
+    """
+    Columnar store of dunkelflaute periods for a grid of thresholds, period
+    lengths and columns. All periods are kept in parallel int64 arrays:
+
+    - start, end: period start and end as nanoseconds since epoch (UTC)
+    - col_id, threshold_id, period_id: positions in columns, thresholds and
+      period_lengths
+    - duration: end - start in nanoseconds
+
+    The periods are sorted by (threshold_id, period_id, col_id) and by time
+    within each cell, so every cell is a contiguous slice of the arrays and
+    counting is O(1).
+
+    For compatibility with the nested dictionary returned by
+    get_dunkelflaute_results, the store behaves like a read-only mapping:
+    results[threshold][period_len][col] returns the list of
+    (start, end) timestamp tuples of that cell.
+    """
+
+    def __init__(
+        self,
+        start,
+        end,
+        col_id,
+        threshold_id,
+        period_id,
+        columns,
+        thresholds,
+        period_lengths,
+        tz=None,
+    ):
+        self.columns = list(columns)
+        self.thresholds = list(thresholds)
+        self.period_lengths = list(period_lengths)
+        self.tz = tz
+
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        col_id = np.asarray(col_id, dtype=np.int64)
+        threshold_id = np.asarray(threshold_id, dtype=np.int64)
+        period_id = np.asarray(period_id, dtype=np.int64)
+        if not (
+            len(start) == len(end) == len(col_id) == len(threshold_id) == len(period_id)
+        ):
+            raise ValueError("all period arrays should have the same length")
+
+        shape = (len(self.thresholds), len(self.period_lengths), len(self.columns))
+        key = self._cell_key(threshold_id, period_id, col_id)
+        order = np.lexsort((start, key))
+
+        self.start = start[order]
+        self.end = end[order]
+        self.col_id = col_id[order]
+        self.threshold_id = threshold_id[order]
+        self.period_id = period_id[order]
+        self.duration = self.end - self.start
+
+        self._counts = np.bincount(key, minlength=int(np.prod(shape))).reshape(shape)
+        self._offsets = np.concatenate(([0], np.cumsum(self._counts.ravel())))
+        self._threshold_pos = {t: i for i, t in enumerate(self.thresholds)}
+        self._period_pos = {p: i for i, p in enumerate(self.period_lengths)}
+        self._col_pos = {c: i for i, c in enumerate(self.columns)}
+
+    @classmethod
+    def from_dict(cls, results):
+        """
+        Create a result store from the nested dictionary structure
+        {threshold: {period_len: {col: [(start, end), ...]}}}.
+        """
+        if isinstance(results, cls):
+            return results
+
+        thresholds = list(results.keys())
+        period_lengths = []
+        columns = []
+        for by_period in results.values():
+            for period_len, by_col in by_period.items():
+                if period_len not in period_lengths:
+                    period_lengths.append(period_len)
+                for col in by_col:
+                    if col not in columns:
+                        columns.append(col)
+
+        starts, ends, col_ids, threshold_ids, period_ids = [], [], [], [], []
+        for i, by_period in enumerate(results.values()):
+            for period_len, by_col in by_period.items():
+                j = period_lengths.index(period_len)
+                for col, periods in by_col.items():
+                    k = columns.index(col)
+                    starts.extend(start for start, _ in periods)
+                    ends.extend(end for _, end in periods)
+                    col_ids.extend([k] * len(periods))
+                    threshold_ids.extend([i] * len(periods))
+                    period_ids.extend([j] * len(periods))
+
+        tz = getattr(starts[0], "tz", None) if starts else None
+        return cls(
+            _timestamps_to_ns(starts),
+            _timestamps_to_ns(ends),
+            col_ids,
+            threshold_ids,
+            period_ids,
+            columns,
+            thresholds,
+            period_lengths,
+            tz=tz,
+        )
+
+    @classmethod
+    def concat(cls, results):
+        """
+        Concatenate result stores with the same thresholds, period lengths
+        and columns into a single store.
+        """
+        results = list(results)
+        if len(results) == 0:
+            raise ValueError("results should not be empty")
+        first = results[0]
+        for other in results[1:]:
+            if (other.thresholds, other.period_lengths, other.columns) != (
+                first.thresholds,
+                first.period_lengths,
+                first.columns,
+            ):
+                raise ValueError(
+                    "results should have the same thresholds, period lengths and columns"
+                )
+
+        return cls(
+            np.concatenate([r.start for r in results]),
+            np.concatenate([r.end for r in results]),
+            np.concatenate([r.col_id for r in results]),
+            np.concatenate([r.threshold_id for r in results]),
+            np.concatenate([r.period_id for r in results]),
+            first.columns,
+            first.thresholds,
+            first.period_lengths,
+            tz=first.tz,
+        )
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Load a result store saved with save.
+        """
+        with np.load(file_path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            return cls(
+                data["start"],
+                data["end"],
+                data["col_id"],
+                data["threshold_id"],
+                data["period_id"],
+                meta["columns"],
+                meta["thresholds"],
+                meta["period_lengths"],
+                tz=meta["tz"],
+            )
+
+    def save(self, file_path):
+        """
+        Save the result store to a binary .npz file.
+        """
+        meta = {
+            "columns": self.columns,
+            "thresholds": self.thresholds,
+            "period_lengths": self.period_lengths,
+            "tz": None if self.tz is None else str(self.tz),
+        }
+        np.savez(
+            file_path,
+            start=self.start,
+            end=self.end,
+            col_id=self.col_id,
+            threshold_id=self.threshold_id,
+            period_id=self.period_id,
+            meta=np.array(json.dumps(meta)),
+        )
+
+    @property
+    def n_events(self):
+        """
+        Total number of periods in the store.
+        """
+        return len(self.start)
+
+    @property
+    def nbytes(self):
+        """
+        Memory used by the period arrays in bytes.
+        """
+        return sum(
+            a.nbytes
+            for a in (
+                self.start,
+                self.end,
+                self.col_id,
+                self.threshold_id,
+                self.period_id,
+                self.duration,
+            )
+        )
+
+    def count(self, threshold, period_len, col):
+        """
+        Number of periods for a single (threshold, period length, column) cell.
+        """
+        i, j, k = self._cell_pos(threshold, period_len, col)
+        return int(self._counts[i, j, k])
+
+    def counts(self):
+        """
+        Number of periods per cell as an array of shape
+        (len(thresholds), len(period_lengths), len(columns)).
+        """
+        return self._counts.copy()
+
+    def groupby_count(self, by):
+        """
+        Number of periods grouped by one or more of the levels
+        "threshold", "period_len" and "column". The function returns a
+        pandas Series indexed by the requested levels.
+        """
+        levels = ["threshold", "period_len", "column"]
+        if isinstance(by, str):
+            by = [by]
+        if any(level not in levels for level in by):
+            raise ValueError(f"by should be a subset of {levels}")
+
+        axes = tuple(i for i, level in enumerate(levels) if level not in by)
+        counts = self._counts.sum(axis=axes)
+        # Reorder the remaining axes to match the order requested in by
+        remaining = [level for level in levels if level in by]
+        counts = np.transpose(counts, [remaining.index(level) for level in by])
+
+        labels = {
+            "threshold": self.thresholds,
+            "period_len": self.period_lengths,
+            "column": self.columns,
+        }
+        index = pd.MultiIndex.from_product([labels[level] for level in by], names=by)
+        if len(by) == 1:
+            index = index.get_level_values(0)
+        return pd.Series(counts.ravel(), index=index, name="count")
+
+    def seasonality(self, time_unit="month", weight="count"):
+        """
+        Number of periods per month (1 to 12), season (see SEASONS, winter is
+        December to February) or year, for all thresholds, period lengths
+        and columns at once. With weight "count", every period counts once
+        in the bin of its start; with weight "hours", the hours of every
+        period are split over the bins it spans (occupancy). The times are
+        binned in the local time of the store. The function returns a pandas
+        Series indexed by "threshold", "period_len", "column" and time_unit.
+        """
+        if time_unit not in ["month", "season", "year"]:
+            raise ValueError("time_unit should be 'month', 'season' or 'year'")
+        if weight not in ["count", "hours"]:
+            raise ValueError("weight should be 'count' or 'hours'")
+
+        starts = self._to_local_ns(self.start)
+        # Months since 1970 of the period starts
+        months = _ns_to_months(starts)
+        period_ids = np.arange(len(starts))
+        weights = None
+        if weight == "hours":
+            # Split every period at the month boundaries it crosses
+            ends = self._to_local_ns(self.end)
+            n_months = _ns_to_months(ends) - months + 1
+            period_ids = np.repeat(period_ids, n_months)
+            offsets = np.arange(len(period_ids)) - np.repeat(
+                np.cumsum(n_months) - n_months, n_months
+            )
+            months = months[period_ids] + offsets
+            month_starts = _months_to_ns(months)
+            month_ends = _months_to_ns(months + 1)
+            weights = (
+                np.minimum(ends[period_ids], month_ends)
+                - np.maximum(starts[period_ids], month_starts)
+            ) / HOUR_NS
+
+        if time_unit == "month":
+            bins = months % 12
+            labels = list(range(1, 13))
+        elif time_unit == "season":
+            bins = ((months % 12 + 1) % 12 + 3) // 3 - 1
+            labels = SEASONS
+        else:
+            years = months // 12 + 1970
+            first_year = int(years.min()) if len(years) > 0 else 1970
+            bins = years - first_year
+            labels = list(range(first_year, first_year + int(bins.max(initial=-1)) + 1))
+
+        cells = self._cell_key(
+            self.threshold_id[period_ids],
+            self.period_id[period_ids],
+            self.col_id[period_ids],
+        )
+        size = len(self.thresholds) * len(self.period_lengths) * len(self.columns)
+        counts = np.bincount(
+            cells * len(labels) + bins, weights, minlength=size * len(labels)
+        )
+        index = pd.MultiIndex.from_product(
+            [self.thresholds, self.period_lengths, self.columns, labels],
+            names=["threshold", "period_len", "column", time_unit],
+        )
+        return pd.Series(counts, index=index, name=weight)
+
+    def get_periods(self, threshold, period_len, col):
+        """
+        Start and end of the periods of a single cell as int64 arrays of
+        nanoseconds since epoch. The arrays are views into the store.
+        """
+        i, j, k = self._cell_pos(threshold, period_len, col)
+        cell = self._cell_key(i, j, k)
+        lo, hi = self._offsets[cell], self._offsets[cell + 1]
+        return self.start[lo:hi], self.end[lo:hi]
+
+    def filter(self, threshold=None, period_len=None, col=None):
+        """
+        Create a new store containing only the given threshold(s), period
+        length(s) and column(s). None keeps all values of that level.
+        """
+        thresholds = _select(self.thresholds, threshold)
+        period_lengths = _select(self.period_lengths, period_len)
+        columns = _select(self.columns, col)
+
+        threshold_map = _id_map(self.thresholds, thresholds)
+        period_map = _id_map(self.period_lengths, period_lengths)
+        col_map = _id_map(self.columns, columns)
+
+        threshold_id = threshold_map[self.threshold_id]
+        period_id = period_map[self.period_id]
+        col_id = col_map[self.col_id]
+        keep = (threshold_id >= 0) & (period_id >= 0) & (col_id >= 0)
+
+        return DunkelflauteResults(
+            self.start[keep],
+            self.end[keep],
+            col_id[keep],
+            threshold_id[keep],
+            period_id[keep],
+            columns,
+            thresholds,
+            period_lengths,
+            tz=self.tz,
+        )
+
+    def to_frame(self):
+        """
+        Convert the store to a long-format dataframe with one row per period.
+        """
+        return pd.DataFrame(
+            {
+                "threshold": np.asarray(self.thresholds)[self.threshold_id],
+                "period_len": np.asarray(self.period_lengths)[self.period_id],
+                "column": np.asarray(self.columns, dtype=object)[self.col_id],
+                "start": self._to_datetime_index(self.start),
+                "end": self._to_datetime_index(self.end),
+                "duration": self.duration / HOUR_NS,
+            }
+        )
+
+    def to_dict(self):
+        """
+        Convert the store to the nested dictionary structure
+        {threshold: {period_len: {col: [(start, end), ...]}}}.
+        """
+        # Convert all periods at once and slice the cells from the result
+        periods = self._to_timestamp_tuples(self.start, self.end)
+        offsets = self._offsets.tolist()
+        result = {}
+        cell = 0
+        for threshold in self.thresholds:
+            result[threshold] = {}
+            for period_len in self.period_lengths:
+                result[threshold][period_len] = {}
+                for col in self.columns:
+                    result[threshold][period_len][col] = periods[
+                        offsets[cell] : offsets[cell + 1]
+                    ]
+                    cell += 1
+        return result
+
+    def __getitem__(self, threshold):
+        if threshold not in self._threshold_pos:
+            raise KeyError(threshold)
+        return _PeriodView(self, threshold)
+
+    def __iter__(self):
+        return iter(self.thresholds)
+
+    def __len__(self):
+        return len(self.thresholds)
+
+    def __repr__(self):
+        return (
+            f"DunkelflauteResults(n_events={self.n_events}, "
+            f"thresholds={len(self.thresholds)}, "
+            f"period_lengths={len(self.period_lengths)}, "
+            f"columns={len(self.columns)})"
+        )
+
+    def _cell_key(self, threshold_id, period_id, col_id):
+        return (threshold_id * len(self.period_lengths) + period_id) * len(
+            self.columns
+        ) + col_id
+
+    def _cell_pos(self, threshold, period_len, col):
+        try:
+            return (
+                self._threshold_pos[threshold],
+                self._period_pos[period_len],
+                self._col_pos[col],
+            )
+        except KeyError as e:
+            raise KeyError(f"{e.args[0]} is not part of the results") from None
+
+    def _to_datetime_index(self, values):
+        index = pd.DatetimeIndex(values.view("datetime64[ns]"))
+        if self.tz is not None:
+            index = index.tz_localize("UTC").tz_convert(self.tz)
+        return index
+
+    def _to_local_ns(self, values):
+        # Wall-clock times of the store's time zone as int64 nanoseconds
+        index = self._to_datetime_index(values)
+        if self.tz is not None:
+            index = index.tz_localize(None)
+        return np.asarray(index.values, dtype="datetime64[ns]").view(np.int64)
+
+    def _to_timestamp_tuples(self, starts, ends):
+        return list(
+            zip(
+                self._to_datetime_index(starts).tolist(),
+                self._to_datetime_index(ends).tolist(),
+            )
+        )
+
+
+class _PeriodView(Mapping):
+    """
+    Read-only view of a result store for a single threshold, keyed by period length.
+    """
+
+    def __init__(self, results, threshold):
+        self._results = results
+        self._threshold = threshold
+
+    def __getitem__(self, period_len):
+        if period_len not in self._results._period_pos:
+            raise KeyError(period_len)
+        return _ColumnView(self._results, self._threshold, period_len)
+
+    def __iter__(self):
+        return iter(self._results.period_lengths)
+
+    def __len__(self):
+        return len(self._results.period_lengths)
+
+
+class _ColumnView(Mapping):
+    """
+    Read-only view of a result store for a single threshold and period length,
+    keyed by column. The (start, end) timestamp tuples are created on access.
+    """
+
+    def __init__(self, results, threshold, period_len):
+        self._results = results
+        self._threshold = threshold
+        self._period_len = period_len
+
+    def __getitem__(self, col):
+        if col not in self._results._col_pos:
+            raise KeyError(col)
+        starts, ends = self._results.get_periods(self._threshold, self._period_len, col)
+        return self._results._to_timestamp_tuples(starts, ends)
+
+    def __iter__(self):
+        return iter(self._results.columns)
+
+    def __len__(self):
+        return len(self._results.columns)
+
+
+def as_dunkelflaute_results(results):
+    """
+    Return the results as a DunkelflauteResults store, converting the nested
+    dictionary structure if necessary.
+    """
+    if isinstance(results, DunkelflauteResults):
+        return results
+    return DunkelflauteResults.from_dict(results)
+
+
+def _ns_to_months(values):
+    return values.view("datetime64[ns]").astype("datetime64[M]").astype(np.int64)
+
+
+def _months_to_ns(months):
+    return months.astype("datetime64[M]").astype("datetime64[ns]").view(np.int64)
+
+
+def _timestamps_to_ns(timestamps):
+    if len(timestamps) == 0:
+        return np.empty(0, dtype=np.int64)
+    index = pd.DatetimeIndex(timestamps)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return np.asarray(index.values, dtype="datetime64[ns]").view(np.int64)
+
+
+def _select(values, selection):
+    if selection is None:
+        return list(values)
+    if not isinstance(selection, (list, tuple)):
+        selection = [selection]
+    missing = [s for s in selection if s not in values]
+    if missing:
+        raise KeyError(f"{missing} is not part of the results")
+    return [v for v in values if v in selection]
+
+
+def _id_map(values, selection):
+    # Map old ids to new ids, with -1 for values that are not selected
+    mapping = np.full(len(values), -1, dtype=np.int64)
+    for new_id, value in enumerate(selection):
+        mapping[values.index(value)] = new_id
+    return mapping
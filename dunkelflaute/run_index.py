@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+from dunkelflaute.core import _get_times, _get_values
+from dunkelflaute.utils import HOUR_NS, validate_period_length, validate_threshold
+
+
+class RunIndex:
+    """
+    Precomputed index of the runs below every threshold for each column of a
+    time series, for instant event counts per (threshold, period length).
+
+    The runs of all thresholds form a tree: a run is the maximal interval
+    around its maximum value, it exists for the thresholds from its maximum
+    (birth) up to the lower of its two neighbouring values (death), where it
+    merges into a larger run. The number of events of at least period_len
+    hours at threshold t is therefore
+
+        #{runs with birth <= t and duration >= period_len}
+        - #{runs with death <= t and duration >= period_len}
+
+    and both counts are answered by a wavelet matrix in O(log n).
+    The counts are equal to those of get_dunkelflaute_results without
+    split_long_periods, tolerance or the mean mode.
+    """
+
+    def __init__(self, df):
+        values = _get_values(df)
+        times, _ = _get_times(df)
+        self.columns = list(df.columns)
+        self._col_pos = {col: i for i, col in enumerate(self.columns)}
+        self._indexes = [_ColumnRunIndex(values[k], times) for k in range(len(values))]
+
+    def count(self, threshold, period_len, col):
+        """
+        Count the events of column col of at least period_len hours, with
+        all values at or below the threshold.
+        """
+        validate_threshold(threshold)
+        validate_period_length(period_len)
+        return int(self._get_index(col).count([threshold], [period_len])[0])
+
+    def count_grid(self, thresholds, period_lengths, col):
+        """
+        Count the events of column col for all combinations of thresholds and
+        period lengths. The function returns a dataframe with the thresholds
+        as index and the period lengths as columns.
+        """
+        for threshold in thresholds:
+            validate_threshold(threshold)
+        for period_len in period_lengths:
+            validate_period_length(period_len)
+
+        grid_thresholds = np.repeat(thresholds, len(period_lengths))
+        grid_lengths = np.tile(period_lengths, len(thresholds))
+        counts = self._get_index(col).count(grid_thresholds, grid_lengths)
+        return pd.DataFrame(
+            counts.reshape(len(thresholds), len(period_lengths)),
+            index=pd.Index(thresholds, name="threshold"),
+            columns=pd.Index(period_lengths, name="period_len"),
+        )
+
+    def _get_index(self, col):
+        if col not in self._col_pos:
+            raise KeyError(col)
+        return self._indexes[self._col_pos[col]]
+
+
+class _ColumnRunIndex:
+    """
+    Run index of a single column, see RunIndex.
+    """
+
+    def __init__(self, values, times):
+        births, deaths, durations = get_run_tree(values, times)
+
+        # The runs are ordered by decreasing duration, so the runs of at least
+        # a given duration are a prefix
+        order = np.argsort(-durations, kind="stable")
+        self.durations = durations[order][::-1]
+        self.births = np.sort(births)
+        self.deaths = np.sort(deaths)
+        self._birth_ranks = _WaveletMatrix(_get_ranks(births[order]))
+        self._death_ranks = _WaveletMatrix(_get_ranks(deaths[order]))
+
+    def count(self, thresholds, period_lengths):
+        thresholds = np.asarray(thresholds, dtype=float)
+        min_durations = np.asarray(period_lengths, dtype=np.int64) * HOUR_NS
+        prefix = len(self.durations) - np.searchsorted(
+            self.durations, min_durations, "left"
+        )
+        born = self._birth_ranks.count_less(
+            prefix, np.searchsorted(self.births, thresholds, "right")
+        )
+        dead = self._death_ranks.count_less(
+            prefix, np.searchsorted(self.deaths, thresholds, "right")
+        )
+        return born - dead
+
+
+def get_run_tree(values, times):
+    """
+    Get the runs of a column below all thresholds at once. Every run is
+    the maximal interval around a maximum value, which is the run below all
+    thresholds from its birth (the maximum) up to its death (the lower of the
+    neighbouring values, inf at the ends of the series and next to NaN
+    values). The function returns three arrays of equal length:
+    (birth, death, duration), with the duration in int64 nanoseconds.
+    """
+    values = np.where(np.isnan(values), np.inf, np.asarray(values, dtype=float))
+    n = len(values)
+    prev_greater = _get_prev_greater(values, strict=True)
+    prev_greater_equal = _get_prev_greater(values, strict=False)
+    next_greater = n - 1 - _get_prev_greater(values[::-1], strict=True)[::-1]
+
+    # Equal values within a run give the same interval, only the first counts
+    is_run = (prev_greater == prev_greater_equal) & np.isfinite(values)
+    lo = prev_greater[is_run]
+    hi = next_greater[is_run]
+    padded = np.concatenate(([np.inf], values, [np.inf]))
+    deaths = np.minimum(padded[lo + 1], padded[hi + 1])
+    durations = times[hi - 1] - times[lo + 1]
+    return values[is_run], deaths, durations
+
+
+def _get_prev_greater(values, strict=True):
+    """
+    Get the position of the previous value that is greater than (or, if not
+    strict, greater than or equal to) each value, or -1 if there is none.
+    The positions are found for all values at once by binary lifting over
+    a sparse table of range maxima.
+    """
+    n = len(values)
+    # table[j][i] is the maximum of values[i : i + 2**j]
+    table = [values]
+    while 2 ** len(table) <= n:
+        size = 2 ** (len(table) - 1)
+        table.append(np.maximum(table[-1][:-size], table[-1][size:]))
+
+    # Extend the range of smaller values to the left in decreasing steps
+    first = np.arange(n)
+    for j in reversed(range(len(table))):
+        start = first - 2**j
+        valid = start >= 0
+        block_max = table[j][np.where(valid, start, 0)]
+        valid &= block_max <= values if strict else block_max < values
+        first = np.where(valid, start, first)
+    return first - 1
+
+
+def _get_ranks(values):
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[np.argsort(values, kind="stable")] = np.arange(len(values))
+    return ranks
+
+
+class _WaveletMatrix:
+    """
+    Wavelet matrix over a permutation of ranks, which counts the ranks below
+    a bound within a prefix of the sequence in O(log n).
+    """
+
+    def __init__(self, ranks):
+        self.n_bits = max(int(len(ranks)).bit_length(), 1)
+        # Prefix counts of the one bits and number of zero bits per level
+        self.levels = []
+        for bit in reversed(range(self.n_bits)):
+            is_one = (ranks >> bit) & 1 == 1
+            ones = np.concatenate(([0], np.cumsum(is_one))).astype(np.uint32)
+            self.levels.append((ones, len(ranks) - int(ones[-1])))
+            ranks = np.concatenate((ranks[~is_one], ranks[is_one]))
+
+    def count_less(self, prefix, bound):
+        """
+        Count the ranks below bound among the first prefix ranks, for arrays
+        of prefixes and bounds.
+        """
+        prefix = np.asarray(prefix, dtype=np.int64)
+        bound = np.asarray(bound, dtype=np.int64)
+        count = np.zeros(len(prefix), dtype=np.int64)
+        lo = np.zeros(len(prefix), dtype=np.int64)
+        hi = prefix.copy()
+        for level, (ones, n_zeros) in enumerate(self.levels):
+            is_one = (bound >> (self.n_bits - 1 - level)) & 1 == 1
+            ones_lo = ones[lo].astype(np.int64)
+            ones_hi = ones[hi].astype(np.int64)
+            # Ranks with a zero where the bound has a one are below the bound
+            count += np.where(is_one, (hi - lo) - (ones_hi - ones_lo), 0)
+            lo = np.where(is_one, n_zeros + ones_lo, lo - ones_lo)
+            hi = np.where(is_one, n_zeros + ones_hi, hi - ones_hi)
+        return count
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+INDEX_FILE = "index.npy"
+VALUES_FILE = "values.npy"
+META_FILE = "meta.json"
+
+
+class MemmapTimeSeries:
+    """
+    Time series stored on disk as raw arrays that are memory-mapped on access.
+    A store is a directory with the following files:
+
+    - index.npy: int64 timestamps in nanoseconds since epoch (UTC)
+    - values.npy: matrix of shape (number of columns, number of rows), so
+      every column is a contiguous block on disk
+    - meta.json: column names, time zone and index name
+
+    The store can be used in place of a dataframe in get_total_production_df,
+    find_fuzzy_periods and get_dunkelflaute_results. Only the pages of the
+    column that is currently processed are read, so the memory use stays
+    bounded by a few columns, not the whole dataset.
+    """
+
+    def __init__(self, path):
+        if not os.path.exists(os.path.join(path, META_FILE)):
+            raise FileNotFoundError(f"Directory {path} is not a time series store")
+
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.columns = meta["columns"]
+        self.tz = meta["tz"]
+        self.index_name = meta["index_name"]
+        self.times = np.load(os.path.join(path, INDEX_FILE), mmap_mode="r")
+        self.values = np.load(os.path.join(path, VALUES_FILE), mmap_mode="r")
+        self._col_pos = {col: i for i, col in enumerate(self.columns)}
+
+    @classmethod
+    def create(
+        cls, path, times, columns, tz=None, index_name="datetime", dtype=np.float64
+    ):
+        """
+        Create an empty store for the given int64 nanosecond timestamps and
+        columns. The values can be written through the writable memmap
+        returned by open_values. An existing store is never overwritten, as
+        memmaps that are still open on it would see the new data.
+        """
+        return cls._build(path, times, columns, tz, index_name, dtype)
+
+    @classmethod
+    def from_frame(cls, df, path, dtype=np.float64, chunk_size=1_000_000):
+        """
+        Write a dataframe with a datetime index to a new store.
+        """
+        if not isinstance(df.index, pd.DatetimeIndex):
+            raise ValueError("df should have a datetime index")
+
+        def write_values(values):
+            for k, col in enumerate(df.columns):
+                column = df[col].to_numpy()
+                for lo in range(0, len(df), chunk_size):
+                    values[k, lo : lo + chunk_size] = column[lo : lo + chunk_size]
+
+        index = df.index if df.index.tz is None else df.index.tz_convert(None)
+        return cls._build(
+            path,
+            np.asarray(index.values, dtype="datetime64[ns]").view(np.int64),
+            df.columns,
+            tz=None if df.index.tz is None else str(df.index.tz),
+            index_name=df.index.name,
+            dtype=dtype,
+            write_values=write_values,
+        )
+
+    @classmethod
+    def _build(cls, path, times, columns, tz, index_name, dtype, write_values=None):
+        """
+        Write a new store to a temporary directory next to path and move it
+        into place when it is complete. The values are filled in by
+        write_values(values), if given. The function raises a
+        FileExistsError if path exists.
+        """
+        times = np.asarray(times, dtype=np.int64)
+        if len(times) > 1 and not (np.diff(times) > 0).all():
+            raise ValueError("times should be strictly increasing")
+        path = os.path.normpath(path)
+        if os.path.exists(path):
+            raise FileExistsError(f"Store {path} already exists")
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=f".{os.path.basename(path)}.", dir=parent)
+        try:
+            np.save(os.path.join(tmp_path, INDEX_FILE), times)
+            values = np.lib.format.open_memmap(
+                os.path.join(tmp_path, VALUES_FILE),
+                mode="w+",
+                dtype=dtype,
+                shape=(len(columns), len(times)),
+            )
+            if write_values is not None:
+                write_values(values)
+            values.flush()
+            del values
+            with open(os.path.join(tmp_path, META_FILE), "w") as f:
+                json.dump(
+                    {"columns": list(columns), "tz": tz, "index_name": index_name}, f
+                )
+            if os.path.exists(path):
+                raise FileExistsError(f"Store {path} already exists")
+            # Fails if another store was moved into place in the meantime
+            os.rename(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return cls(path)
+
+    def open_values(self):
+        """
+        Open the values matrix for writing.
+        """
+        return np.load(os.path.join(self.path, VALUES_FILE), mmap_mode="r+")
+
+    @property
+    def index(self):
+        """
+        The timestamps as a datetime index (this loads the index into memory).
+        """
+        index = pd.DatetimeIndex(
+            np.asarray(self.times).view("datetime64[ns]"), name=self.index_name
+        )
+        if self.tz is not None:
+            index = index.tz_localize("UTC").tz_convert(self.tz)
+        return index
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, col):
+        """
+        Memory-mapped values of a single column.
+        """
+        if col not in self._col_pos:
+            raise KeyError(col)
+        return self.values[self._col_pos[col]]
+
+    def __repr__(self):
+        return (
+            f"MemmapTimeSeries(path={self.path!r}, rows={len(self)}, "
+            f"columns={self.columns})"
+        )
+
+    def to_frame(self, columns=None, start=None, end=None):
+        """
+        Load a selection of columns and a time range (start and end included)
+        into a dataframe.
+        """
+        columns = self.columns if columns is None else list(columns)
+        index = self.index
+        lo = 0 if start is None else index.searchsorted(pd.Timestamp(start), "left")
+        hi = (
+            len(index)
+            if end is None
+            else index.searchsorted(pd.Timestamp(end), "right")
+        )
+        return pd.DataFrame(
+            {col: np.asarray(self[col][lo:hi]) for col in columns},
+            index=index[lo:hi],
+        )
+
+    def iter_chunks(self, chunk_size=100_000, columns=None):
+        """
+        Iterate over the store in chunks of rows, each loaded into a dataframe.
+        """
+        columns = self.columns if columns is None else list(columns)
+        index = self.index
+        for lo in range(0, len(self), chunk_size):
+            yield pd.DataFrame(
+                {col: np.asarray(self[col][lo : lo + chunk_size]) for col in columns},
+                index=index[lo : lo + chunk_size],
+            )
+
+    def get_total_production(
+        self, cap_mix=[0.5], cap_dem_ratio=1.0, path=None, chunk_size=1_000_000
+    ):
+        """
+        Compute the total production for the given capacity mixes (see
+        get_total_production_matrix) chunk by chunk and write it to a new
+        store, which is returned. If path is None, the store is written next
+        to this store, in a directory named after a key of the capacity mix,
+        the capacity demand ratio and this store's values file, and an
+        existing store of the same key is reused. An existing path raises a
+        FileExistsError.
+        """
+        from dunkelflaute.core import get_total_production_matrix
+
+        # Compute the column names from a single row
+        _, columns = get_total_production_matrix(
+            {"wind": self["wind"][:1], "solar": self["solar"][:1]},
+            cap_mix,
+            cap_dem_ratio,
+        )
+        reuse = path is None
+        if reuse:
+            path = self.get_production_path(cap_mix, cap_dem_ratio)
+            if os.path.exists(os.path.join(path, META_FILE)):
+                return MemmapTimeSeries(path)
+
+        def write_values(values):
+            for lo in range(0, len(self), chunk_size):
+                chunk = {
+                    "wind": self["wind"][lo : lo + chunk_size],
+                    "solar": self["solar"][lo : lo + chunk_size],
+                }
+                chunk_values, _ = get_total_production_matrix(
+                    chunk, cap_mix, cap_dem_ratio, dtype=values.dtype
+                )
+                values[:, lo : lo + chunk_size] = chunk_values
+
+        try:
+            return MemmapTimeSeries._build(
+                path,
+                self.times,
+                columns,
+                self.tz,
+                self.index_name,
+                self.values.dtype,
+                write_values,
+            )
+        except OSError:
+            # Another process may have built the same production store
+            if reuse and os.path.exists(os.path.join(path, META_FILE)):
+                return MemmapTimeSeries(path)
+            raise
+
+    def get_production_path(self, cap_mix, cap_dem_ratio=1.0):
+        """
+        Get the default path of a production store of this store, see
+        get_total_production.
+        """
+        stat = os.stat(os.path.join(self.path, VALUES_FILE))
+        key = json.dumps(
+            [
+                np.asarray(cap_mix, dtype=float).tolist(),
+                np.asarray(cap_dem_ratio, dtype=float).tolist(),
+                self.values.dtype.str,
+                stat.st_mtime_ns,
+                stat.st_size,
+            ]
+        )
+        digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+        return f"{os.path.normpath(self.path)}_production_{digest}"
@@ -0,0 +1,356 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from dunkelflaute.core import (
+    _concatenate,
+    _get_periods_from_runs,
+    _get_values,
+    _index_to_ns,
+    find_runs_multi,
+)
+from dunkelflaute.results import DunkelflauteResults
+from dunkelflaute.utils import (
+    _write_json,
+    _write_npz,
+    validate_period_length,
+    validate_threshold,
+    validate_thresholds,
+)
+
+NO_RUN = np.iinfo(np.int64).min  # marks a (column, threshold) without an open run
+
+
+class StreamingDetector:
+    """
+    Detect dunkelflaute periods in a time series that arrives in chunks, e.g.
+    from pd.read_csv(..., chunksize=...), MemmapTimeSeries.iter_chunks or a
+    live feed. The detector keeps the run that is still open at the end of
+    the last chunk for every (column, threshold), so runs crossing chunk
+    boundaries are found exactly as by get_dunkelflaute_results on the
+    whole series.
+
+    - update(chunk) returns the periods that closed within the chunk
+    - flush() returns the periods of the runs that are still open, as if the
+      series ended after the last chunk
+
+    Both return a DunkelflauteResults store.
+    """
+
+    def __init__(self, thresholds, period_lengths, split_long_periods=False):
+        validate_thresholds(thresholds)
+        for threshold in thresholds:
+            validate_threshold(threshold)
+        for period_len in period_lengths:
+            validate_period_length(period_len)
+
+        self.thresholds = list(thresholds)
+        self.period_lengths = list(period_lengths)
+        self.split_long_periods = split_long_periods
+        self.columns = None
+        self.tz = None
+        self.last_time = None
+        # Start and end (int64 nanoseconds) of the open run per (column, threshold)
+        self.open_start = None
+        self.open_end = None
+
+    def update(self, chunk):
+        """
+        Process the next chunk of the time series (a dataframe with a
+        datetime index) and return the periods that closed within it.
+        """
+        if not isinstance(chunk, pd.DataFrame):
+            raise ValueError("chunk should be a pandas dataframe")
+
+        times = _index_to_ns(chunk.index)
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self.tz = chunk.index.tz
+            shape = (len(self.columns), len(self.thresholds))
+            self.open_start = np.full(shape, NO_RUN, dtype=np.int64)
+            self.open_end = np.full(shape, NO_RUN, dtype=np.int64)
+        elif list(chunk.columns) != self.columns:
+            raise ValueError("all chunks should have the same columns")
+        if len(times) == 0:
+            return self._to_results([])
+
+        after_last = self.last_time is None or times[0] > self.last_time
+        if not after_last or not (np.diff(times) > 0).all():
+            raise ValueError("chunks should be in strictly increasing time order")
+
+        values = _get_values(chunk)
+        parts = [
+            self._update_column(k, values[k], times) for k in range(len(self.columns))
+        ]
+        self.last_time = int(times[-1])
+        return self._to_results(parts)
+
+    def flush(self):
+        """
+        Close all open runs and return their periods.
+        """
+        closed = self.get_open_periods()
+        if self.columns is not None:
+            self.open_start[:] = NO_RUN
+            self.open_end[:] = NO_RUN
+        return closed
+
+    def get_open_periods(self):
+        """
+        Return the periods of the runs that are still open, without closing them.
+        """
+        if self.columns is None:
+            return self._to_results([])
+
+        parts = []
+        for k in range(len(self.columns)):
+            threshold_ids = np.flatnonzero(self.open_start[k] != NO_RUN)
+            parts.append(
+                (k,)
+                + _get_periods_from_runs(
+                    self.open_start[k, threshold_ids],
+                    self.open_end[k, threshold_ids],
+                    threshold_ids,
+                    self.period_lengths,
+                    self.split_long_periods,
+                )
+            )
+        return self._to_results(parts)
+
+    def get_state(self):
+        """
+        Return the open-run state as a dictionary of arrays, see set_state.
+        """
+        return {
+            "open_start": self.open_start,
+            "open_end": self.open_end,
+            "last_time": self.last_time,
+        }
+
+    def set_state(self, columns, tz, open_start, open_end, last_time):
+        """
+        Restore the open-run state of a detector, e.g. after loading it from disk.
+        """
+        shape = (len(columns), len(self.thresholds))
+        open_start = np.asarray(open_start, dtype=np.int64)
+        open_end = np.asarray(open_end, dtype=np.int64)
+        if open_start.shape != shape or open_end.shape != shape:
+            raise ValueError(f"open run arrays should have the shape {shape}")
+
+        self.columns = list(columns)
+        self.tz = tz
+        self.open_start = open_start.copy()
+        self.open_end = open_end.copy()
+        self.last_time = None if last_time is None else int(last_time)
+
+    def _update_column(self, k, values, times):
+        run_start_pos, run_end_pos, run_threshold_ids = find_runs_multi(
+            values, self.thresholds
+        )
+        run_starts = times[run_start_pos]
+        run_ends = times[run_end_pos]
+
+        open_start = self.open_start[k]
+        open_end = self.open_end[k]
+        has_open = open_start != NO_RUN
+
+        # Runs at the start of the chunk extend the open run of the last chunk
+        first = run_start_pos == 0
+        continues = np.zeros(len(self.thresholds), dtype=bool)
+        continues[run_threshold_ids[first]] = True
+        extend = first & has_open[run_threshold_ids]
+        run_starts[extend] = open_start[run_threshold_ids[extend]]
+
+        # Open runs that do not continue into this chunk are closed
+        closed_ids = np.flatnonzero(has_open & ~continues)
+        closed_starts = open_start[closed_ids]
+        closed_ends = open_end[closed_ids]
+
+        # Runs reaching the end of the chunk may continue in the next chunk
+        last = run_end_pos == len(times) - 1
+        open_start[:] = NO_RUN
+        open_end[:] = NO_RUN
+        open_start[run_threshold_ids[last]] = run_starts[last]
+        open_end[run_threshold_ids[last]] = run_ends[last]
+
+        starts = np.concatenate((closed_starts, run_starts[~last]))
+        ends = np.concatenate((closed_ends, run_ends[~last]))
+        threshold_ids = np.concatenate((closed_ids, run_threshold_ids[~last]))
+        order = np.lexsort((starts, threshold_ids))
+        return (k,) + _get_periods_from_runs(
+            starts[order],
+            ends[order],
+            threshold_ids[order],
+            self.period_lengths,
+            self.split_long_periods,
+        )
+
+    def _to_results(self, parts):
+        return DunkelflauteResults(
+            _concatenate([starts for _, starts, _, _, _ in parts]),
+            _concatenate([ends for _, _, ends, _, _ in parts]),
+            _concatenate([np.full(len(part[1]), part[0]) for part in parts]),
+            _concatenate([ids for _, _, _, ids, _ in parts]),
+            _concatenate([ids for _, _, _, _, ids in parts]),
+            self.columns or [],
+            self.thresholds,
+            self.period_lengths,
+            tz=self.tz,
+        )
+
+
+def iter_dunkelflaute_periods(
+    chunks, thresholds, period_lengths, split_long_periods=False
+):
+    """
+    Detect dunkelflaute periods in an iterable of chunks (dataframes with a
+    datetime index) and yield a DunkelflauteResults store as soon as periods
+    close. Only the current chunk and the open runs are kept in memory, so
+    archives larger than the available memory can be processed. Combining
+    the yielded stores with DunkelflauteResults.concat gives the same
+    periods as get_dunkelflaute_results on the whole series.
+    """
+    detector = StreamingDetector(thresholds, period_lengths, split_long_periods)
+    for chunk in chunks:
+        closed = detector.update(chunk)
+        if closed.n_events > 0:
+            yield closed
+
+    closed = detector.flush()
+    if closed.n_events > 0:
+        yield closed
+
+
+class IncrementalDunkelflaute:
+    """
+    Dunkelflaute results that are kept up to date as new hours are appended
+    to a time series. The closed periods are kept as an append-only list of
+    result stores, together with the open run of every (column, threshold)
+    from the StreamingDetector. Appending rows only processes the new rows,
+    and a run that was still open at the old tail is extended.
+
+    The results property is always equal to get_dunkelflaute_results on the
+    whole series, because the open runs count as periods ending at the tail.
+    With save and load, the state is persisted in a directory, where each
+    update only writes the new closed periods and the small open-run state.
+    """
+
+    def __init__(self, thresholds, period_lengths, split_long_periods=False):
+        self.detector = StreamingDetector(
+            thresholds, period_lengths, split_long_periods
+        )
+        self._closed = []
+        self._n_saved = 0
+        self._saved_path = None
+        self._results = None
+
+    @classmethod
+    def from_frame(cls, df, thresholds, period_lengths, split_long_periods=False):
+        """
+        Create the incremental results for an initial dataframe.
+        """
+        incremental = cls(thresholds, period_lengths, split_long_periods)
+        incremental.append(df)
+        return incremental
+
+    def append(self, df_new):
+        """
+        Process newly appended rows (a dataframe with a datetime index, later
+        than all previous rows) and return the periods that closed.
+        """
+        closed = self.detector.update(df_new)
+        if closed.n_events > 0:
+            self._closed.append(closed)
+        self._results = None
+        return closed
+
+    @property
+    def results(self):
+        """
+        All periods of the time series so far as a DunkelflauteResults store.
+        """
+        if self._results is None:
+            self._results = DunkelflauteResults.concat(
+                self._closed + [self.detector.get_open_periods()]
+            )
+        return self._results
+
+    def save(self, path):
+        """
+        Save the incremental state to a directory. Closed periods that were
+        already saved to (or loaded from) the same directory are not written
+        again. The number of saved parts is stored together with the open
+        runs in state.npz, which is replaced in one step after the parts are
+        written, so an interrupted save leaves the previous state intact.
+        """
+        os.makedirs(path, exist_ok=True)
+        if self._saved_path != os.path.abspath(path):
+            self._n_saved = 0
+
+        # Part files are numbered by their position in the list of closed
+        # periods, parts beyond n_parts of the state are left over from an
+        # interrupted save and are overwritten
+        for i in range(self._n_saved, len(self._closed)):
+            self._closed[i].save(os.path.join(path, f"part_{i:06d}.npz"))
+
+        detector = self.detector
+        _write_json(
+            os.path.join(path, "meta.json"),
+            {
+                "thresholds": detector.thresholds,
+                "period_lengths": detector.period_lengths,
+                "split_long_periods": detector.split_long_periods,
+            },
+        )
+        state = {
+            "columns": detector.columns,
+            "tz": None if detector.tz is None else str(detector.tz),
+            "n_parts": len(self._closed),
+        }
+        arrays = {}
+        if detector.columns is not None:
+            arrays = {
+                "open_start": detector.open_start,
+                "open_end": detector.open_end,
+                "last_time": np.array(
+                    NO_RUN if detector.last_time is None else detector.last_time
+                ),
+            }
+        _write_npz(
+            os.path.join(path, "state.npz"),
+            meta=np.array(json.dumps(state)),
+            **arrays,
+        )
+        self._n_saved = len(self._closed)
+        self._saved_path = os.path.abspath(path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load the incremental state saved with save.
+        """
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        incremental = cls(
+            meta["thresholds"], meta["period_lengths"], meta["split_long_periods"]
+        )
+        with np.load(os.path.join(path, "state.npz")) as state:
+            state_meta = json.loads(str(state["meta"]))
+            if state_meta["columns"] is not None:
+                last_time = int(state["last_time"])
+                incremental.detector.set_state(
+                    state_meta["columns"],
+                    state_meta["tz"],
+                    state["open_start"],
+                    state["open_end"],
+                    None if last_time == NO_RUN else last_time,
+                )
+        incremental._closed = [
+            DunkelflauteResults.load(os.path.join(path, f"part_{i:06d}.npz"))
+            for i in range(state_meta["n_parts"])
+        ]
+        incremental._n_saved = len(incremental._closed)
+        incremental._saved_path = os.path.abspath(path)
+        return incremental
@@ -1,65 +1,237 @@
+import hashlib
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+from dunkelflaute.storage import MemmapTimeSeries
+
+HOUR_NS = 3_600_000_000_000  # one hour in nanoseconds
+CACHE_DIR_NAME = ".dunkelflaute_cache"
+CACHE_META_KEYS = ["mtime_ns", "size", "sha256", "columns", "index_name", "tz"]
+FILE_FORMATS = ["svg", "png", "pdf"]  # file formats of the plots
+RAW_FILE_PATTERNS = {
+    "wind": "DEU1_ONSHORE_IEC_3_LCOE_1_{yr}_ts.csv",
+    "solar": "DEU1_SOLAR_ROOFTOP_LCOE_1_{yr}_ts.csv",
+}
+
 
-def create_ts_from_raw(file_path, yr_range):
+def create_ts_from_raw(
+    file_path,
+    yr_range,
+    file_patterns=None,
+    dtype=np.float32,
+    max_workers=None,
+    store_path=None,
+):
     """
-    Create a dataframe with wind and solar data time series both as normalized to maximum capacity
+    Create a dataframe with wind and solar data time series both as normalized to maximum capacity.
+    The raw files of all years and technologies are read concurrently in a
+    thread pool, each parsing only its year column as dtype, and are
+    concatenated once. file_patterns maps the column names to the raw file
+    names with a {yr} placeholder and defaults to RAW_FILE_PATTERNS.
+    If store_path is given, the dataframe is also written to a
+    MemmapTimeSeries store in that directory.
     """
-    df_all = pd.DataFrame()
-    for yr in yr_range:
-        date_time = pd.date_range(
+    if file_patterns is None:
+        file_patterns = RAW_FILE_PATTERNS
+    yr_range = list(yr_range)
+    if len(yr_range) == 0:
+        raise ValueError("yr_range should not be empty")
+
+    tasks = [(col, yr) for col in file_patterns for yr in yr_range]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        columns = list(
+            pool.map(
+                lambda task: _read_raw_column(
+                    os.path.join(file_path, file_patterns[task[0]].format(yr=task[1])),
+                    task[1],
+                    dtype,
+                ),
+                tasks,
+            )
+        )
+
+    date_times = [
+        pd.date_range(
             start=f"{yr}-01-01 00:00:00", end=f"{yr}-12-31 23:00:00", freq="h"
         )
+        for yr in yr_range
+    ]
+    n_years = len(yr_range)
+    for i, ((col, yr), column) in enumerate(zip(tasks, columns)):
+        n_hours = len(date_times[i % n_years])
+        if len(column) != n_hours:
+            raise ValueError(
+                f"Raw {col} file of {yr} should contain {n_hours} values, "
+                f"found {len(column)}"
+            )
 
-        fn_wind = os.path.join(file_path, f"DEU1_ONSHORE_IEC_3_LCOE_1_{yr}_ts.csv")
-        df_wind = pd.read_csv(fn_wind, header=3)
-        df_wind.dropna(inplace=True)
-        df_wind.rename(columns={f"{yr}": "wind"}, inplace=True)
-        df_wind["datetime"] = date_time
-        df_wind.rename(columns={f"{yr}": "wind"}, inplace=True)
-        df_wind.set_index("datetime", inplace=True)
-
-        fn_solar = os.path.join("data", "raw", f"DEU1_SOLAR_ROOFTOP_LCOE_1_{yr}_ts.csv")
-        df_solar = pd.read_csv(fn_solar, header=3)
-        df_solar.dropna(inplace=True)
-        df_solar.rename(columns={f"{yr}": "solar"}, inplace=True)
-        df_solar["datetime"] = date_time
-        df_solar.rename(columns={f"{yr}": "solar"}, inplace=True)
-        df_solar.set_index("datetime", inplace=True)
-
-        df_yr = pd.concat([df_wind, df_solar], axis=1)
-        if df_all.empty:
-            df_all = df_yr
-        else:
-            df_all = pd.concat([df_all, df_yr], axis=0)
+    index = pd.DatetimeIndex(
+        np.concatenate([date_time.values for date_time in date_times]),
+        name="datetime",
+    )
+    df_all = pd.DataFrame(
+        {
+            col: np.concatenate(columns[i * n_years : (i + 1) * n_years])
+            for i, col in enumerate(file_patterns)
+        },
+        index=index,
+    )
+
+    if store_path is not None:
+        MemmapTimeSeries.from_frame(df_all, store_path, dtype=dtype)
 
     return df_all
 
 
-def load_df(file_path):
+def _read_raw_column(fn, yr, dtype):
+    # Only the year column is parsed, the C parser releases the GIL
+    column = pd.read_csv(fn, header=3, usecols=[f"{yr}"], dtype={f"{yr}": dtype})
+    return column[f"{yr}"].dropna().to_numpy()
+
+
+def load_df(file_path, use_cache=True, cache_dir=None):
     """
-    Load a dataframe from a CSV file
+    Load a dataframe from a CSV file.
+    If use_cache is True, the parsed dataframe is kept in a binary cache
+    (a pair of .npy files and a JSON key) in cache_dir, which defaults to a
+    '.dunkelflaute_cache' folder next to the CSV file. The cache is used as
+    long as the modification time and size of the CSV file are unchanged, or
+    its content hash still matches.
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File {file_path} does not exist")
 
+    if use_cache:
+        cache_path = get_cache_path(file_path, cache_dir)
+        df = _read_cached_df(file_path, cache_path)
+        if df is not None:
+            return df
+
     df = pd.read_csv(file_path, index_col=0, parse_dates=True)
+    validate_wind_solar_df(df, file_path)
+
+    if use_cache:
+        try:
+            _write_cached_df(df, file_path, cache_path)
+        except OSError:
+            # The cache is optional, e.g. the data directory may be read-only
+            pass
+
+    return df
+
 
+def validate_wind_solar_df(df, file_path):
+    """
+    Validate a wind and solar dataframe loaded from a file.
+    The hourly frequency is checked on the differences of the int64 index,
+    which must be positive multiples of one hour (gaps are allowed).
+    """
     if df.empty:
         raise ValueError(f"File {file_path} is empty")
     if not all(df.columns.isin(["wind", "solar"])):
         raise ValueError(f"File {file_path} should contain 'wind' and 'solar' columns")
-    if not df.index.isin(
-        pd.date_range(start=df.index[0], end=df.index[-1], freq="h")
-    ).all():
+    if not pd.api.types.is_datetime64_any_dtype(df.index):
+        raise ValueError(f"File {file_path} should have a datetime index")
+    diffs = np.diff(np.asarray(df.index.values, dtype="datetime64[ns]").view(np.int64))
+    if not ((diffs > 0) & (diffs % HOUR_NS == 0)).all():
         raise ValueError(
             f"File {file_path} should have a datetime index with hourly frequency"
         )
-    if not pd.api.types.is_datetime64_any_dtype(df.index):
-        raise ValueError(f"File {file_path} should have a datetime index")
 
-    return df
+
+def get_cache_path(file_path, cache_dir=None):
+    """
+    Get the path prefix of the binary cache files for a data file.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(file_path), CACHE_DIR_NAME)
+    return os.path.join(cache_dir, os.path.basename(file_path))
+
+
+def get_file_hash(file_path):
+    """
+    Get the SHA-256 hash of a file's content.
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def _read_cached_df(file_path, cache_path):
+    try:
+        with open(f"{cache_path}.json") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(meta, dict) or not set(CACHE_META_KEYS) <= set(meta):
+        return None
+
+    stat = os.stat(file_path)
+    if (stat.st_mtime_ns, stat.st_size) != (meta["mtime_ns"], meta["size"]):
+        # The file was touched or changed, so fall back to the content hash
+        if stat.st_size != meta["size"] or get_file_hash(file_path) != meta["sha256"]:
+            return None
+        meta["mtime_ns"] = stat.st_mtime_ns
+        try:
+            _write_json(f"{cache_path}.json", meta)
+        except OSError:
+            pass
+
+    try:
+        index = np.load(f"{cache_path}.index.npy")
+        values = np.load(f"{cache_path}.values.npy")
+    except (OSError, ValueError):
+        return None
+
+    index = pd.DatetimeIndex(index, name=meta["index_name"])
+    if meta["tz"] is not None:
+        index = index.tz_localize("UTC").tz_convert(meta["tz"])
+    return pd.DataFrame(values, index=index, columns=meta["columns"], copy=False)
+
+
+def _write_cached_df(df, file_path, cache_path):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    stat = os.stat(file_path)
+    meta = {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": get_file_hash(file_path),
+        "columns": list(df.columns),
+        "index_name": df.index.name,
+        "tz": None if df.index.tz is None else str(df.index.tz),
+    }
+    index = df.index if df.index.tz is None else df.index.tz_convert(None)
+    _write_npy(f"{cache_path}.index.npy", index.values)
+    _write_npy(f"{cache_path}.values.npy", df.to_numpy())
+    # The key is written last, so an interrupted write is never used
+    _write_json(f"{cache_path}.json", meta)
+
+
+def _write_npy(path, array):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _write_npz(path, **arrays):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
 
 
 def get_number_of_years(df):
@@ -93,14 +265,32 @@ def validate_threshold(threshold):
         raise ValueError("threshold should be a number")
 
 
+def validate_cap_dem_ratio(cap_dem_ratio):
+    if not isinstance(cap_dem_ratio, (int, float)) or not np.isfinite(cap_dem_ratio):
+        raise ValueError("cap_dem_ratio should be a finite number")
+    if cap_dem_ratio <= 0:
+        raise ValueError("cap_dem_ratio should be positive")
+
+
 def validate_period_length(period_len):
     if not isinstance(period_len, int):
         raise ValueError("period_len should be an integer")
 
 
-def validate_tolerance(tol):
+def validate_tolerance(tol, tol_mode="gap"):
     if not isinstance(tol, int):
         raise ValueError("tol should be an integer")
+    if tol < 0:
+        raise ValueError("tol should not be negative")
+    if tol_mode not in ["gap", "total"]:
+        raise ValueError("tol_mode should be 'gap' or 'total'")
+
+
+def validate_mode(mode, tol=0):
+    if mode not in ["max", "mean"]:
+        raise ValueError("mode should be 'max' or 'mean'")
+    if mode == "mean" and tol != 0:
+        raise ValueError("tol can only be used with mode 'max'")
 
 
 def validate_thresholds(thresholds):
@@ -108,3 +298,8 @@ def validate_thresholds(thresholds):
         raise ValueError("thresholds should be a list")
     if len(thresholds) == 0:
         raise ValueError("thresholds should not be empty")
+
+
+def validate_file_format(file_format):
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"file_format should be one of {FILE_FORMATS}")
@@ -1,28 +1,77 @@
 from matplotlib import pyplot as plt
 from matplotlib.colors import BoundaryNorm
+from matplotlib.figure import Figure
 import os
-import pandas as pd
 import numpy as np
 
+from dunkelflaute.core import get_event_statistics
+from dunkelflaute.parallel import get_n_jobs, map_shared
+from dunkelflaute.results import as_dunkelflaute_results
+from dunkelflaute.run_index import RunIndex
+from dunkelflaute.utils import validate_file_format
 
-def create_new_figure():
+
+def create_new_figure(managed=True):
     """
     Create a new figure with the specified size and DPI.
+    If managed is False, the figure is not registered with pyplot, so it can
+    be reused for many files and rendered without a GUI backend.
     """
     height = 13.8  # cm, for ppt
     width = 31.2  # cm, for ppt
 
-    fig = plt.figure(figsize=(width / 2.54, height / 2.54), dpi=300)
     plt.rcParams["font.family"] = "Linux Biolinum"
     plt.rcParams["font.size"] = 10
+    if not managed:
+        return Figure(figsize=(width / 2.54, height / 2.54), dpi=300)
+    return plt.figure(figsize=(width / 2.54, height / 2.54), dpi=300)
 
-    return fig
 
+def get_pixel_width(fig):
+    """
+    Get the width of a figure in pixels at its DPI.
+    """
+    return int(np.ceil(fig.get_figwidth() * fig.dpi))
 
-def save_figure(fig, filename):
+
+def decimate_minmax(times, values, n_bins):
+    """
+    Reduce a time series to the minimum and maximum of n_bins equal time
+    bins (and the first and last value), in time order. Drawn as a line at
+    one bin per pixel, this envelope looks like the full series, so the
+    number of plotted points depends on the plot width and not on the
+    length of the series. Series with at most 2 * n_bins values are
+    returned unchanged.
+    """
+    times = np.asarray(times)
+    values = np.asarray(values, dtype=float)
+    if len(values) <= 2 * n_bins:
+        return times, values
+
+    if np.issubdtype(times.dtype, np.datetime64):
+        positions = times.astype("datetime64[ns]").view(np.int64)
+    else:
+        positions = times
+    offsets = (positions - positions[0]).astype(float)
+    bins = np.minimum(
+        (offsets / max(offsets[-1], 1) * n_bins).astype(np.int64), n_bins - 1
+    )
+
+    # Sort by value within each bin, the bins keep their positions as the
+    # times are sorted; NaN values sort last and keep the gaps in the line
+    order = np.lexsort((values, bins))
+    bounds = np.flatnonzero(np.diff(bins)) + 1
+    mins = order[np.concatenate(([0], bounds))]
+    maxs = order[np.concatenate((bounds, [len(values)])) - 1]
+    keep = np.unique(np.concatenate(([0, len(values) - 1], mins, maxs)))
+    return times[keep], values[keep]
+
+
+def save_figure(fig, filename, close=True):
     """
     Save the figure to a file with the specified filename.
-    The file is saved in the 'plots' directory.
+    The file is saved in the 'plots' directory, and the figure is closed
+    unless close is False.
     """
     plot_dir = "plots"
     if not os.path.exists(plot_dir):
@@ -35,33 +84,33 @@ def save_figure(fig, filename):
         pad_inches=0.1,
         transparent=True,
     )
-    plt.close(fig)
+    if close:
+        plt.close(fig)
 
 
 def plot_dunkelflaute_events(
-    results, df_total, cap_mix_range, thresholds, period_lenghts
+    results, df_total, cap_mix_range, thresholds, period_lenghts, file_format="svg"
 ):
     """
     Plot the dunkelflaute events for different capacity mixes and capacity factor thresholds.
     The plot shows the number of dunkelflaute events for each capacity mix and capacity factor threshold
     for different period lengths.
-    The plots are saved as a SVG file.
+    The plots are saved in the given file format ("svg", "png" or "pdf").
     """
+    validate_file_format(file_format)
+    results = as_dunkelflaute_results(results)
     no_years = len(df_total.index.year.unique())
 
     for cap_mix in cap_mix_range:
         fig = create_new_figure()
         for threshold in thresholds:
-            dunkelflaute_counts = []
-            for period_len in period_lenghts:
-                dunkelflaute_counts.append(
-                    len(
-                        results[threshold][period_len][
-                            f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"
-                        ]
-                    )
-                    / no_years
+            dunkelflaute_counts = [
+                results.count(
+                    threshold, period_len, f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"
                 )
+                / no_years
+                for period_len in period_lenghts
+            ]
 
             # Plot x-axis in days
             period_lenghts_days = [p / 24 for p in period_lenghts]
@@ -79,7 +128,7 @@ def plot_dunkelflaute_events(
         plt.ylabel("Number of observed Dunkelflaute events (# of events per year)")
         plt.legend()
         plt.grid()
-        save_figure(fig, f"dunkelflaute_events_{cap_mix}.svg")
+        save_figure(fig, f"dunkelflaute_events_{cap_mix}.{file_format}")
 
     # Do the same in a single plot, putting all capacity mix ratios side by side in subplots horizontally
     fig = create_new_figure()
@@ -87,16 +136,13 @@ def plot_dunkelflaute_events(
         y_max = 0
         plt.subplot(1, len(cap_mix_range), i + 1)
         for threshold in thresholds:
-            dunkelflaute_counts = []
-            for period_len in period_lenghts:
-                dunkelflaute_counts.append(
-                    len(
-                        results[threshold][period_len][
-                            f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"
-                        ]
-                    )
-                    / no_years
+            dunkelflaute_counts = [
+                results.count(
+                    threshold, period_len, f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"
                 )
+                / no_years
+                for period_len in period_lenghts
+            ]
 
             # Plot x-axis in days
             period_lenghts_days = [p / 24 for p in period_lenghts]
@@ -121,27 +167,47 @@ def plot_dunkelflaute_events(
         plt.ylim(0, y_max * 1.1)
 
     plt.tight_layout()
-    save_figure(fig, "dunkelflaute_events.svg")
+    save_figure(fig, f"dunkelflaute_events.{file_format}")
 
 
-def plot_period_ts_data(results, df_total, cap_mix, threshold, period_len):
+def plot_period_ts_data(
+    results,
+    df_total,
+    cap_mix,
+    threshold,
+    period_len,
+    file_format="svg",
+    n_jobs=None,
+):
     """
     Plot the time series data for a given capacity mix, cap. factor threshold, and period length.
     The plot shows the total production and the dunkelflaute events
     (periods below the cap. factor threshold) highlighted in red.
     Total plot and individual plots for each period are saved.
-    The plots are saved as a SVG file.
+    The plots are saved in the given file format ("svg", "png" or "pdf").
+
+    The full range plot shows the min/max envelope of the series at the
+    resolution of the figure (see decimate_minmax), while the event plots
+    show the data around the event at full resolution.
+
+    The event plots are rendered in batches that each reuse a single figure,
+    and the batches can be spread over n_jobs worker processes (-1 for all
+    CPU cores).
     """
+    validate_file_format(file_format)
+    col = f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"
+    starts, ends = as_dunkelflaute_results(results).get_periods(
+        threshold, period_len, col
+    )
+
     fig = create_new_figure()
-    for start, end in results[threshold][period_len][
-        f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"
-    ]:
+    for start, end in zip(starts.view("datetime64[ns]"), ends.view("datetime64[ns]")):
         plt.axvspan(start, end, color="red", alpha=0.3)
-    plt.plot(
-        df_total.index,
-        df_total[f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"],
-        label="Total Production",
+    # The full range is drawn as a min/max envelope at the figure resolution
+    times, values = decimate_minmax(
+        df_total.index.values, df_total[col], get_pixel_width(fig)
     )
+    plt.plot(times, values, label="Total Production")
     plt.axhline(
         threshold, color="black", linestyle="--", label="Capacity factor threshold"
     )
@@ -153,58 +219,119 @@ def plot_period_ts_data(results, df_total, cap_mix, threshold, period_len):
     plt.legend()
     plt.grid()
     plt.tight_layout()
-    save_figure(fig, "period_ts_data.svg")
+    save_figure(fig, f"period_ts_data.{file_format}")
 
-    for i, (start, end) in enumerate(
-        results[threshold][period_len][f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"]
-    ):
-        fig = create_new_figure()
-        plt.axvspan(start, end, color="red", alpha=0.3)
-        plt.plot(
-            df_total.index,
-            df_total[f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"],
-            label="Total Production",
-        )
-        plt.axhline(
-            threshold, color="black", linestyle="--", label="Capacity factor threshold"
+    if len(starts) == 0:
+        return
+    batches = np.array_split(
+        np.arange(len(starts)), min(get_n_jobs(n_jobs), len(starts))
+    )
+    tasks = [
+        (
+            starts[batch],
+            ends[batch],
+            batch + 1,
+            cap_mix,
+            threshold,
+            period_len,
+            file_format,
         )
+        for batch in batches
+    ]
+    times = np.asarray(df_total.index.values, dtype="datetime64[ns]").view(np.int64)
+    map_shared(
+        _plot_period_ts_events,
+        tasks,
+        {"times": times, "values": np.asarray(df_total[col], dtype=float)},
+        n_jobs=n_jobs,
+    )
 
-        plt.text(
-            start + (end - start) / 2,
-            threshold + 0.01,
-            f"{int((end - start).total_seconds() / 3600)} hours ({(end - start).total_seconds() / 3600 / 24:2.1f} days)",
-            ha="center",
-            va="bottom",
-        )
-        plt.xlim(start - pd.Timedelta(days=3), end + pd.Timedelta(days=3))
 
-        plt.title(
-            f"Dunkelflaute Event {i+1} for Wind: {cap_mix} Solar: {1-cap_mix}, Cap. factor threshold: {threshold}, Min. Period Length: {int(period_len/24)} days"
+def _plot_period_ts_events(
+    arrays, starts, ends, numbers, cap_mix, threshold, period_len, file_format
+):
+    """
+    Render the event plots of plot_period_ts_data for a batch of events with
+    int64 nanosecond start and end times. The series is plotted once, and
+    for every event only the plotted window of the data (at full
+    resolution), the span, the label and the limits are updated.
+    """
+    times = arrays["times"].view("datetime64[ns]")
+    values = arrays["values"]
+
+    fig = create_new_figure(managed=False)
+    ax = fig.add_subplot()
+    (line,) = ax.plot(times, values, label="Total Production")
+    ax.set_ylim(ax.get_ylim())
+    ax.axhline(
+        threshold, color="black", linestyle="--", label="Capacity factor threshold"
+    )
+    span = None
+    text = ax.text(times[0], threshold + 0.01, "", ha="center", va="bottom")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Production")
+    ax.legend()
+    ax.grid()
+
+    margin = np.timedelta64(3, "D")
+    for number, start, end in zip(
+        numbers, starts.view("datetime64[ns]"), ends.view("datetime64[ns]")
+    ):
+        # Only the data around the event is drawn, one point beyond each side
+        # so that the line reaches the edges
+        lo = max(np.searchsorted(times, start - margin, "left") - 1, 0)
+        hi = np.searchsorted(times, end + margin, "right") + 1
+        line.set_data(times[lo:hi], values[lo:hi])
+
+        if span is not None:
+            span.remove()
+        span = ax.axvspan(start, end, color="red", alpha=0.3)
+        hours = (end - start) / np.timedelta64(1, "h")
+        text.set_position((start + (end - start) / 2, threshold + 0.01))
+        text.set_text(f"{int(hours)} hours ({hours / 24:2.1f} days)")
+        ax.set_xlim(start - margin, end + margin)
+        ax.set_title(
+            f"Dunkelflaute Event {number} for Wind: {cap_mix} Solar: {1-cap_mix}, Cap. factor threshold: {threshold}, Min. Period Length: {int(period_len/24)} days"
         )
-        plt.xlabel("Date")
-        plt.ylabel("Production")
-        plt.legend()
-        plt.grid()
-        plt.tight_layout()
-        save_figure(fig, f"period_ts_data_{i+1}.svg")
+        if number == numbers[0]:
+            # The layout only depends on the labels, so it is computed once
+            fig.tight_layout()
+        save_figure(fig, f"period_ts_data_{number}.{file_format}", close=False)
 
 
 def plot_period_solar_wind_performance(
-    results, df_wind_solar, cap_mix, threshold, period_len
+    results,
+    df_wind_solar,
+    cap_mix,
+    threshold,
+    period_len,
+    file_format="svg",
+    cap_dem_ratio=1.0,
 ):
     """
     Plot the performance of wind and solar production during dunkelflaute events
     for a given capacity mix, cap. factor threshold, and period length.
+    cap_dem_ratio selects the column of a sweep over a list of ratios, see
+    get_event_statistics.
     The performance is defined as the mean production during the dunkelflaute event
     divided by the mean production for the total time horizon.
     The plot shows the performance of wind and solar production
     during dunkelflaute events for different period lengths.
-    The plot is saved as a SVG file.
+    The plot is saved in the given file format ("svg", "png" or "pdf").
     """
+    validate_file_format(file_format)
 
     if not isinstance(period_len, list):
         period_len = [period_len]
 
+    statistics = get_event_statistics(
+        results,
+        df_wind_solar,
+        cap_mix,
+        threshold,
+        period_len,
+        cap_dem_ratio=cap_dem_ratio,
+    )
     fig = create_new_figure()
     # get the mean production for the total time horizon
     mean_wind_total = df_wind_solar["wind"].mean()
@@ -215,33 +342,31 @@ def plot_period_solar_wind_performance(
     size_max = 250
     size_range = (size_max - size_min) / max(period_len)
     for i, plen in enumerate(period_len):
-        lbl = f"Period length: {int(plen/24)} days"
-        for j, (start, end) in enumerate(
-            results[threshold][plen][f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"]
-        ):
-            # get the mean production for the period
-            mean_wind = df_wind_solar["wind"].loc[start:end].mean()
-            mean_solar = df_wind_solar["solar"].loc[start:end].mean()
-
-            plt.scatter(
-                mean_solar / mean_solar_total,
-                mean_wind / mean_wind_total,
-                alpha=0.15,
-                s=size_min + size_range * plen,
-                color=colors[i],
-                label=lbl,
-            )
-            # Write period id on the plot in the correspinding color
+        events = statistics[statistics["period_len"] == plen]
+        if len(events) == 0:
+            continue
+        solar_performance = events["mean_solar"].to_numpy() / mean_solar_total
+        wind_performance = events["mean_wind"].to_numpy() / mean_wind_total
+
+        plt.scatter(
+            solar_performance,
+            wind_performance,
+            alpha=0.15,
+            s=size_min + size_range * plen,
+            color=colors[i],
+            label=f"Period length: {int(plen/24)} days",
+        )
+        # Write period id on the plot in the correspinding color
+        for j, x, y in zip(events["event"], solar_performance, wind_performance):
             plt.text(
-                mean_solar / mean_solar_total,
-                mean_wind / mean_wind_total,
+                x,
+                y,
                 f"{j}",
                 ha="center",
                 va="center",
                 fontsize=8,
                 color=colors[i],
             )
-            lbl = None
 
     plt.axhline(
         1, color="black", linestyle="--", label="Wind/solar reference performance"
@@ -259,11 +384,13 @@ def plot_period_solar_wind_performance(
 
     save_figure(
         fig,
-        f"period_solar_wind_performance_{cap_mix}_{threshold}_{period_len}.svg",
+        f"period_solar_wind_performance_{cap_mix}_{threshold}_{period_len}.{file_format}",
     )
 
 
-def plot_dunkelflaute_contour(results, cap_mix, period_lengths, thresholds, no_years):
+def plot_dunkelflaute_contour(
+    results, cap_mix, period_lengths, thresholds, no_years, file_format="svg"
+):
     """
     Create a contour plot showing the frequency of dunkelflaute events.
 
@@ -271,26 +398,32 @@ def plot_dunkelflaute_contour(results, cap_mix, period_lengths, thresholds, no_y
     https://repository.tudelft.nl/file/File_9f0c989b-3d52-41cb-948f-f2723396397e
 
     Parameters:
-    - results: Dictionary containing dunkelflaute results.
+    - results: Dictionary containing dunkelflaute results, or a RunIndex
+      (the counts are then computed from the index for any grid).
     - cap_mix: Capacity mix ratio (e.g., 0.5 for 50% wind, 50% solar).
     - period_lengths: List of period lengths (in hours).
     - thresholds: List of cap. factor thresholds.
     - no_years: Number of years in the dataset.
+    - file_format: "svg", "png" or "pdf"
     """
+    validate_file_format(file_format)
 
     x = np.array([p / 24 for p in period_lengths])  # Convert period lengths to days
     y = np.array(thresholds)
-    z = np.zeros((len(y), len(x)))
 
     # Populate the z matrix with the frequency of dunkelflaute events
-    for i, threshold in enumerate(thresholds):
-        for j, period_len in enumerate(period_lengths):
-            z[i, j] = (
-                len(
-                    results[threshold][period_len][f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"]
-                )
-                / no_years
-            )
+    col = f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"
+    if isinstance(results, RunIndex):
+        counts = results.count_grid(thresholds, period_lengths, col)
+    else:
+        counts = (
+            as_dunkelflaute_results(results)
+            .filter(threshold=thresholds, period_len=period_lengths, col=col)
+            .groupby_count(["threshold", "period_len"])
+            .unstack()
+            .reindex(index=thresholds, columns=period_lengths)
+        )
+    z = counts.to_numpy(dtype=float) / no_years
 
     if False:  # Set to True to debug
         print(f"Min: {z.min()}, Max: {z.max()}")
@@ -314,7 +447,7 @@ def plot_dunkelflaute_contour(results, cap_mix, period_lengths, thresholds, no_y
         100,
         max_lvl,
     ]
-    levels = [l for l in levels if l <= max_lvl and l >= min_non_zero_lvl]
+    levels = sorted({l for l in levels if l <= max_lvl and l >= min_non_zero_lvl})
 
     cmap = plt.get_cmap("RdYlBu")
     norm = BoundaryNorm(levels, ncolors=cmap.N, clip=True)
@@ -338,11 +471,34 @@ def plot_dunkelflaute_contour(results, cap_mix, period_lengths, thresholds, no_y
 
     # Save the figure
     plt.tight_layout()
-    save_figure(fig, f"dunkelflaute_contour_{cap_mix}.svg")
+    save_figure(fig, f"dunkelflaute_contour_{cap_mix}.{file_format}")
+
+
+def get_event_counts(
+    results, thresholds, period_len, cap_mix, time_unit="month", weight="count"
+):
+    """
+    Get the number of events of a capacity mix and period length per month
+    or season (index) and threshold (columns), see
+    DunkelflauteResults.seasonality.
+    """
+    seasonality = as_dunkelflaute_results(results).seasonality(time_unit, weight)
+    counts = seasonality.xs(
+        (period_len, f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"),
+        level=["period_len", "column"],
+    )
+    labels = counts.index.unique(time_unit)
+    return counts.unstack("threshold").reindex(index=labels, columns=thresholds)
 
 
 def plot_dunkelflaute_seasonality(
-    results, thresholds, period_len, cap_mix, no_years, time_unit="month"
+    results,
+    thresholds,
+    period_len,
+    cap_mix,
+    no_years,
+    time_unit="month",
+    file_format="svg",
 ):
     """
     Plot the seasonality of Dunkelflaute events (e.g., by month or season).
@@ -353,29 +509,11 @@ def plot_dunkelflaute_seasonality(
     - period_len: List of period lengths (in hours).
     - cap_mix: Capacity mix ratio (e.g., 0.5 for 50% wind, 50% solar).
     - time_unit: "month" or "season" to group events by month or season.
+    - file_format: "svg", "png" or "pdf"
     """
-    # Initialize a DataFrame to store event counts
-    if time_unit == "month":
-        event_counts = pd.DataFrame(0, index=range(1, 13), columns=thresholds)
-    elif time_unit == "season":
-        event_counts = pd.DataFrame(
-            0, index=["Winter", "Spring", "Summer", "Autumn"], columns=thresholds
-        )
-
-    # Iterate through thresholds and period lengths
-    for threshold in thresholds:
-        # Get the start times of Dunkelflaute events
-        events = results[threshold][period_len][f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"]
-        for start, _ in events:
-            if time_unit == "month":
-                event_counts.loc[start.month, threshold] += 1
-            elif time_unit == "season":
-                # Map months to seasons: Winter (12, 1, 2), Spring (3, 4, 5), Summer (6, 7, 8), Autumn (9, 10, 11)
-                season = (
-                    start.month % 12 + 3
-                ) // 3  # Map months to seasons (1=Winter, 2=Spring, etc.)
-                season_name = ["Winter", "Spring", "Summer", "Autumn"][season - 1]
-                event_counts.loc[season_name, threshold] += 1
+    validate_file_format(file_format)
+    # Count the events by the month or season of their start
+    event_counts = get_event_counts(results, thresholds, period_len, cap_mix, time_unit)
 
     # Plot the results
     fig = create_new_figure()
@@ -394,7 +532,7 @@ def plot_dunkelflaute_seasonality(
     ax.grid(axis="y", linestyle="--", alpha=0.7)
 
     # Save the figure
-    save_figure(fig, f"dunkelflaute_seasonality_{cap_mix}_{time_unit}.svg")
+    save_figure(fig, f"dunkelflaute_seasonality_{cap_mix}_{time_unit}.{file_format}")
 
 
 def plot_dunkelflaute_seasonality_horizontal(
@@ -405,6 +543,7 @@ def plot_dunkelflaute_seasonality_horizontal(
     no_years,
     abs_rel="absolute",
     time_unit="season",
+    file_format="svg",
 ):
     """
     Plot the seasonality of Dunkelflaute events as stacked horizontal bars.
@@ -417,7 +556,9 @@ def plot_dunkelflaute_seasonality_horizontal(
     - no_years: Number of years in the dataset (for normalization).
     - abs_rel: "absolute" or "relative" to indicate the type of normalization.
     - time_unit: "season" (default) to group events by season.
+    - file_format: "svg", "png" or "pdf"
     """
+    validate_file_format(file_format)
     if time_unit != "season":
         raise ValueError("This function only supports 'season' as the time unit.")
 
@@ -429,20 +570,8 @@ def plot_dunkelflaute_seasonality_horizontal(
         "Autumn": "red",
     }
 
-    # Initialize a DataFrame to store event counts
-    event_counts = pd.DataFrame(
-        0, index=["Winter", "Spring", "Summer", "Autumn"], columns=thresholds
-    )
-
-    # Iterate through thresholds and period lengths
-    for threshold in thresholds:
-        # Get the start times of Dunkelflaute events
-        events = results[threshold][period_len][f"w{cap_mix:2.2f}_s{1-cap_mix:2.2f}"]
-        for start, _ in events:
-            # Map months to seasons: Winter (12, 1, 2), Spring (3, 4, 5), Summer (6, 7, 8), Autumn (9, 10, 11)
-            season = (start.month % 12 + 3) // 3  # Map months to seasons
-            season_name = ["Winter", "Spring", "Summer", "Autumn"][season - 1]
-            event_counts.loc[season_name, threshold] += 1
+    # Count the events by the season of their start
+    event_counts = get_event_counts(results, thresholds, period_len, cap_mix, time_unit)
 
     if abs_rel == "absolute":
         # Normalize by the number of years
@@ -501,4 +630,6 @@ def plot_dunkelflaute_seasonality_horizontal(
     ax.grid(axis="x", linestyle="--", alpha=0.7)
 
     # Save the figure
-    save_figure(fig, f"dunkelflaute_seasonality_horizontal_{cap_mix}_{abs_rel}.svg")
+    save_figure(
+        fig, f"dunkelflaute_seasonality_horizontal_{cap_mix}_{abs_rel}.{file_format}"
+    )
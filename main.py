@@ -1,13 +1,6 @@
 from dunkelflaute.core import get_total_production_df, get_dunkelflaute_results
+from dunkelflaute.instrumentation import print_progress
 from dunkelflaute.utils import create_ts_from_raw, load_df, get_number_of_years
-from dunkelflaute.visualize import (
-    plot_dunkelflaute_events,
-    plot_period_ts_data,
-    plot_period_solar_wind_performance,
-    plot_dunkelflaute_contour,
-    plot_dunkelflaute_seasonality,
-    plot_dunkelflaute_seasonality_horizontal,
-)
 
 
 def main():
@@ -77,20 +70,38 @@ def main():
         thresholds,
         period_lengths,
         split_long_periods,
+        return_store=True,
+        progress=print_progress,
+    )
+
+    # Visualize results (matplotlib is only imported here)
+    from dunkelflaute.visualize import (
+        plot_dunkelflaute_events,
+        plot_period_ts_data,
+        plot_period_solar_wind_performance,
+        plot_dunkelflaute_contour,
+        plot_dunkelflaute_seasonality,
+        plot_dunkelflaute_seasonality_horizontal,
     )
 
-    # Visualize results
     cap_mix_plot = 0.5  # if not using the full range
 
     plot_dunkelflaute_events(
         results, df_total_production, cap_mix_range, thresholds, period_lengths
     )
     # Plot the dunkelflaute events for a given capacity mix, threshold, period length of interest
-    plot_period_ts_data(results, df_total_production, cap_mix_plot, 0.35, 7 * 24)
+    plot_period_ts_data(
+        results, df_total_production, cap_mix_plot, 0.35, 7 * 24, n_jobs=-1
+    )
 
     # Plot the solar and wind performance for a given capacity mix, threshold, period length of interest
     plot_period_solar_wind_performance(
-        results, df_wind_solar, cap_mix_plot, 0.35, [7 * 24, 10 * 24, 14 * 24]
+        results,
+        df_wind_solar,
+        cap_mix_plot,
+        0.35,
+        [7 * 24, 10 * 24, 14 * 24],
+        cap_dem_ratio=cap_dem_ratio,
     )
 
     plot_dunkelflaute_contour(
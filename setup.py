@@ -8,13 +8,21 @@ setup(
     description="A module for analyzing and visualizing periods of low renewable energy production.",
     packages=find_packages(),
     install_requires=[
+        "numpy",
         "pandas",
         "matplotlib",
     ],
+    extras_require={
+        "toml": ['tomli; python_version < "3.11"'],
+        "yaml": ["pyyaml"],
+    },
+    entry_points={
+        "console_scripts": ["dunkelflaute=dunkelflaute.cli:main"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.8",
 )
@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def make_df():
+    """
+    Factory of random hourly dataframes. Every column is drawn uniformly
+    from [0, 1) and raised to power (a number or a {column: power} dict),
+    so that low values are more frequent.
+    """
+    def make(columns=('wind', 'solar'), periods=500, seed=3, power=2):
+        rng = np.random.default_rng(seed)
+        index = pd.date_range('2000-01-01', periods=periods, freq='h', name='datetime')
+        powers = power if isinstance(power, dict) else {col: power for col in columns}
+        return pd.DataFrame({col: rng.random(periods) ** powers[col] for col in columns}, index=index)
+    return make
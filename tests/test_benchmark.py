@@ -0,0 +1,31 @@
+from dunkelflaute.benchmark import compare_benchmarks, make_production_df, make_wind_solar_df, run_benchmarks
+import json
+
+def test_synthetic_data():
+    df = make_wind_solar_df(2)
+    assert list(df.columns) == ['wind', 'solar']
+    assert len(df) == 8784 + 8760
+    assert df.min().min() >= 0 and df.max().max() <= 1
+    assert make_production_df(1, 150).shape == (8784, 150)
+
+def test_run_benchmarks(tmp_path):
+    output = str(tmp_path / 'benchmark.json')
+    report = run_benchmarks([1], [2], repeat=1, plots=False, output=output)
+    with open(output) as f:
+        assert json.load(f) == report
+    names = [record['name'] for record in report['benchmarks']]
+    assert names == ['load_df', 'load_df_cached', 'get_total_production_df', 'find_fuzzy_periods', 'get_dunkelflaute_results']
+
+    slower = json.loads(json.dumps(report))
+    slower['benchmarks'][0]['min'] = report['benchmarks'][0]['min'] * 2 + 1
+    assert compare_benchmarks(report, report) == []
+    regressions = compare_benchmarks(report, slower)
+    assert [regression[0] for regression in regressions] == ['load_df']
+
+def test_run_benchmarks_with_plots():
+    report = run_benchmarks([1], [1], repeat=1, plots=True)
+    names = [record['name'] for record in report['benchmarks']]
+    assert names[5:] == [
+        'plot_dunkelflaute_events', 'plot_period_ts_data', 'plot_period_solar_wind_performance',
+        'plot_dunkelflaute_contour', 'plot_dunkelflaute_seasonality', 'plot_dunkelflaute_seasonality_horizontal'
+    ]
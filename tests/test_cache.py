@@ -0,0 +1,40 @@
+from dunkelflaute.cache import ResultCache
+from dunkelflaute.core import get_dunkelflaute_results
+import numpy as np
+
+def test_cached_results(tmp_path, make_df):
+    df = make_df(['a', 'b'], 300, seed=5)
+    cache = ResultCache(str(tmp_path / 'cache.sqlite'))
+    expected = get_dunkelflaute_results(df, [0.1, 0.3, 0.5], [1, 3], True)
+    assert get_dunkelflaute_results(df, [0.1, 0.3], [1, 3], True, cache=cache) == {t: expected[t] for t in [0.1, 0.3]}
+    assert len(cache) == 2 * 2 * 2
+    # Only the cells of the new threshold are added
+    assert get_dunkelflaute_results(df, [0.1, 0.3, 0.5], [1, 3], True, cache=cache) == expected
+    assert len(cache) == 2 * 3 * 2
+    assert get_dunkelflaute_results(df, [0.1, 0.3, 0.5], [1, 3], True, cache=cache) == expected
+    # Other options and data use other cells
+    get_dunkelflaute_results(df, [0.1], [1], False, cache=cache)
+    get_dunkelflaute_results(df * 0.5, [0.1], [1], True, cache=cache)
+    assert len(cache) == 2 * 3 * 2 + 2 + 2
+
+def test_cache_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.sqlite'), max_size=3 * 16)
+    for i in range(5):
+        cache.put_many({f'key{i}': (np.array([i]), np.array([i + 1]))})
+    assert len(cache) == 3
+    assert list(cache.get_many(['key0', 'key4'])) == ['key4']
+
+def test_cache_path_is_closed(tmp_path, monkeypatch, make_df):
+    df = make_df(['a', 'b'], 300, seed=5)
+    closed = []
+    close = ResultCache.close
+    monkeypatch.setattr(ResultCache, 'close', lambda self: closed.append(self) or close(self))
+    path = str(tmp_path / 'cache.sqlite')
+    result = get_dunkelflaute_results(df, [0.1], [1, 3], cache=path)
+    assert len(closed) == 1
+    # A cache of the caller is left open
+    with ResultCache(path) as cache:
+        assert get_dunkelflaute_results(df, [0.1], [1, 3], cache=cache) == result
+        assert len(closed) == 1
+        assert len(cache) == 2 * 2
+    assert closed[-1] is cache
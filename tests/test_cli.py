@@ -0,0 +1,93 @@
+from dunkelflaute.cli import load_config, main
+from dunkelflaute.core import get_dunkelflaute_results, get_total_production_df
+from dunkelflaute.results import DunkelflauteResults
+import os
+import pytest
+import subprocess
+import sys
+
+CONFIG = '''
+data = "wind_solar.csv"
+cap_mix = [0.25, 0.5]
+cap_dem_ratio = 1.2
+thresholds = [0.1, 0.3]
+period_lengths = [2, 6]
+split_long_periods = true
+
+[plots]
+render = ["events", "ts"]
+threshold = 0.1
+period_len = 6
+'''
+
+def write_data(tmp_path, make_df):
+    df = make_df(seed=6)
+    df.to_csv(tmp_path / 'wind_solar.csv')
+    return df
+
+def test_load_config(tmp_path, make_df):
+    write_data(tmp_path, make_df)
+    (tmp_path / 'sweep.toml').write_text(CONFIG)
+    config = load_config(str(tmp_path / 'sweep.toml'))
+    assert config['data'] == str(tmp_path / 'wind_solar.csv')
+    assert config['mode'] == 'max' and config['output'] is None
+    assert config['plots']['render'] == ['events', 'ts']
+    assert config['plots']['cap_mix'] is None
+
+    (tmp_path / 'bad.toml').write_text(CONFIG.replace('thresholds', 'threshold'))
+    with pytest.raises(ValueError):
+        load_config(str(tmp_path / 'bad.toml'))
+    with pytest.raises(ValueError):
+        load_config(str(tmp_path / 'wind_solar.csv'))
+
+def test_load_yaml_config(tmp_path):
+    yaml = pytest.importorskip('yaml')
+    (tmp_path / 'sweep.yaml').write_text(yaml.safe_dump({
+        'data': 'wind_solar.csv', 'cap_mix': [0.5], 'thresholds': [0.1], 'period_lengths': [2]
+    }))
+    config = load_config(str(tmp_path / 'sweep.yaml'))
+    assert config['thresholds'] == [0.1] and config['cap_dem_ratio'] == 1.0
+
+def test_main_headless(tmp_path, make_df):
+    df = write_data(tmp_path, make_df)
+    (tmp_path / 'sweep.toml').write_text(CONFIG)
+    output = tmp_path / 'out' / 'results.npz'
+    code = (
+        'import sys; from dunkelflaute.cli import main; '
+        f'main([{str(tmp_path / "sweep.toml")!r}, "-o", {str(output)!r}, "--no-plots", "-q"]); '
+        'assert "matplotlib" not in sys.modules'
+    )
+    env = {**os.environ, 'PYTHONPATH': os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=tmp_path, env=env)
+
+    expected = get_dunkelflaute_results(
+        get_total_production_df(df, [0.25, 0.5], 1.2), [0.1, 0.3], [2, 6], True
+    )
+    assert DunkelflauteResults.load(str(output)) == expected
+
+def test_main_plots(tmp_path, monkeypatch, make_df):
+    import matplotlib
+    matplotlib.use('Agg')
+    write_data(tmp_path, make_df)
+    (tmp_path / 'sweep.toml').write_text(CONFIG)
+    monkeypatch.chdir(tmp_path)
+    assert main(['sweep.toml', '--plots', 'events', 'ts', '--format', 'png', '-q']) == 0
+    assert (tmp_path / 'sweep.npz').exists()
+    files = {path.name for path in (tmp_path / 'plots').iterdir()}
+    assert {'dunkelflaute_events_0.25.png', 'period_ts_data.png'} <= files
+
+def test_run_sweep_closes_cache_on_error(tmp_path, monkeypatch, make_df):
+    from dunkelflaute import cli
+    from dunkelflaute.cache import ResultCache
+    write_data(tmp_path, make_df)
+    (tmp_path / 'sweep.toml').write_text(CONFIG)
+    config = load_config(str(tmp_path / 'sweep.toml'))
+    closed = []
+    close = ResultCache.close
+    monkeypatch.setattr(ResultCache, 'close', lambda self: closed.append(self) or close(self))
+    def fail(*args, **kwargs):
+        raise RuntimeError('interrupted')
+    monkeypatch.setattr(cli, 'get_dunkelflaute_results', fail)
+    with pytest.raises(RuntimeError):
+        cli.run_sweep(config, cache_dir=str(tmp_path), plots=[])
+    assert len(closed) == 1
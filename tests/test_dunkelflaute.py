@@ -1,4 +1,5 @@
-from dunkelflaute.core import get_total_production_df, find_fuzzy_periods, get_dunkelflaute_results
+from dunkelflaute.core import get_total_production_df, get_total_production_matrix, find_fuzzy_periods, get_dunkelflaute_results, find_runs, find_mean_runs, get_event_statistics, merge_runs, split_periods, split_period_arrays
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -14,6 +15,20 @@ def test_get_total_production_df():
     })
     pd.testing.assert_frame_equal(result, expected)
 
+def test_get_total_production_matrix():
+    df = pd.DataFrame({
+        'wind': [0.1, 0.2, 0.3],
+        'solar': [0.4, 0.5, 0.6]
+    })
+    values, columns = get_total_production_matrix(df, [0.25, 0.5], [1.0, 2.0])
+    assert columns == ['w0.25_s0.75_r1.00', 'w0.50_s0.50_r1.00', 'w0.25_s0.75_r2.00', 'w0.50_s0.50_r2.00']
+    assert values.shape == (4, 3)
+    for i, ratio in enumerate([1.0, 2.0]):
+        expected = get_total_production_df(df, [0.25, 0.5], ratio)
+        np.testing.assert_array_equal(values[2 * i:2 * i + 2], expected.to_numpy().T)
+    values, _ = get_total_production_matrix(df, [0.5], dtype=np.float32)
+    assert values.dtype == np.float32
+
 def test_find_fuzzy_periods():
     df = pd.DataFrame({
         'wind': [0.1, 0.0, 0.0, 0.1, 0.2],
@@ -39,4 +54,146 @@ def test_get_dunkelflaute_results():
     assert isinstance(result, dict)
     assert len(result) == len(thresholds)  # Check number of thresholds
 
-# Additional tests can be added for edge cases and other functionalities.
\ No newline at end of file
+def test_get_dunkelflaute_results_matches_find_fuzzy_periods():
+    rng = np.random.default_rng(0)
+    index = pd.date_range('2000-01-01', periods=500, freq='h', name='datetime')
+    df = pd.DataFrame({
+        'wind': rng.random(500) ** 3,
+        'solar': rng.random(500) ** 2
+    }, index=index)
+    thresholds = [0.05, 0.2, 0.5]
+    period_lengths = [1, 2, 3, 6]
+    for split_long_periods in [False, True]:
+        result = get_dunkelflaute_results(df, thresholds, period_lengths, split_long_periods)
+        for threshold in thresholds:
+            for period_len in period_lengths:
+                expected = find_fuzzy_periods(df.copy(), threshold, period_len, split_long_periods=split_long_periods)
+                assert result[threshold][period_len] == expected
+
+def test_find_runs():
+    values = np.array([0.0, 0.2, 0.1, 0.05, np.nan, 0.0, 0.3, 0.1])
+    starts, ends = find_runs(values, 0.1)
+    np.testing.assert_array_equal(starts, [0, 2, 5, 7])
+    np.testing.assert_array_equal(ends, [0, 3, 5, 7])
+
+def test_merge_runs():
+    starts, ends = np.array([0, 5, 9, 20]), np.array([2, 6, 12, 21])
+    merged = merge_runs(starts, ends, 2, 'gap')
+    np.testing.assert_array_equal(merged[0], [0, 20])
+    np.testing.assert_array_equal(merged[1], [12, 21])
+    merged = merge_runs(starts, ends, 3, 'total')
+    np.testing.assert_array_equal(merged[0], [0, 9, 20])
+    np.testing.assert_array_equal(merged[1], [6, 12, 21])
+    # Runs of different thresholds are never merged
+    merged = merge_runs(starts, ends, 10, 'gap', run_ids=np.array([0, 0, 1, 1]))
+    np.testing.assert_array_equal(merged[0], [0, 9])
+    np.testing.assert_array_equal(merged[2], [0, 1])
+
+def test_find_fuzzy_periods_tolerance():
+    index = pd.date_range('2000-01-01', periods=10, freq='h', name='datetime')
+    df = pd.DataFrame({'wind': [0.0, 0.0, 0.5, 0.0, 0.0, 0.5, 0.5, 0.0, 0.0, 0.0]}, index=index)
+    assert find_fuzzy_periods(df, 0.1, 4, split_long_periods=False) == {'wind': []}
+    assert find_fuzzy_periods(df, 0.1, 4, 1, False) == {'wind': [(index[0], index[4])]}
+    assert find_fuzzy_periods(df, 0.1, 4, 2, False) == {'wind': [(index[0], index[9])]}
+    assert find_fuzzy_periods(df, 0.1, 4, 2, False, 'total') == {'wind': [(index[0], index[4])]}
+    result = get_dunkelflaute_results(df, [0.1], [4], tol=2, tol_mode='total')
+    assert result[0.1][4]['wind'] == [(index[0], index[4])]
+    with pytest.raises(ValueError, match='tol_mode'):
+        find_fuzzy_periods(df, 0.1, 4, tol=2, tol_mode='window')
+
+def test_find_mean_runs():
+    values = np.array([0.0, 0.2, 0.0, 0.5, 0.0, 0.0, np.nan, 0.0, 0.0])
+    starts, ends, threshold_ids, period_ids = find_mean_runs(values, [0.1, 0.2], [1, 2])
+    runs = sorted(zip(period_ids.tolist(), threshold_ids.tolist(), starts.tolist(), ends.tolist()))
+    assert runs == [
+        (0, 0, 0, 2), (0, 0, 4, 5), (0, 0, 7, 8),
+        (0, 1, 0, 2), (0, 1, 4, 5), (0, 1, 7, 8),
+        (1, 0, 0, 2),
+        (1, 1, 0, 5)
+    ]
+    # With every value below the threshold, the runs of find_runs are found
+    starts, ends, _, _ = find_mean_runs(values, [0.2], [0])
+    np.testing.assert_array_equal(starts, find_runs(values, 0.2)[0])
+    np.testing.assert_array_equal(ends, find_runs(values, 0.2)[1])
+
+def test_find_mean_runs_merges_touching_windows():
+    # The windows (0, 2) and (3, 5) qualify, (1, 3) and (2, 4) do not
+    values = np.array([0.0, 0.0, 0.24, 0.24, 0.0, 0.0])
+    starts, ends, _, _ = find_mean_runs(values, [0.1], [2])
+    assert list(zip(starts.tolist(), ends.tolist())) == [(0, 5)]
+
+def test_find_fuzzy_periods_mean_mode():
+    index = pd.date_range('2000-01-01', periods=8, freq='h', name='datetime')
+    df = pd.DataFrame({'wind': [0.0, 0.0, 0.3, 0.0, 0.0, 0.9, 0.9, 0.0]}, index=index)
+    assert find_fuzzy_periods(df, 0.1, 4, split_long_periods=False) == {'wind': []}
+    result = find_fuzzy_periods(df, 0.1, 4, split_long_periods=False, mode='mean')
+    assert result == {'wind': [(index[0], index[4])]}
+    assert get_dunkelflaute_results(df, [0.1], [4], mode='mean')[0.1][4] == result
+    with pytest.raises(ValueError, match='tol can only be used'):
+        find_fuzzy_periods(df, 0.1, 4, tol=1, mode='mean')
+
+def test_split_periods():
+    t = pd.Timestamp('2000-01-01', tz='Europe/Berlin')
+    h = pd.Timedelta(hours=1)
+    periods = [(t, t + 3 * h), (t + 10 * h, t + 17 * h), (t + 20 * h, t + 22 * h)]
+    assert split_periods(periods, 3) == [
+        (t, t + 3 * h),
+        (t + 10 * h, t + 13 * h), (t + 13 * h, t + 16 * h),
+        (t + 20 * h, t + 22 * h)
+    ]
+    assert split_periods([], 3) == []
+    hour = 3_600_000_000_000
+    starts, ends = split_period_arrays(np.array([0, 10]) * hour, np.array([7, 12]) * hour, 2)
+    np.testing.assert_array_equal(starts, np.array([0, 2, 4, 10]) * hour)
+    np.testing.assert_array_equal(ends, np.array([2, 4, 6, 12]) * hour)
+
+def test_find_fuzzy_periods_does_not_modify_input():
+    index = pd.date_range('2000-01-01', periods=5, freq='h', name='datetime')
+    df = pd.DataFrame({'wind': [0.1, 0.0, 0.0, 0.1, 0.2]}, index=index)
+    df_before = df.copy()
+    result = find_fuzzy_periods(df, 0.1, 3)
+    assert result == {'wind': [(index[0], index[3])]}
+    pd.testing.assert_frame_equal(df, df_before)
+
+@pytest.mark.parametrize('executor', ['process', 'thread'])
+def test_get_dunkelflaute_results_parallel(executor):
+    rng = np.random.default_rng(2)
+    index = pd.date_range('2000-01-01', periods=300, freq='h', name='datetime')
+    df = pd.DataFrame(rng.random((300, 3)) ** 2, index=index, columns=['a', 'b', 'c'])
+    thresholds = [0.05, 0.1, 0.3, 0.5]
+    expected = get_dunkelflaute_results(df, thresholds, [1, 4], True)
+    result = get_dunkelflaute_results(df, thresholds, [1, 4], True, n_jobs=2, executor=executor)
+    assert result == expected
+
+@pytest.mark.parametrize('cap_dem_ratio, col', [
+    (1.0, 'w0.50_s0.50'), (1.2, 'w0.50_s0.50'), ([1.2], 'w0.50_s0.50_r1.20')
+])
+def test_get_event_statistics(cap_dem_ratio, col):
+    rng = np.random.default_rng(5)
+    index = pd.date_range('2000-01-01', periods=600, freq='h', name='datetime')
+    df = pd.DataFrame({'wind': rng.random(600) ** 2, 'solar': rng.random(600) ** 2}, index=index)
+    df.iloc[10, 0] = np.nan
+    df_total = get_total_production_df(df, [0.5], cap_dem_ratio)
+    ratio = cap_dem_ratio[0] if isinstance(cap_dem_ratio, list) else cap_dem_ratio
+    results = get_dunkelflaute_results(df_total, [0.4], [2, 5], True)
+    statistics = get_event_statistics(results, df, 0.5, 0.4, [2, 5], cap_dem_ratio=ratio)
+    assert len(statistics) == len(results[0.4][2][col]) + len(results[0.4][5][col])
+    for row in statistics.itertuples():
+        start, end = results[0.4][row.period_len][col][row.event]
+        assert (row.start, row.end) == (start, end)
+        total = df_total[col].loc[start:end]
+        assert row.duration == (end - start).total_seconds() / 3600
+        assert np.isclose(row.mean_wind, df['wind'].loc[start:end].mean())
+        assert np.isclose(row.mean_solar, df['solar'].loc[start:end].mean())
+        assert np.isclose(row.mean, total.mean())
+        assert row.min == total.min()
+        assert np.isclose(row.energy_deficit, (0.4 - total).clip(lower=0).sum())
+    results = get_dunkelflaute_results(df_total, [0.4], [500], return_store=True)
+    assert get_event_statistics(results, df, 0.5, 0.4, 500, cap_dem_ratio=ratio).empty
+    with pytest.raises(TypeError):
+        get_event_statistics(results, df, 0.5, 0.4, 500)
+    for invalid in [0, -1.2, np.nan, '1.2']:
+        with pytest.raises(ValueError, match='cap_dem_ratio'):
+            get_event_statistics(results, df, 0.5, 0.4, 500, cap_dem_ratio=invalid)
+
+# Additional tests can be added for edge cases and other functionalities.
@@ -0,0 +1,30 @@
+import dunkelflaute
+import os
+import subprocess
+import sys
+
+def run_python(code):
+    env = {**os.environ, 'PYTHONPATH': os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}
+    return subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout.split()
+
+def test_lazy_package():
+    loaded = run_python(
+        'import sys, dunkelflaute; print("pandas" in sys.modules); '
+        'dunkelflaute.get_dunkelflaute_results; print("matplotlib" in sys.modules); '
+        'dunkelflaute.visualize; print("matplotlib" in sys.modules)'
+    )
+    assert loaded == ['False', 'False', 'True']
+
+def test_compute_modules_without_matplotlib():
+    loaded = run_python(
+        'import sys; import dunkelflaute.core, dunkelflaute.utils, dunkelflaute.cli; '
+        'print(any(name.startswith(("matplotlib", "sqlite3", "cProfile", "multiprocessing")) for name in sys.modules))'
+    )
+    assert loaded == ['False']
+
+def test_api():
+    from dunkelflaute.core import get_dunkelflaute_results
+    assert dunkelflaute.get_dunkelflaute_results is get_dunkelflaute_results
+    assert set(dunkelflaute.__all__) <= set(dir(dunkelflaute))
+    for name in dunkelflaute.__all__:
+        assert getattr(dunkelflaute, name) is not None
@@ -0,0 +1,58 @@
+from dunkelflaute.core import find_fuzzy_periods, get_dunkelflaute_results
+from dunkelflaute.instrumentation import Instrumentation
+import pytest
+
+def test_find_fuzzy_periods_instrumentation(capsys, make_df):
+    df = make_df(['a', 'b'])
+    instrumentation = Instrumentation()
+    result = find_fuzzy_periods(df, 0.3, 2, instrumentation=instrumentation)
+    assert result == find_fuzzy_periods(df, 0.3, 2)
+    assert capsys.readouterr().out == ''
+
+    summary = instrumentation.summary()
+    for name in ['grouping', 'aggregation', 'filtering', 'splitting', 'conversion', 'total']:
+        assert summary['timers'][name] >= 0
+    assert summary['counters']['rows'] == 1000
+    assert summary['counters']['events'] == sum(len(periods) for periods in result.values())
+    assert summary['counters']['runs'] >= summary['counters']['events'] - 1000
+    assert summary['rows_per_second'] > 0
+    assert summary['peak_memory'] is None
+
+@pytest.mark.parametrize('n_jobs', [None, 2])
+def test_get_dunkelflaute_results_instrumentation(capsys, n_jobs, make_df):
+    df = make_df(['a', 'b'])
+    calls = []
+    instrumentation = Instrumentation()
+    result = get_dunkelflaute_results(
+        df, [0.1, 0.3], [1, 3], n_jobs=n_jobs, executor='thread',
+        progress=lambda done, total: calls.append((done, total)),
+        instrumentation=instrumentation
+    )
+    assert capsys.readouterr().out == ''
+    assert calls[-1] == (8, 8)
+    assert [done for done, _ in calls] == sorted(done for done, _ in calls)
+
+    counters = instrumentation.summary()['counters']
+    assert counters['cells'] == 8
+    assert counters['events'] == sum(
+        len(periods) for cells in result.values() for cols in cells.values() for periods in cols.values()
+    )
+    assert instrumentation.timers['grouping'] > 0
+
+def test_progress_with_cache(tmp_path, make_df):
+    df = make_df(['a', 'b'])
+    cache = tmp_path / 'cache.sqlite'
+    get_dunkelflaute_results(df, [0.1], [1, 3], cache=cache)
+    calls = []
+    get_dunkelflaute_results(df, [0.1, 0.3], [1, 3], cache=cache, progress=lambda *args: calls.append(args))
+    assert calls[0] == (4, 8)
+    assert calls[-1] == (8, 8)
+
+def test_profile_and_memory(make_df):
+    df = make_df(['a', 'b'])
+    instrumentation = Instrumentation(profile=True, trace_memory=True)
+    get_dunkelflaute_results(df, [0.1, 0.3], [1, 3], instrumentation=instrumentation)
+    assert 'find_runs_multi' in instrumentation.get_profile_stats()
+    assert instrumentation.peak_memory > 0
+    with pytest.raises(ValueError):
+        Instrumentation().get_profile_stats()
@@ -0,0 +1,89 @@
+from dunkelflaute.core import get_dunkelflaute_results, get_total_production_df
+from dunkelflaute.portfolio import (
+    METRICS, find_min_cap_dem_ratio, get_pareto_front, get_portfolio_metrics, optimize_portfolio
+)
+import numpy as np
+import pandas as pd
+import pytest
+
+def make_portfolio_df(make_df):
+    df = make_df(['wind', 'solar', 'offshore'], 24 * 730, seed=6, power={'wind': 2, 'solar': 1, 'offshore': 1})
+    # Solar only produces during the day
+    hours = np.arange(len(df)) % 24
+    df['solar'] *= np.clip(np.sin((hours - 6) / 12 * np.pi), 0, None)
+    return df
+
+def test_get_portfolio_metrics(make_df):
+    df = make_portfolio_df(make_df)
+    caps = [0.0, 0.3, 0.7]
+    metrics = get_portfolio_metrics(df, [[cap, 1 - cap] for cap in caps], 1.5, 0.2, 6)
+    assert list(metrics.columns) == ['wind', 'solar', 'cap_dem_ratio'] + METRICS
+    results = get_dunkelflaute_results(get_total_production_df(df, caps, 1.5), [0.2], [0, 6])
+    for i, periods in enumerate(results[0.2][6].values()):
+        assert metrics['events_per_year'][i] == len(periods) / 2
+        hours = sum((end - start) / pd.Timedelta(hours=1) for start, end in periods)
+        assert metrics['hours_per_year'][i] == pytest.approx(hours / 2)
+    for i, runs in enumerate(results[0.2][0].values()):
+        assert metrics['max_duration'][i] == max((end - start) / pd.Timedelta(hours=1) for start, end in runs)
+
+def test_get_portfolio_metrics_technologies(make_df):
+    df = make_portfolio_df(make_df)
+    technologies = ['wind', 'solar', 'offshore']
+    weights = [[0.2, 0.3, 0.5], [0.0, 0.0, 1.0]]
+    metrics = get_portfolio_metrics(df, weights, [1.0, 2.0], 0.3, 3, technologies=technologies, n_jobs=2, executor='thread')
+    for i, (weight, ratio) in enumerate(zip(weights, [1.0, 2.0])):
+        production = pd.DataFrame({'mix': ratio * (df[technologies] * weight).sum(axis=1)})
+        periods = get_dunkelflaute_results(production, [0.3], [3])[0.3][3]['mix']
+        assert metrics['events_per_year'][i] == len(periods) / 2
+    with pytest.raises(ValueError):
+        get_portfolio_metrics(df, [[0.5, 0.6]], 1.0, 0.3, 3)
+    with pytest.raises(ValueError):
+        get_portfolio_metrics(df, [[0.5, 0.5]], 1.0, 0.3, 3, technologies=['wind', 'hydro'])
+
+def test_get_pareto_front():
+    candidates = pd.DataFrame({'a': [1, 2, 3, 2, 1], 'b': [3, 2, 1, 3, 3]})
+    front = get_pareto_front(candidates, ['a', 'b'])
+    assert list(front.index) == [0, 1, 2, 4]
+    assert list(get_pareto_front(candidates, ['a']).index) == [0, 4]
+
+def test_optimize_portfolio(make_df):
+    df = make_portfolio_df(make_df)
+    result = optimize_portfolio(df, 0.2, 6, steps=3, levels=3)
+    assert np.allclose(result[['wind', 'solar']].sum(axis=1), 1)
+    assert not result.duplicated(['wind', 'solar']).any()
+    # Refinement never gets worse than the coarse grid and evaluates less than the fine grid
+    assert result['events_per_year'].iloc[0] <= result[result.level == 0]['events_per_year'].min()
+    assert len(result) < 17
+    assert result.pareto.iloc[0]
+    assert (result[result.pareto]['events_per_year'] == result['events_per_year'].min()).all()
+
+def test_optimize_portfolio_ratio_range(make_df):
+    df = make_portfolio_df(make_df)
+    technologies = ['wind', 'solar', 'offshore']
+    result = optimize_portfolio(
+        df, 0.2, 6, metric=['max_duration'], technologies=technologies, cap_dem_ratio=(1.0, 2.0), levels=2
+    )
+    assert result.cap_dem_ratio.between(1.0, 2.0).all()
+    assert set(result.level) == {0, 1, 2}
+    front = result[result.pareto]
+    assert front.equals(get_pareto_front(result, ['max_duration', 'cap_dem_ratio']))
+    # Metrics of the candidates are the ones of get_portfolio_metrics
+    check = get_portfolio_metrics(df, front[technologies], front.cap_dem_ratio, 0.2, 6, technologies=technologies)
+    assert np.array_equal(check['max_duration'], front['max_duration'])
+    with pytest.raises(ValueError):
+        optimize_portfolio(df, 0.2, 6, metric='events')
+    with pytest.raises(ValueError):
+        optimize_portfolio(df, 0.2, 6, cap_dem_ratio=(2.0, 1.0))
+
+def test_find_min_cap_dem_ratio(make_df):
+    df = make_portfolio_df(make_df)
+    weights = [[1.0, 0.0], [0.5, 0.5], [0.0, 1.0]]
+    result = find_min_cap_dem_ratio(df, weights, 0.2, 0, target=6, ratio_range=(0.5, 8.0), rtol=1e-3)
+    # Solar alone is zero at night, so no ratio keeps the runs short
+    assert np.isnan(result.cap_dem_ratio[2])
+    ratios = result.cap_dem_ratio[:2].to_numpy()
+    assert (result.max_duration[:2] <= 6).all()
+    below = get_portfolio_metrics(df, weights[:2], ratios * (1 - 2e-3), 0.2, 0)
+    assert (below.max_duration > 6).all()
+    with pytest.raises(ValueError):
+        find_min_cap_dem_ratio(df, weights, 0.2, 0, target=2, metric='events_per_year')
@@ -0,0 +1,68 @@
+from dunkelflaute.regions import (
+    concat_regions, find_simultaneous_periods, get_regional_production_df, get_simultaneous_results
+)
+import numpy as np
+import pandas as pd
+import pytest
+
+def make_regions_df(make_df):
+    frames = {region: make_df(periods=1000, seed=seed, power=1) for seed, region in enumerate(['A', 'B', 'C'])}
+    frames['D'] = make_df(['wind'], 1000, seed=3, power=1)
+    frames['D'].iloc[10:20] = np.nan
+    return concat_regions(frames)
+
+def brute_force_periods(values, index, threshold, k, period_len):
+    above_k = (values <= threshold).sum(axis=1) >= k
+    periods = []
+    start = None
+    for i, flag in enumerate(np.append(above_k, False)):
+        if flag and start is None:
+            start = i
+        elif not flag and start is not None:
+            if index[i - 1] - index[start] >= pd.Timedelta(hours=period_len):
+                periods.append((index[start], index[i - 1]))
+            start = None
+    return periods
+
+def test_get_regional_production_df(make_df):
+    df = make_regions_df(make_df)
+    production = get_regional_production_df(df, {'wind': 0.6, 'solar': 0.4}, cap_dem_ratio=2.0)
+    assert list(production.columns) == ['A', 'B', 'C', 'D']
+    expected = 2.0 * (0.6 * df[('B', 'wind')] + 0.4 * df[('B', 'solar')])
+    assert np.allclose(production['B'], expected)
+    # Region D has no solar, so wind gets the whole share
+    assert np.allclose(production['D'], 2.0 * df[('D', 'wind')], equal_nan=True)
+    assert production['D'].iloc[10:20].isna().all()
+    with pytest.raises(ValueError):
+        get_regional_production_df(df, {'offshore': 1.0})
+    with pytest.raises(ValueError):
+        get_regional_production_df(df, {'wind': 0.0, 'solar': 1.0})
+    with pytest.raises(ValueError):
+        get_regional_production_df(df[[('A', 'wind')]].droplevel(0, axis=1), {'wind': 1.0})
+
+def test_get_simultaneous_results(make_df):
+    production = get_regional_production_df(make_regions_df(make_df), {'wind': 0.5, 'solar': 0.5})
+    thresholds = [0.4, 0.5]
+    ks = [1, 2, 4]
+    period_lengths = [1, 4]
+    result = get_simultaneous_results(production, thresholds, ks, period_lengths)
+    for threshold in thresholds:
+        for period_len in period_lengths:
+            assert list(result[threshold][period_len]) == ['1_of_4', '2_of_4', '4_of_4']
+            for k in ks:
+                expected = brute_force_periods(production.values, production.index, threshold, k, period_len)
+                assert result[threshold][period_len][f'{k}_of_4'] == expected
+    store = get_simultaneous_results(production, thresholds, ks, period_lengths, return_store=True)
+    assert store.to_dict() == result
+
+def test_find_simultaneous_periods(make_df):
+    production = get_regional_production_df(make_regions_df(make_df), {'wind': 0.5, 'solar': 0.5})
+    periods = find_simultaneous_periods(production, 0.5, 2, 4, split_long_periods=False)
+    assert periods == brute_force_periods(production.values, production.index, 0.5, 2, 4)
+    split = find_simultaneous_periods(production, 0.5, 2, 4)
+    assert all(end - start == pd.Timedelta(hours=4) for start, end in split)
+    merged = find_simultaneous_periods(production, 0.5, 2, 4, split_long_periods=False, tol=1)
+    assert all(any(s <= start and end <= e for s, e in merged) for start, end in periods)
+    for k in [0, 5, 1.5]:
+        with pytest.raises(ValueError):
+            find_simultaneous_periods(production, 0.5, k, 4)
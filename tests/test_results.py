@@ -0,0 +1,69 @@
+from dunkelflaute.core import get_dunkelflaute_results
+from dunkelflaute.results import DunkelflauteResults
+import numpy as np
+import pandas as pd
+import pytest
+
+def test_store_matches_dict(make_df):
+    df = make_df(['w0.50_s0.50', 'w0.75_s0.25'], seed=1)
+    store = get_dunkelflaute_results(df, [0.1, 0.3], [1, 3], return_store=True)
+    result = get_dunkelflaute_results(df, [0.1, 0.3], [1, 3])
+    assert isinstance(store, DunkelflauteResults)
+    assert store == result
+    assert store.to_dict() == result
+    assert DunkelflauteResults.from_dict(result).to_dict() == result
+    assert store[0.3][3]['w0.75_s0.25'] == result[0.3][3]['w0.75_s0.25']
+
+def test_store_accessors(make_df):
+    df = make_df(['w0.50_s0.50', 'w0.75_s0.25'], seed=1)
+    store = get_dunkelflaute_results(df, [0.1, 0.3], [1, 3], return_store=True)
+    result = store.to_dict()
+    for threshold in [0.1, 0.3]:
+        for period_len in [1, 3]:
+            for col in df.columns:
+                assert store.count(threshold, period_len, col) == len(result[threshold][period_len][col])
+    by_threshold = store.groupby_count('threshold')
+    assert by_threshold[0.3] == sum(len(periods) for by_col in result[0.3].values() for periods in by_col.values())
+    subset = store.filter(threshold=0.3, col='w0.50_s0.50')
+    assert subset.thresholds == [0.3]
+    assert subset.columns == ['w0.50_s0.50']
+    assert subset[0.3][3]['w0.50_s0.50'] == result[0.3][3]['w0.50_s0.50']
+    assert store.n_events == len(store.to_frame())
+    np.testing.assert_array_equal(store.duration, store.end - store.start)
+
+def test_store_save_load(tmp_path, make_df):
+    store = get_dunkelflaute_results(make_df(['w0.50_s0.50', 'w0.75_s0.25'], seed=1), [0.1, 0.3], [1, 3], return_store=True)
+    store.save(str(tmp_path / 'results.npz'))
+    loaded = DunkelflauteResults.load(str(tmp_path / 'results.npz'))
+    assert loaded.to_dict() == store.to_dict()
+    assert loaded.thresholds == store.thresholds
+
+def test_seasonality():
+    index = pd.date_range('2000-01-25', '2000-04-10', freq='h', name='datetime')
+    values = np.full(len(index), 0.5)
+    values[100:900] = 0.0
+    values[1500:1520] = 0.0
+    df = pd.DataFrame({'a': values, 'b': values[::-1]}, index=index)
+    store = get_dunkelflaute_results(df, [0.1, 0.3], [10, 100], return_store=True)
+
+    by_month = store.seasonality('month')
+    assert by_month.index.names == ['threshold', 'period_len', 'column', 'month']
+    assert by_month.sum() == store.n_events
+    for threshold in [0.1, 0.3]:
+        for period_len in [10, 100]:
+            for col in ['a', 'b']:
+                months = [start.month for start, _ in store[threshold][period_len][col]]
+                cell = by_month[threshold, period_len, col]
+                assert list(cell) == [months.count(month) for month in range(1, 13)]
+
+    by_season = store.seasonality('season')
+    assert list(by_season[0.1, 10, 'a'].index) == ['Winter', 'Spring', 'Summer', 'Autumn']
+    assert list(by_season[0.1, 10, 'a']) == [1, 1, 0, 0]
+    assert list(store.seasonality('year')[0.1, 10, 'a'].index) == [2000]
+
+    # The first period lasts from 2000-01-29 04:00 to 2000-03-02 11:00
+    hours = store.seasonality('month', 'hours')[0.1, 100, 'a']
+    assert list(hours[[1, 2, 3]]) == [68, 29 * 24, 35]
+    assert hours.sum() == 68 + 29 * 24 + 35
+    with pytest.raises(ValueError):
+        store.seasonality('week')
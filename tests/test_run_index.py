@@ -0,0 +1,26 @@
+from dunkelflaute.core import get_dunkelflaute_results
+from dunkelflaute.run_index import RunIndex, get_run_tree
+import numpy as np
+
+def test_run_tree():
+    times = np.arange(5) * 3_600_000_000_000
+    births, deaths, durations = get_run_tree(np.array([0.1, 0.3, 0.1, 0.1, np.nan]), times)
+    runs = sorted(zip(births.tolist(), deaths.tolist(), (durations // 3_600_000_000_000).tolist()))
+    assert runs == [(0.1, 0.3, 0), (0.1, 0.3, 1), (0.3, np.inf, 3)]
+
+def test_run_index_matches_detector(make_df):
+    # Rounded values give ties between runs, NaN values split runs
+    df = make_df(['w0.50_s0.50', 'w0.75_s0.25']).round(2)
+    df.iloc[100:103, 0] = np.nan
+    thresholds = [0.0, 0.05, 0.1, 0.25, 0.5, 1.0]
+    period_lengths = [0, 1, 2, 5, 12]
+    store = get_dunkelflaute_results(df, thresholds, period_lengths, return_store=True)
+    index = RunIndex(df)
+    for col in df.columns:
+        grid = index.count_grid(thresholds, period_lengths, col)
+        assert list(grid.index) == thresholds and list(grid.columns) == period_lengths
+        for threshold in thresholds:
+            for period_len in period_lengths:
+                expected = store.count(threshold, period_len, col)
+                assert grid.loc[threshold, period_len] == expected
+                assert index.count(threshold, period_len, col) == expected
@@ -0,0 +1,45 @@
+from dunkelflaute.core import get_total_production_df, find_fuzzy_periods, get_dunkelflaute_results
+from dunkelflaute.storage import MemmapTimeSeries
+import numpy as np
+import pytest
+
+def test_memmap_roundtrip(tmp_path, make_df):
+    df = make_df(periods=300)
+    ts = MemmapTimeSeries.from_frame(df, str(tmp_path / 'store'))
+    ts = MemmapTimeSeries(str(tmp_path / 'store'))
+    assert ts.columns == ['wind', 'solar']
+    assert len(ts) == len(df)
+    np.testing.assert_array_equal(ts['wind'], df['wind'].to_numpy())
+    subset = ts.to_frame(columns=['solar'], start='2000-01-02', end='2000-01-02 05:00')
+    np.testing.assert_array_equal(subset['solar'], df['solar'].loc['2000-01-02':'2000-01-02 05:00'])
+
+def test_memmap_detection(tmp_path, make_df):
+    df = make_df(periods=300)
+    ts = MemmapTimeSeries.from_frame(df, str(tmp_path / 'store'))
+    production = get_total_production_df(ts, [0.25, 0.5], 1.2)
+    df_total = get_total_production_df(df, [0.25, 0.5], 1.2)
+    assert isinstance(production, MemmapTimeSeries)
+    np.testing.assert_array_equal(production.values, df_total.to_numpy().T)
+    assert find_fuzzy_periods(production, 0.2, 3) == find_fuzzy_periods(df_total, 0.2, 3)
+    expected = get_dunkelflaute_results(df_total, [0.1, 0.3], [1, 3], True)
+    assert get_dunkelflaute_results(production, [0.1, 0.3], [1, 3], True) == expected
+    assert get_dunkelflaute_results(production, [0.1, 0.3], [1, 3], True, n_jobs=2) == expected
+
+def test_memmap_production_is_not_overwritten(tmp_path, make_df):
+    df = make_df(periods=300)
+    ts = MemmapTimeSeries.from_frame(df, str(tmp_path / 'store'))
+    first = get_total_production_df(ts, [0.25, 0.5, 0.75])
+    expected = np.array(first.values)
+    second = get_total_production_df(ts, [0.5])
+    assert second.path != first.path
+    np.testing.assert_array_equal(first.values, expected)
+    np.testing.assert_array_equal(second.values, expected[[1]])
+    # Nothing is written into the input store, and equal inputs reuse the store
+    assert sorted(path.name for path in (tmp_path / 'store').iterdir()) == ['index.npy', 'meta.json', 'values.npy']
+    assert get_total_production_df(ts, [0.25, 0.5, 0.75]).path == first.path
+    with pytest.raises(FileExistsError):
+        ts.get_total_production([0.5], path=first.path)
+    with pytest.raises(FileExistsError):
+        MemmapTimeSeries.from_frame(df, str(tmp_path / 'store'))
+    np.testing.assert_array_equal(first.values, expected)
+    assert not [path.name for path in tmp_path.iterdir() if path.name.startswith('.')]
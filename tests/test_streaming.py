@@ -0,0 +1,71 @@
+from dunkelflaute.core import get_dunkelflaute_results
+from dunkelflaute.results import DunkelflauteResults
+from dunkelflaute.streaming import IncrementalDunkelflaute, StreamingDetector, iter_dunkelflaute_periods
+import pandas as pd
+import dunkelflaute.streaming
+import pytest
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 50, 1000])
+@pytest.mark.parametrize('split_long_periods', [False, True])
+def test_streaming_matches_batch(chunk_size, split_long_periods, make_df):
+    df = make_df(['a', 'b'], seed=4)
+    thresholds = [0.05, 0.2, 0.5]
+    period_lengths = [1, 3, 6]
+    expected = get_dunkelflaute_results(df, thresholds, period_lengths, split_long_periods)
+    chunks = (df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size))
+    result = DunkelflauteResults.concat(iter_dunkelflaute_periods(chunks, thresholds, period_lengths, split_long_periods))
+    assert result == expected
+
+def test_streaming_run_across_chunks():
+    index = pd.date_range('2000-01-01', periods=6, freq='h', name='datetime')
+    df = pd.DataFrame({'a': [0.5, 0.0, 0.0, 0.0, 0.0, 0.5]}, index=index)
+    detector = StreamingDetector([0.1], [3])
+    assert detector.update(df.iloc[:3]).n_events == 0
+    assert detector.update(df.iloc[3:5]).n_events == 0
+    closed = detector.update(df.iloc[5:])
+    assert closed[0.1][3]['a'] == [(index[1], index[4])]
+    with pytest.raises(ValueError):
+        detector.update(df.iloc[:1])
+
+def test_incremental_append(tmp_path, make_df):
+    df = make_df(['a', 'b'], seed=4)
+    thresholds = [0.05, 0.2, 0.5]
+    period_lengths = [1, 3, 6]
+    incremental = IncrementalDunkelflaute.from_frame(df.iloc[:100], thresholds, period_lengths, True)
+    assert incremental.results == get_dunkelflaute_results(df.iloc[:100], thresholds, period_lengths, True)
+    for lo in range(100, len(df), 24):
+        incremental.save(str(tmp_path / 'state'))
+        incremental = IncrementalDunkelflaute.load(str(tmp_path / 'state'))
+        incremental.append(df.iloc[lo:lo + 24])
+        expected = get_dunkelflaute_results(df.iloc[:lo + 24], thresholds, period_lengths, True)
+        assert incremental.results == expected
+
+def test_incremental_interrupted_save(tmp_path, monkeypatch, make_df):
+    df = make_df(['a', 'b'], seed=4)
+    thresholds = [0.05, 0.2, 0.5]
+    period_lengths = [1, 3, 6]
+    path = str(tmp_path / 'state')
+    incremental = IncrementalDunkelflaute.from_frame(df.iloc[:200], thresholds, period_lengths)
+    incremental.save(path)
+    saved = incremental.results
+    n_parts = len(list((tmp_path / 'state').glob('part_*.npz')))
+    incremental.append(df.iloc[200:400])
+    assert incremental.results != saved
+
+    def crash(file_path, **arrays):
+        with open(f'{file_path}.tmp', 'wb') as f:
+            f.write(b'partial')
+        raise OSError('interrupted')
+
+    # The new parts are written, but the save stops before the state is replaced
+    monkeypatch.setattr(dunkelflaute.streaming, '_write_npz', crash)
+    with pytest.raises(OSError):
+        incremental.save(path)
+    monkeypatch.undo()
+    assert len(list((tmp_path / 'state').glob('part_*.npz'))) > n_parts
+    loaded = IncrementalDunkelflaute.load(path)
+    assert loaded.results == saved
+    loaded.append(df.iloc[200:])
+    assert loaded.results == get_dunkelflaute_results(df, thresholds, period_lengths)
+    loaded.save(path)
+    assert IncrementalDunkelflaute.load(path).results == loaded.results
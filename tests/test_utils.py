@@ -0,0 +1,74 @@
+from dunkelflaute.storage import MemmapTimeSeries
+from dunkelflaute.utils import create_ts_from_raw, load_df, get_cache_path
+import numpy as np
+import os
+import pandas as pd
+import pytest
+
+def write_csv(path, wind):
+    index = pd.date_range('2000-01-01', periods=len(wind), freq='h', name='datetime')
+    pd.DataFrame({'wind': wind, 'solar': [0.0] * len(wind)}, index=index).to_csv(path)
+
+def test_load_df_cache(tmp_path):
+    file_path = str(tmp_path / 'data.csv')
+    write_csv(file_path, [0.1, 0.2, 0.3])
+    df = load_df(file_path)
+    assert os.path.exists(get_cache_path(file_path) + '.json')
+    pd.testing.assert_frame_equal(load_df(file_path), df)
+    pd.testing.assert_frame_equal(load_df(file_path, use_cache=False), df)
+
+    # Changing the file invalidates the cache
+    write_csv(file_path, [0.4, 0.5, 0.6, 0.7])
+    assert load_df(file_path)['wind'].tolist() == [0.4, 0.5, 0.6, 0.7]
+
+def test_load_df_unwritable_cache(tmp_path):
+    file_path = str(tmp_path / 'data.csv')
+    write_csv(file_path, [0.1, 0.2, 0.3])
+    # A file in place of the cache directory makes every cache write fail
+    (tmp_path / '.dunkelflaute_cache').write_text('')
+    assert load_df(file_path)['wind'].tolist() == [0.1, 0.2, 0.3]
+
+def test_load_df_invalid_cache_meta(tmp_path):
+    file_path = str(tmp_path / 'data.csv')
+    write_csv(file_path, [0.1, 0.2, 0.3])
+    load_df(file_path)
+    with open(get_cache_path(file_path) + '.json', 'w') as f:
+        f.write('{"size": 1}')
+    assert load_df(file_path)['wind'].tolist() == [0.1, 0.2, 0.3]
+    # The cache is rewritten and used again
+    with open(get_cache_path(file_path) + '.json') as f:
+        assert 'sha256' in f.read()
+
+def test_load_df_hourly_frequency(tmp_path):
+    file_path = str(tmp_path / 'data.csv')
+    with open(file_path, 'w') as f:
+        f.write('datetime,wind,solar\n2000-01-01 00:00,0.1,0.0\n2000-01-01 00:30,0.2,0.0\n')
+    with pytest.raises(ValueError, match='hourly frequency'):
+        load_df(file_path, use_cache=False)
+
+def write_raw(path, yr, values):
+    with open(path, 'w') as f:
+        f.write('source\nunits\nnote\n')
+        f.write(f'hour,{yr}\n')
+        f.write(''.join(f'{i},{v}\n' for i, v in enumerate(values)))
+        f.write(',\n')
+
+def test_create_ts_from_raw(tmp_path):
+    raw_path = tmp_path / 'raw'
+    raw_path.mkdir()
+    for yr in [2001, 2004]:
+        n = len(pd.date_range(f'{yr}-01-01', f'{yr}-12-31 23:00', freq='h'))
+        write_raw(raw_path / f'DEU1_ONSHORE_IEC_3_LCOE_1_{yr}_ts.csv', yr, [0.25] * n)
+        write_raw(raw_path / f'DEU1_SOLAR_ROOFTOP_LCOE_1_{yr}_ts.csv', yr, [0.5] * n)
+
+    df = create_ts_from_raw(str(raw_path), [2001, 2004], store_path=str(tmp_path / 'store'))
+    assert list(df.columns) == ['wind', 'solar']
+    assert len(df) == 8760 + 8784
+    assert df.index[0] == pd.Timestamp('2001-01-01') and df.index[-1] == pd.Timestamp('2004-12-31 23:00')
+    assert df['wind'].dtype == np.float32
+    assert (df['wind'] == 0.25).all() and (df['solar'] == 0.5).all()
+    pd.testing.assert_frame_equal(MemmapTimeSeries(str(tmp_path / 'store')).to_frame(), df, check_index_type=False)
+
+    write_raw(raw_path / 'DEU1_SOLAR_ROOFTOP_LCOE_1_2001_ts.csv', 2001, [0.5] * 10)
+    with pytest.raises(ValueError, match='should contain 8760 values'):
+        create_ts_from_raw(str(raw_path), [2001, 2004])
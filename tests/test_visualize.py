@@ -0,0 +1,46 @@
+import matplotlib
+matplotlib.use('Agg')
+
+from dunkelflaute.core import get_dunkelflaute_results
+from dunkelflaute.visualize import decimate_minmax, plot_period_ts_data
+import numpy as np
+import pandas as pd
+import pytest
+
+def make_events_df(make_df):
+    # Values between 0.5 and 1 with three events at 0.1
+    df = 0.5 + 0.5 * make_df(['w0.50_s0.50'], 24 * 30, power=1)
+    for start in [48, 200, 400]:
+        df.iloc[start:start + 30] = 0.1
+    return df
+
+@pytest.mark.parametrize('file_format, n_jobs', [('svg', None), ('png', 2)])
+def test_plot_period_ts_data(tmp_path, monkeypatch, file_format, n_jobs, make_df):
+    monkeypatch.chdir(tmp_path)
+    df = make_events_df(make_df)
+    results = get_dunkelflaute_results(df, [0.2], [24])
+    plot_period_ts_data(results, df, 0.5, 0.2, 24, file_format=file_format, n_jobs=n_jobs)
+    files = sorted(path.name for path in (tmp_path / 'plots').iterdir())
+    assert files == [f'period_ts_data.{file_format}'] + [f'period_ts_data_{i}.{file_format}' for i in [1, 2, 3]]
+    with pytest.raises(ValueError):
+        plot_period_ts_data(results, df, 0.5, 0.2, 24, file_format='jpg')
+
+def test_decimate_minmax():
+    rng = np.random.default_rng(4)
+    times = pd.date_range('2000-01-01', periods=10000, freq='h').values
+    values = rng.random(10000)
+    values[1234] = 2.0
+    values[5678] = -1.0
+    dec_times, dec_values = decimate_minmax(times, values, 100)
+    assert len(dec_values) <= 202
+    assert np.all(np.diff(dec_times.view(np.int64)) > 0)
+    assert times[1234] in dec_times and times[5678] in dec_times
+    assert dec_times[0] == times[0] and dec_times[-1] == times[-1]
+    # Every bin keeps its minimum and maximum
+    bins = np.arange(10000) * 100 // 10000
+    dec_bins = np.searchsorted(times, dec_times) * 100 // 10000
+    for b in [0, 37, 99]:
+        assert dec_values[dec_bins == b].max() == values[bins == b].max()
+        assert dec_values[dec_bins == b].min() == values[bins == b].min()
+    short_times, short_values = decimate_minmax(times[:150], values[:150], 100)
+    assert np.array_equal(short_values, values[:150])